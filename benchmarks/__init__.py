@@ -0,0 +1,6 @@
+"""
+Бенчмарки mvpipeline (не входят в пакет).
+
+    python -m benchmarks.run        — замеры стадий и run_validation на синтетических нагрузках
+    python -m benchmarks.compare    — сравнение двух файлов результатов
+"""
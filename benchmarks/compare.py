@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+"""
+compare.py — сравнение двух файлов результатов benchmarks.run.
+
+    python -m benchmarks.compare results/old.json results/new.json
+    python -m benchmarks.compare old.json new.json --threshold 0.05 --fail
+
+Сравнивается min_s каждой пары (бенчмарк, нагрузка), есть в обоих файлах.
+ratio = new / old: > 1 — медленнее. Замедление больше threshold
+помечается как регрессия; с --fail код выхода 1, если регрессии есть
+(для CI).
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+Key = Tuple[str, str]
+
+
+def _load(path: Path) -> Dict[str, Any]:
+    return json.loads(path.read_text())
+
+
+def _by_key(results: Dict[str, Any]) -> Dict[Key, Dict[str, Any]]:
+    return {(r["bench"], r["workload"]): r for r in results["results"]}
+
+
+def compare(
+    old: Dict[str, Any], new: Dict[str, Any], *, threshold: float = 0.1
+) -> List[Dict[str, Any]]:
+    """
+    Строки сравнения по парам, которые есть в обоих файлах.
+
+    status: "regression" (медленнее больше чем на threshold),
+    "improvement" (быстрее больше чем на threshold) или "same".
+    """
+    old_rows = _by_key(old)
+    new_rows = _by_key(new)
+
+    rows = []
+    for key in old_rows:
+        if key not in new_rows:
+            continue
+
+        before = old_rows[key]["min_s"]
+        after = new_rows[key]["min_s"]
+        ratio = after / before if before > 0 else float("inf")
+
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "improvement"
+        else:
+            status = "same"
+
+        rows.append(
+            {
+                "bench": key[0],
+                "workload": key[1],
+                "old_s": before,
+                "new_s": after,
+                "ratio": ratio,
+                "status": status,
+            }
+        )
+    return rows
+
+
+def _warn_params(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Предупреждает, если нагрузки сгенерированы по-разному."""
+    for name in ("seed", "scale"):
+        a = old.get("params", {}).get(name)
+        b = new.get("params", {}).get(name)
+        if a != b:
+            print(f"! {name} различается: {a} → {b}, сравнение некорректно")
+
+    for name in ("cpu_count", "machine", "pymatgen"):
+        a = old.get("meta", {}).get(name)
+        b = new.get("meta", {}).get(name)
+        if a != b:
+            print(f"! {name} различается: {a} → {b}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compare",
+        description="Сравнение результатов двух прогонов benchmarks.run",
+    )
+    parser.add_argument("old", type=Path, help="Результаты до изменения")
+    parser.add_argument("new", type=Path, help="Результаты после изменения")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Порог относительного изменения min_s (0.1 = 10%%)",
+    )
+    parser.add_argument(
+        "--fail",
+        action="store_true",
+        help="Код выхода 1, если есть регрессии",
+    )
+    args = parser.parse_args(argv)
+
+    old = _load(args.old)
+    new = _load(args.new)
+
+    print(
+        f"{(old['meta'].get('commit') or '?')[:10]} → "
+        f"{(new['meta'].get('commit') or '?')[:10]}"
+    )
+    _warn_params(old, new)
+
+    rows = compare(old, new, threshold=args.threshold)
+
+    marks = {"regression": "▲ медленнее", "improvement": "▼ быстрее", "same": ""}
+    for row in rows:
+        print(
+            f"{row['bench']:12} {row['workload']:14}"
+            f" {row['old_s']:8.3f}s → {row['new_s']:8.3f}s"
+            f"  x{row['ratio']:5.2f}  {marks[row['status']]}"
+        )
+
+    n_regressions = sum(row["status"] == "regression" for row in rows)
+    print(f"\nРегрессий: {n_regressions} из {len(rows)}")
+
+    return 1 if args.fail and n_regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+"""
+run.py — бенчмарки стадий pipeline и run_validation целиком.
+
+Запуск (из корня репозитория):
+
+    python -m benchmarks.run                       # все бенчмарки, все нагрузки
+    python -m benchmarks.run --bench geometry --bench dedup --workload duplicates
+    python -m benchmarks.run --scale 0.25 --repeats 1   # быстрый прогон
+
+Для каждой пары (бенчмарк, нагрузка) работа повторяется --repeats раз,
+в JSON пишутся все замеры, минимум и медиана. Минимум — основная
+метрика для сравнения коммитов (меньше всего зависит от шума машины),
+сравнение — python -m benchmarks.compare old.json new.json.
+
+Бенчмарки:
+
+    prescan      prescan_validate по тексту CIF-файлов нагрузки (без pymatgen)
+    parse        read_structure по CIF-файлам нагрузки
+    geometry     geometry_validate
+    descriptors  compute_basic_descriptors (без spacegroup)
+    batch_descriptors
+                 pack_structures + compute_batch_descriptors по всей нагрузке разом
+    charge       check_charge_neutrality (кэш решателя сбрасывается перед повтором)
+    spacegroup   get_spacegroup_number
+    dedup        SimilarityChecker: is_duplicate / add_to_accepted по порядку
+    end_to_end   run_validation на CIF-файлах нагрузки
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# без прогресс-бара run_validation в выводе бенчмарка
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+from pymatgen.core import Structure  # noqa: E402
+
+from mvpipeline.analysis import (  # noqa: E402
+    compute_basic_descriptors,
+    compute_batch_descriptors,
+    get_spacegroup_number,
+    pack_structures,
+)
+from mvpipeline.analysis import spacegroup  # noqa: E402
+from mvpipeline.dedup import SimilarityChecker  # noqa: E402
+from mvpipeline.io import read_structure  # noqa: E402
+from mvpipeline.pipeline import run_validation  # noqa: E402
+from mvpipeline.utils import PipelineConfig, load_config  # noqa: E402
+from mvpipeline.validation import (  # noqa: E402
+    check_charge_neutrality,
+    geometry_validate,
+    prescan_validate,
+)
+from mvpipeline.validation import chemistry  # noqa: E402
+
+from .synthetic import WORKLOADS, make_workload, write_cifs  # noqa: E402
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_THRESHOLDS = REPO_ROOT / "config" / "thresholds.yaml"
+DEFAULT_RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+# формат файла результатов (меняется при несовместимых изменениях)
+RESULTS_VERSION = 1
+
+
+# =============================================================================
+# Подготовленная нагрузка
+# =============================================================================
+
+
+@dataclass
+class Workload:
+    """
+    Нагрузка, подготовленная для всех бенчмарков.
+
+    structures
+        Структуры (вход стадий).
+
+    cif_dir / cif_paths
+        Те же структуры в CIF (вход parse и end_to_end).
+
+    dedup_keys
+        (reduced_formula, spacegroup) каждой структуры — ключ бакета
+        дедупликации, считается заранее, чтобы dedup мерил только matcher.
+    """
+
+    name: str
+    structures: List[Structure]
+    cif_dir: Path
+    cif_paths: List[Path]
+    dedup_keys: List[tuple] = field(default_factory=list)
+
+
+def prepare_workload(
+    name: str, cfg: PipelineConfig, tmp: Path, *, seed: int, scale: float
+) -> Workload:
+    structures = make_workload(name, seed=seed, scale=scale)
+    cif_dir = tmp / "inputs" / name
+    cif_paths = write_cifs(structures, cif_dir)
+
+    dedup_keys = []
+    for struct in structures:
+        desc = compute_basic_descriptors(
+            struct, get_spacegroup_number(struct, cfg.symprec)
+        )
+        dedup_keys.append((desc.reduced_formula, desc.spacegroup or -1))
+
+    return Workload(name, structures, cif_dir, cif_paths, dedup_keys)
+
+
+# =============================================================================
+# Бенчмарки
+# =============================================================================
+
+# бенчмарк: (нагрузка, cfg, рабочая директория повтора) → выполнить работу один раз
+Bench = Callable[[Workload, PipelineConfig, Path], None]
+
+
+def bench_prescan(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    for path in w.cif_paths:
+        prescan_validate(path.read_text(encoding="utf-8", errors="replace"), cfg)
+
+
+def bench_parse(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    for path in w.cif_paths:
+        read_structure(path)
+
+
+def bench_geometry(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    for struct in w.structures:
+        geometry_validate(struct, cfg)
+
+
+def bench_descriptors(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    for struct in w.structures:
+        compute_basic_descriptors(struct, None)
+
+
+def bench_batch_descriptors(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    compute_batch_descriptors(pack_structures(w.structures))
+
+
+def bench_charge(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    # холодный кэш решателя: иначе со второго повтора меряется только lookup
+    chemistry._solve.cache_clear()
+    for struct in w.structures:
+        check_charge_neutrality(struct, cfg)
+
+
+def bench_spacegroup(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    # холодный in-process кэш номеров групп (как у charge)
+    spacegroup._MEMO.clear()
+    for struct in w.structures:
+        get_spacegroup_number(struct, cfg.symprec)
+
+
+def bench_dedup(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    checker = SimilarityChecker(cfg.dedup)
+    try:
+        for struct, (formula, sg) in zip(w.structures, w.dedup_keys):
+            if not checker.is_duplicate(struct, formula, sg):
+                checker.add_to_accepted(struct, formula, sg)
+    finally:
+        checker.close()
+
+
+def bench_end_to_end(w: Workload, cfg: PipelineConfig, tmp: Path) -> None:
+    run_validation(
+        input_dir=w.cif_dir,
+        out_dir=tmp / "out",
+        cfg=cfg,
+        model_name=w.name,
+    )
+
+
+BENCHES: Dict[str, Bench] = {
+    "prescan": bench_prescan,
+    "parse": bench_parse,
+    "geometry": bench_geometry,
+    "descriptors": bench_descriptors,
+    "batch_descriptors": bench_batch_descriptors,
+    "charge": bench_charge,
+    "spacegroup": bench_spacegroup,
+    "dedup": bench_dedup,
+    "end_to_end": bench_end_to_end,
+}
+
+
+# =============================================================================
+# Замеры
+# =============================================================================
+
+
+@dataclass
+class BenchResult:
+    """Результат одной пары (бенчмарк, нагрузка)."""
+
+    bench: str
+    workload: str
+    n_structures: int
+    times_s: List[float]
+    min_s: float
+    median_s: float
+    per_structure_ms: float
+
+
+def measure(
+    name: str, bench: Bench, w: Workload, cfg: PipelineConfig, tmp: Path, repeats: int
+) -> BenchResult:
+    times: List[float] = []
+
+    for i in range(repeats):
+        work_dir = tmp / "runs" / f"{name}-{w.name}-{i}"
+        work_dir.mkdir(parents=True)
+
+        t0 = time.perf_counter()
+        bench(w, cfg, work_dir)
+        times.append(time.perf_counter() - t0)
+
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    best = min(times)
+    return BenchResult(
+        bench=name,
+        workload=w.name,
+        n_structures=len(w.structures),
+        times_s=times,
+        min_s=best,
+        median_s=statistics.median(times),
+        per_structure_ms=best / len(w.structures) * 1e3,
+    )
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", *args],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def environment_meta() -> Dict[str, Any]:
+    """Коммит, версии и машина — чтобы понимать, что с чем сравнивается."""
+    import numpy
+    import pymatgen.core
+    import spglib
+
+    status = _git("status", "--porcelain", "--untracked-files=no")
+
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pymatgen": pymatgen.core.__version__,
+        "spglib": getattr(spglib, "__version__", None),
+    }
+
+
+def run_benchmarks(
+    *,
+    benches: Sequence[str],
+    workloads: Sequence[str],
+    cfg: PipelineConfig,
+    seed: int = 0,
+    scale: float = 1.0,
+    repeats: int = 3,
+) -> Dict[str, Any]:
+    """Прогоняет выбранные бенчмарки на выбранных нагрузках."""
+    results: List[BenchResult] = []
+
+    with tempfile.TemporaryDirectory(prefix="mvp-bench-") as tmp_name:
+        tmp = Path(tmp_name)
+
+        for wname in workloads:
+            w = prepare_workload(wname, cfg, tmp, seed=seed, scale=scale)
+
+            for bname in benches:
+                result = measure(bname, BENCHES[bname], w, cfg, tmp, repeats)
+                results.append(result)
+                print(
+                    f"{bname:12} {wname:14} n={result.n_structures:<5}"
+                    f" min {result.min_s:8.3f}s  median {result.median_s:8.3f}s"
+                    f"  {result.per_structure_ms:9.3f} ms/structure",
+                    flush=True,
+                )
+
+    return {
+        "version": RESULTS_VERSION,
+        "meta": environment_meta(),
+        "params": {
+            "seed": seed,
+            "scale": scale,
+            "repeats": repeats,
+            "benches": list(benches),
+            "workloads": list(workloads),
+        },
+        "results": [asdict(r) for r in results],
+    }
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Бенчмарки стадий mvpipeline на синтетических нагрузках",
+    )
+    parser.add_argument(
+        "--bench",
+        action="append",
+        choices=sorted(BENCHES),
+        help="Бенчмарк (можно несколько раз; по умолчанию — все)",
+    )
+    parser.add_argument(
+        "--workload",
+        action="append",
+        choices=sorted(WORKLOADS),
+        help="Нагрузка (можно несколько раз; по умолчанию — все)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора нагрузок")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Множитель размера нагрузок"
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="Повторов на замер")
+    parser.add_argument(
+        "--thresholds",
+        type=Path,
+        default=DEFAULT_THRESHOLDS,
+        help="thresholds.yaml (по умолчанию config/thresholds.yaml)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Файл результатов (по умолчанию benchmarks/results/<время>-<коммит>.json)",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        benches=args.bench or list(BENCHES),
+        workloads=args.workload or list(WORKLOADS),
+        cfg=load_config(args.thresholds),
+        seed=args.seed,
+        scale=args.scale,
+        repeats=max(1, args.repeats),
+    )
+
+    output = args.output
+    if output is None:
+        meta = results["meta"]
+        stamp = meta["timestamp"].replace(":", "").replace("-", "")[:15]
+        commit = (meta["commit"] or "nogit")[:10] + ("-dirty" if meta["dirty"] else "")
+        output = DEFAULT_RESULTS_DIR / f"{stamp}-{commit}.json"
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nРезультаты: {output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+"""
+synthetic.py — воспроизводимые синтетические нагрузки для бенчмарков.
+
+Каждая нагрузка — список pymatgen Structure, полностью определяемый
+(name, seed, scale): один и тот же вызов на любой машине даёт те же
+структуры, поэтому результаты разных коммитов сравнимы.
+
+Нагрузки:
+
+    random_cells
+        Случайные ячейки от 1 до 500 атомов (лог-равномерно по числу атомов):
+        атомы на узлах решётки со сдвигом, объём на атом 10–20 Å³.
+        3/4 — электронейтральные составы катион + анион (доходят до spacegroup,
+        novelty и dedup), остальные — случайные элементы из таблицы степеней
+        окисления. Разброс размеров — для поиска соседей (geometry) и spglib.
+
+    duplicates
+        Несколько прототипов одного состава (Fe4O6, электронейтральный)
+        и много их искажённых копий: деформация решётки, шум координат,
+        перестановка и сдвиг атомов. Все попадают в один бакет
+        дедупликации → тяжёлый случай для StructureMatcher.fit.
+
+    many_elements
+        Составы из 6–10 разных элементов (8–40 атомов) — перебор
+        степеней окисления в check_charge_neutrality.
+"""
+
+import math
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+from pymatgen.core import Lattice, Structure
+
+# элементы с заданными степенями окисления в config/thresholds.yaml
+ELEMENTS: Sequence[str] = (
+    "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn",
+    "Mo", "Ru", "Rh", "Pd", "Re", "Os", "Ir",
+    "Sc", "Y", "La", "Ce", "Nd", "Sm", "Gd",
+    "H", "C", "N", "O", "P", "S",
+    "Li", "Na", "K", "Mg", "Ca", "Sr", "Ba",
+)
+
+# катионы и анионы с одной "типичной" степенью окисления (есть в thresholds.yaml):
+# из них собираются электронейтральные составы, доходящие до spacegroup и dedup
+CATIONS: Dict[str, int] = {
+    "Li": 1, "Na": 1, "K": 1, "Mg": 2, "Ca": 2, "Sr": 2, "Ba": 2, "Zn": 2,
+    "Fe": 3, "Sc": 3, "Y": 3, "La": 3, "Ti": 4, "Mo": 6,
+}
+ANIONS: Dict[str, int] = {"O": 2, "S": 2, "N": 3}
+
+# доля электронейтральных ячеек в random_cells (остальные — случайный состав)
+BALANCED_FRACTION = 0.75
+
+# базовое число структур в нагрузке (умножается на scale)
+BASE_SIZES: Dict[str, int] = {
+    "random_cells": 60,
+    "duplicates": 120,
+    "many_elements": 60,
+}
+
+# прототипов в нагрузке duplicates (остальное — их копии)
+N_PROTOTYPES = 6
+
+
+def _jittered_grid(
+    rng: np.random.Generator, n_atoms: int, jitter: float = 0.08
+) -> np.ndarray:
+    """
+    n_atoms дробных координат: случайные узлы сетки k×k×k + шум.
+
+    Так атомы не слипаются (минимальное расстояние ~ шаг сетки),
+    и большая часть структур проходит geometry.
+    """
+    k = max(1, math.ceil(n_atoms ** (1 / 3)))
+    cells = rng.choice(k**3, size=n_atoms, replace=False)
+    grid = np.stack(np.unravel_index(cells, (k, k, k)), axis=1).astype(float)
+    coords = (grid + 0.5 + rng.uniform(-jitter, jitter, size=grid.shape)) / k
+    return coords % 1.0
+
+
+def _random_lattice(
+    rng: np.random.Generator, n_atoms: int, vpa: float
+) -> Lattice:
+    """Триклинная решётка объёмом n_atoms * vpa, близкая к кубической."""
+    a, b, c = rng.uniform(0.9, 1.1, size=3)
+    alpha, beta, gamma = rng.uniform(80.0, 100.0, size=3)
+    lattice = Lattice.from_parameters(a, b, c, alpha, beta, gamma)
+    return lattice.scale(n_atoms * vpa)
+
+
+def random_cell(
+    rng: np.random.Generator, n_atoms: int, elements: Sequence[str]
+) -> Structure:
+    """Случайная ячейка из n_atoms атомов с элементами из elements."""
+    species = [elements[i] for i in rng.integers(0, len(elements), size=n_atoms)]
+    lattice = _random_lattice(rng, n_atoms, vpa=float(rng.uniform(10.0, 20.0)))
+    return Structure(lattice, species, _jittered_grid(rng, n_atoms))
+
+
+def _balanced_species(rng: np.random.Generator, n_atoms: int) -> List[str]:
+    """
+    Электронейтральный состав примерно из n_atoms атомов (не больше 500):
+    формульная единица катион_a анион_c, повторённая нужное число раз.
+    """
+    cation = str(rng.choice(list(CATIONS)))
+    anion = str(rng.choice(list(ANIONS)))
+    q, p = CATIONS[cation], ANIONS[anion]
+    g = math.gcd(q, p)
+    unit = [cation] * (p // g) + [anion] * (q // g)
+
+    repeats = min(max(1, round(n_atoms / len(unit))), 500 // len(unit))
+    return unit * repeats
+
+
+def random_cells(rng: np.random.Generator, n: int) -> List[Structure]:
+    structures = []
+    for _ in range(n):
+        # лог-равномерно: маленьких ячеек столько же, сколько больших
+        n_atoms = int(round(math.exp(rng.uniform(0.0, math.log(500)))))
+
+        if rng.random() < BALANCED_FRACTION:
+            species = _balanced_species(rng, n_atoms)
+            lattice = _random_lattice(
+                rng, len(species), vpa=float(rng.uniform(10.0, 20.0))
+            )
+            coords = _jittered_grid(rng, len(species))
+            structures.append(Structure(lattice, species, coords))
+        else:
+            n_elements = int(rng.integers(1, 5))
+            elements = list(rng.choice(ELEMENTS, size=n_elements, replace=False))
+            structures.append(random_cell(rng, n_atoms, elements))
+    return structures
+
+
+def _distorted_copy(rng: np.random.Generator, proto: Structure) -> Structure:
+    """Копия прототипа в пределах допусков StructureMatcher."""
+    strain = np.eye(3) + rng.uniform(-0.01, 0.01, size=(3, 3))
+    lattice = Lattice(proto.lattice.matrix @ strain)
+
+    order = rng.permutation(len(proto))
+    shift = rng.uniform(0.0, 1.0, size=3)
+    noise = rng.normal(0.0, 0.005, size=(len(proto), 3))
+
+    coords = (proto.frac_coords[order] + shift + noise) % 1.0
+    species = [proto.species[i] for i in order]
+    return Structure(lattice, species, coords)
+
+
+def duplicates(rng: np.random.Generator, n: int) -> List[Structure]:
+    species = ["Fe"] * 4 + ["O"] * 6
+    prototypes = [
+        Structure(_random_lattice(rng, 10, vpa=12.0), species, _jittered_grid(rng, 10))
+        for _ in range(N_PROTOTYPES)
+    ]
+
+    structures = list(prototypes)
+    while len(structures) < n:
+        proto = prototypes[int(rng.integers(0, N_PROTOTYPES))]
+        structures.append(_distorted_copy(rng, proto))
+    return structures[:n]
+
+
+def many_elements(rng: np.random.Generator, n: int) -> List[Structure]:
+    structures = []
+    for _ in range(n):
+        n_elements = int(rng.integers(6, 11))
+        n_atoms = int(rng.integers(max(8, n_elements), 41))
+        elements = list(rng.choice(ELEMENTS, size=n_elements, replace=False))
+
+        # каждый элемент хотя бы один раз
+        extra = [elements[i] for i in rng.integers(0, n_elements, n_atoms - n_elements)]
+        species = elements + extra
+
+        lattice = _random_lattice(rng, n_atoms, vpa=float(rng.uniform(10.0, 20.0)))
+        structures.append(Structure(lattice, species, _jittered_grid(rng, n_atoms)))
+    return structures
+
+
+WORKLOADS: Dict[str, Callable[[np.random.Generator, int], List[Structure]]] = {
+    "random_cells": random_cells,
+    "duplicates": duplicates,
+    "many_elements": many_elements,
+}
+
+
+def make_workload(name: str, *, seed: int = 0, scale: float = 1.0) -> List[Structure]:
+    """
+    Структуры нагрузки name.
+
+    seed
+        Зерно генератора; смешивается с именем нагрузки, чтобы нагрузки
+        были независимы друг от друга.
+
+    scale
+        Множитель размера (BASE_SIZES[name] * scale структур).
+    """
+    n = max(1, int(round(BASE_SIZES[name] * scale)))
+    rng = np.random.default_rng([seed, sorted(WORKLOADS).index(name)])
+    return WORKLOADS[name](rng, n)
+
+
+def write_cifs(structures: Sequence[Structure], out_dir: Path) -> List[Path]:
+    """Пишет структуры в out_dir/00000.cif, 00001.cif, ... (вход для run_validation)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for i, struct in enumerate(structures):
+        path = out_dir / f"{i:05d}.cif"
+        struct.to(filename=str(path), fmt="cif")
+        paths.append(path)
+    return paths
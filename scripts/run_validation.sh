@@ -6,33 +6,17 @@ set -e  # остановить скрипт при любой ошибке
 # Общая конфигурация
 # -----------------------------------------------------------------------------
 
-THRESHOLDS="config/thresholds.yaml"
-
-# Список моделей
-MODELS=(
-  "mattergen"
-  "concdvae"
-  "crystalformer"
-)
+# Список моделей, пороги и train_reference — в batch.yaml
+BATCH="config/batch.yaml"
 
 # -----------------------------------------------------------------------------
-# Запуски
+# Запуск: все модели в одном процессе (общие пул процессов и кэши),
+# сводка по моделям — outputs/batch_summary.json
 # -----------------------------------------------------------------------------
 
-for MODEL in "${MODELS[@]}"; do
-  echo "=== ${MODEL} validation ==="
-
-  INPUT_DIR="samples/${MODEL}_cifs"
-  OUT_DIR="outputs/${MODEL}"
-  TRAIN_REFERENCE="datasets/${MODEL}/train_reference.csv"
-
-  mvp \
-    --input-dir "$INPUT_DIR" \
-    --out-dir "$OUT_DIR" \
-    --train-reference "$TRAIN_REFERENCE" \
-    --thresholds "$THRESHOLDS"
+echo "=== Валидация моделей из ${BATCH} ==="
 
-  echo ""
-done
+mvp batch "$BATCH" --no-pretty
 
+echo ""
 echo "=== Все проверки завершены ==="
@@ -8,6 +8,12 @@ CLI только:
     2) загружает конфиг
     3) вызывает run_validation(...)
     4) печатает результат
+
+Команды:
+    mvp --input-dir ...              запуск pipeline (в т.ч. --shard i/N)
+    mvp --input-table data.csv ...   то же для CIF, встроенных в CSV
+    mvp merge SHARD_DIR...           слияние шардов в один запуск
+    mvp batch batch.yaml             несколько моделей в одном процессе
 """
 
 import json
@@ -18,17 +24,51 @@ import typer
 from rich import print
 from rich.console import Console
 
-from mvpipeline import load_config, run_validation
-from mvpipeline.utils import PipelineConfig
+from mvpipeline import (
+    load_batch_manifest,
+    load_config,
+    merge_shards,
+    run_batch,
+    run_validation,
+)
+from mvpipeline.io import InputTable, check_table, input_name, is_archive
+from mvpipeline.pipeline.sharding import parse_shard
+from mvpipeline.utils import (
+    OutputMode,
+    PipelineConfig,
+    RecordsFormat,
+    RejectionLogFormat,
+)
 
 app = typer.Typer(add_completion=False)
 console = Console()
 
 
-@app.command()
+@app.callback(invoke_without_command=True)
 def validate(
-    input_dir: Path = typer.Option(
-        ..., "--input-dir", help="Папка с CIF файлами (рекурсивно ищем *.cif)"
+    ctx: typer.Context,
+    input_dir: Optional[Path] = typer.Option(
+        None,
+        "--input-dir",
+        help="Папка с CIF файлами (рекурсивно ищем *.cif) или архив с ними: .tar, .tar.gz, .tar.zst, .zip, ... (читается без распаковки)",
+    ),
+    input_table: Optional[Path] = typer.Option(
+        None,
+        "--input-table",
+        help="CSV с CIF в колонке (вместо --input-dir): читается кусками, CIF разбираются из памяти",
+    ),
+    cif_column: str = typer.Option(
+        "cif", "--cif-column", help="Колонка --input-table с текстом CIF"
+    ),
+    id_column: Optional[str] = typer.Option(
+        None,
+        "--id-column",
+        help="Колонка --input-table с уникальным ID структуры (по умолчанию — номер строки)",
+    ),
+    path_column: Optional[str] = typer.Option(
+        None,
+        "--path-column",
+        help="Колонка --input-table с путями к CIF-файлам (вместо --cif-column)",
     ),
     out_dir: Optional[Path] = typer.Option(
         None,
@@ -48,7 +88,86 @@ def validate(
     model_name: Optional[str] = typer.Option(
         None,
         "--model-name",
-        help="Имя модели для отчёта (по умолчанию = имя input_dir)",
+        help="Имя модели для отчёта (по умолчанию = имя input_dir / input_table)",
+    ),
+    jobs: int = typer.Option(
+        1,
+        "--jobs",
+        "-j",
+        help="Число процессов для проверки структур (1 — последовательно, 0 — все ядра)",
+    ),
+    cache_dir: Optional[Path] = typer.Option(
+        None,
+        "--cache-dir",
+        help="Папка постоянного кэша результатов (повторные запуски не пересчитывают неизменённые CIF)",
+    ),
+    cache_max_mb: int = typer.Option(
+        2048,
+        "--cache-max-mb",
+        help="Лимит размера кэша в МБ (LRU-вытеснение)",
+    ),
+    dedup_jobs: int = typer.Option(
+        1,
+        "--dedup-jobs",
+        help="Число процессов для сравнения структур внутри больших бакетов дедупликации",
+    ),
+    dedup_index: Optional[Path] = typer.Option(
+        None,
+        "--dedup-index",
+        help="SQLite-индекс принятых структур для дедупликации между запусками (создаётся, если нет)",
+    ),
+    manifest: Optional[Path] = typer.Option(
+        None,
+        "--manifest",
+        help="Файл со списком входных CIF: читается, если есть, иначе записывается при обходе input-dir",
+    ),
+    fs_order: bool = typer.Option(
+        False,
+        "--fs-order",
+        help="Обходить input-dir в порядке файловой системы (без сортировки; быстрее, но порядок не воспроизводим)",
+    ),
+    output_mode: OutputMode = typer.Option(
+        OutputMode.COPY,
+        "--output-mode",
+        help="Как сохранять CIF в validated/rejected: copy, hardlink, reflink, symlink, manifest (только индекс путей, без файлов) или tar / tar.gz / tar.zst (два архива вместо директорий)",
+        case_sensitive=False,
+    ),
+    rejection_log: RejectionLogFormat = typer.Option(
+        RejectionLogFormat.FILES,
+        "--rejection-log",
+        help="Куда писать причины отклонения: files (*.reason.json на каждый CIF), jsonl или jsonl.gz (единый журнал rejections.jsonl с индексом)",
+        case_sensitive=False,
+    ),
+    records_format: RecordsFormat = typer.Option(
+        RecordsFormat.CSV,
+        "--records-format",
+        help="Формат общей таблицы: csv (all_structures.csv) или parquet (all_structures.parquet/, нужен pyarrow)",
+        case_sensitive=False,
+    ),
+    structure_store: bool = typer.Option(
+        False,
+        "--structure-store",
+        help="Записать разобранные структуры (validated и duplicate) в structures.arrow/ — бинарное хранилище для Explore и анализа без повторного разбора CIF (нужен pyarrow)",
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Замерять время стадий и добавить секцию performance в validation_report.json",
+    ),
+    trace: Optional[Path] = typer.Option(
+        None,
+        "--trace",
+        help="Записать таймлайн стадий в формате Chrome Trace (chrome://tracing, ui.perfetto.dev); включает --profile",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Продолжить прерванный запуск в out-dir (по журналу progress.jsonl)",
+    ),
+    shard: Optional[str] = typer.Option(
+        None,
+        "--shard",
+        help="Выполнить per-structure проверки только для шарда i/N и записать частичные результаты (собираются командой mvp merge)",
     ),
     pretty: bool = typer.Option(
         True,
@@ -60,15 +179,66 @@ def validate(
     Запускает validation pipeline для CIF-файлов.
     """
 
+    # подкоманда (mvp merge ...) — её параметры разберёт она сама
+    if ctx.invoked_subcommand is not None:
+        return
+
     # ------------------------------------------------------------
-    # 1) Проверка input_dir
+    # 1) Проверка input_dir / input_table
     # ------------------------------------------------------------
 
-    if not input_dir.exists():
+    table = None
+
+    if input_table is not None:
+        if input_dir is not None:
+            raise typer.BadParameter(
+                "--input-dir и --input-table нельзя использовать вместе",
+                param_hint="--input-table",
+            )
+
+        if not input_table.is_file():
+            raise typer.BadParameter(f"input-table не найден: {input_table}")
+
+        if manifest is not None or fs_order:
+            raise typer.BadParameter(
+                "--manifest и --fs-order относятся к --input-dir",
+                param_hint="--input-table",
+            )
+
+        table = InputTable(
+            path=input_table,
+            cif_column=cif_column,
+            id_column=id_column,
+            path_column=path_column,
+        )
+
+        try:
+            check_table(table)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--input-table")
+
+    elif input_dir is None:
+        raise typer.BadParameter(
+            "не указан --input-dir (или --input-table)", param_hint="--input-dir"
+        )
+
+    elif not input_dir.exists():
         raise typer.BadParameter(f"input-dir не существует: {input_dir}")
 
-    if not input_dir.is_dir():
-        raise typer.BadParameter(f"input-dir должен быть директорией: {input_dir}")
+    elif is_archive(input_dir):
+        if not input_dir.is_file():
+            raise typer.BadParameter(f"input-dir: архив не найден: {input_dir}")
+
+        if manifest is not None or fs_order:
+            raise typer.BadParameter(
+                "--manifest и --fs-order не используются с архивом",
+                param_hint="--input-dir",
+            )
+
+    elif not input_dir.is_dir():
+        raise typer.BadParameter(
+            f"input-dir должен быть директорией или архивом: {input_dir}"
+        )
 
     # ------------------------------------------------------------
     # 2) Определяем model_name и out_dir по умолчанию
@@ -76,11 +246,42 @@ def validate(
 
     if model_name is None:
         # Берем имя папки: samples/mattergen_cifs -> mattergen_cifs
-        model_name = input_dir.name
+        # (архива: gen.tar.zst -> gen; таблицы: datasets/raw_data/concdvae.csv -> concdvae)
+        model_name = table.name if table is not None else input_name(input_dir)
+
+    shard_spec = None
+    if shard is not None:
+        try:
+            shard_spec = parse_shard(shard)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--shard")
+
+        # дедупликация, файлы структур и отчёт — на этапе mvp merge
+        merge_only = {
+            "--resume": resume,
+            "--fs-order": fs_order,
+            "--dedup-jobs": dedup_jobs != 1,
+            "--dedup-index": dedup_index is not None,
+            "--output-mode": output_mode != OutputMode.COPY,
+            "--rejection-log": rejection_log != RejectionLogFormat.FILES,
+            "--records-format": records_format != RecordsFormat.CSV,
+            "--structure-store": structure_store,
+            "--profile": profile,
+            "--trace": trace is not None,
+        }
+        conflicts = [name for name, used in merge_only.items() if used]
+        if conflicts:
+            raise typer.BadParameter(
+                f"с --shard нельзя использовать {', '.join(conflicts)}: "
+                "--resume и --fs-order не поддерживаются, остальное задаётся в mvp merge",
+                param_hint="--shard",
+            )
 
     if out_dir is None:
-        # Дефолт: outputs/<model_name>
+        # Дефолт: outputs/<model_name> (для шарда — outputs/<model_name>/shard-i-of-N)
         out_dir = Path("outputs") / model_name
+        if shard_spec is not None:
+            out_dir = out_dir / f"shard-{shard_spec[0]}-of-{shard_spec[1]}"
         print(f"[yellow]⚠ out-dir не указан, используется: {out_dir}[/yellow]")
 
     # ------------------------------------------------------------
@@ -125,16 +326,41 @@ def validate(
 
     report = run_validation(
         input_dir=input_dir,
+        input_table=table,
         out_dir=out_dir,
         cfg=cfg,
         train_reference=train_reference,
         model_name=model_name,
+        jobs=jobs,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_max_mb * 1024 * 1024,
+        resume=resume,
+        dedup_jobs=dedup_jobs,
+        dedup_index=dedup_index,
+        manifest=manifest,
+        fs_order=fs_order,
+        output_mode=output_mode,
+        rejection_log=rejection_log,
+        records_format=records_format,
+        structure_store=structure_store,
+        profile=profile,
+        trace=trace,
+        shard=shard_spec,
     )
 
     # ------------------------------------------------------------
     # 6) вывод результата
     # ------------------------------------------------------------
 
+    if shard_spec is not None:
+        print(
+            f"\n[bold green]✔ Шард {shard} готов[/bold green] "
+            f"({report['n_structures']} структур, {report['n_candidates']} кандидатов)\n"
+            f"Результаты: {out_dir}\n"
+            "Собрать все шарды: mvp merge <shard dirs...> --out-dir ..."
+        )
+        return
+
     print(
         f"\n[bold green]✔ Валидация завершена[/bold green]\n"
         f"Отчёт: {out_dir / 'validation_report.json'}"
@@ -145,6 +371,163 @@ def validate(
         console.print_json(json.dumps(report, ensure_ascii=False, indent=2))
 
 
+@app.command()
+def merge(
+    shard_dirs: list[Path] = typer.Argument(
+        ..., help="Папки шардов (out-dir запусков mvp --shard i/N), все N штук"
+    ),
+    out_dir: Path = typer.Option(
+        ..., "--out-dir", help="Куда сохранять объединённые результаты"
+    ),
+    model_name: Optional[str] = typer.Option(
+        None,
+        "--model-name",
+        help="Имя модели для отчёта (по умолчанию — как в шардах)",
+    ),
+    dedup_jobs: int = typer.Option(
+        1,
+        "--dedup-jobs",
+        help="Число процессов для сравнения структур внутри больших бакетов дедупликации",
+    ),
+    dedup_index: Optional[Path] = typer.Option(
+        None,
+        "--dedup-index",
+        help="SQLite-индекс принятых структур для дедупликации между запусками (создаётся, если нет)",
+    ),
+    output_mode: OutputMode = typer.Option(
+        OutputMode.COPY,
+        "--output-mode",
+        help="Как сохранять CIF в validated/rejected: copy, hardlink, reflink, symlink, manifest, tar, tar.gz или tar.zst",
+        case_sensitive=False,
+    ),
+    rejection_log: RejectionLogFormat = typer.Option(
+        RejectionLogFormat.FILES,
+        "--rejection-log",
+        help="Куда писать причины отклонения: files, jsonl или jsonl.gz",
+        case_sensitive=False,
+    ),
+    records_format: RecordsFormat = typer.Option(
+        RecordsFormat.CSV,
+        "--records-format",
+        help="Формат общей таблицы: csv или parquet",
+        case_sensitive=False,
+    ),
+    structure_store: bool = typer.Option(
+        False,
+        "--structure-store",
+        help="Записать разобранные структуры в structures.arrow/ (нужен pyarrow)",
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Замерять время слияния (dedup, write) и добавить секцию performance в отчёт",
+    ),
+    trace: Optional[Path] = typer.Option(
+        None,
+        "--trace",
+        help="Записать таймлайн стадий в формате Chrome Trace; включает --profile",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Продолжить прерванное слияние в out-dir (по журналу progress.jsonl)",
+    ),
+    pretty: bool = typer.Option(
+        True,
+        "--pretty/--no-pretty",
+        help="Красиво печатать итоговый отчёт",
+    ),
+):
+    """
+    Собирает шарды (mvp --shard i/N) в один запуск: дедупликация между
+    шардами, validated/rejected, all_structures и validation_report.json —
+    такие же, как при запуске на одном узле.
+    """
+
+    try:
+        report = merge_shards(
+            shard_dirs,
+            out_dir=out_dir,
+            model_name=model_name,
+            dedup_jobs=dedup_jobs,
+            dedup_index=dedup_index,
+            resume=resume,
+            output_mode=output_mode,
+            rejection_log=rejection_log,
+            records_format=records_format,
+            structure_store=structure_store,
+            profile=profile,
+            trace=trace,
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="SHARD_DIRS")
+
+    print(
+        f"\n[bold green]✔ Шарды объединены[/bold green]\n"
+        f"Отчёт: {out_dir / 'validation_report.json'}"
+    )
+
+    if pretty:
+        console.print("\n[bold]Итоговый отчёт:[/bold]")
+        console.print_json(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+@app.command()
+def batch(
+    manifest: Path = typer.Argument(
+        ..., help="batch.yaml: список моделей (вход, train_reference, параметры mvp)"
+    ),
+    jobs: Optional[int] = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        help="Число процессов на весь batch (по умолчанию — jobs из batch.yaml; 0 — все ядра)",
+    ),
+    pretty: bool = typer.Option(
+        True,
+        "--pretty/--no-pretty",
+        help="Красиво печатать сводку по моделям",
+    ),
+):
+    """
+    Валидирует несколько моделей в одном процессе: thresholds и train_reference
+    загружаются один раз, пул процессов общий для всех моделей. В конце —
+    сводка batch_summary.json / batch_summary.csv по всем моделям.
+    """
+
+    if not manifest.is_file():
+        raise typer.BadParameter(f"batch.yaml не найден: {manifest}")
+
+    try:
+        spec = load_batch_manifest(manifest)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="MANIFEST")
+
+    summary = run_batch(spec, jobs=jobs)
+
+    for model in summary["models"]:
+        if model["status"] == "ok":
+            print(
+                f"[green]✔ {model['model_name']}[/green]: "
+                f"{model['n_validated']}/{model['n_total']} validated "
+                f"({model['wall_s']:.1f} с) → {model['out_dir']}"
+            )
+        else:
+            print(f"[red]✘ {model['model_name']}[/red]: {model['error']}")
+
+    print(
+        f"\n[bold green]✔ Batch завершён[/bold green]\n"
+        f"Сводка: {spec.out_dir / 'batch_summary.json'}"
+    )
+
+    if pretty:
+        console.print("\n[bold]Сводка по моделям:[/bold]")
+        console.print_json(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if summary["n_failed"]:
+        raise typer.Exit(code=1)
+
+
 def main():
     app()
 
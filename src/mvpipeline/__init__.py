@@ -31,7 +31,7 @@ mvpipeline — validation pipeline для кристаллических стр
 """
 
 # Pipeline runner (главная функция)
-from .pipeline import run_validation
+from .pipeline import load_batch_manifest, merge_shards, run_batch, run_validation
 
 # Config
 from .utils import PipelineConfig, DedupConfig, load_config
@@ -55,6 +55,9 @@ from .utils import (
 __all__ = [
     # main entrypoint
     "run_validation",
+    "merge_shards",
+    "run_batch",
+    "load_batch_manifest",
     # config
     "PipelineConfig",
     "DedupConfig",
@@ -73,4 +76,4 @@ __all__ = [
 ]
 
 # версия пакета
-__version__ = "0.1.0"
+from .utils.constants import PIPELINE_VERSION as __version__
@@ -11,13 +11,38 @@ Analysis module: вычисление дескрипторов и симметр
 
 Публичный API:
     compute_basic_descriptors  — вычисление базовых физических дескрипторов
+    pack_structures            — упаковка пачки структур в массивы NumPy
+    compute_batch_descriptors  — дескрипторы пачки за один векторный проход
+    PackedStructures
+    BatchDescriptors
     get_spacegroup_number      — определение номера пространственной группы
+    get_spacegroup_numbers     — номера группы при нескольких symprec за вызов
+    symmetry_cell              — ячейка для spglib и канонический хэш структуры
+    SymmetryCell
 """
 
+from .batch_descriptors import (
+    BatchDescriptors,
+    PackedStructures,
+    compute_batch_descriptors,
+    pack_structures,
+)
 from .descriptors import compute_basic_descriptors
-from .spacegroup import get_spacegroup_number
+from .spacegroup import (
+    SymmetryCell,
+    get_spacegroup_number,
+    get_spacegroup_numbers,
+    symmetry_cell,
+)
 
 __all__ = [
     "compute_basic_descriptors",
+    "pack_structures",
+    "compute_batch_descriptors",
+    "PackedStructures",
+    "BatchDescriptors",
     "get_spacegroup_number",
+    "get_spacegroup_numbers",
+    "symmetry_cell",
+    "SymmetryCell",
 ]
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+"""
+batch_descriptors.py — базовые дескрипторы пачки структур за один проход NumPy.
+
+structure.density в pymatgen — это Composition (словарь по сайтам) плюс
+пересчёт единиц через FloatWithUnit: ~0.6 мс на структуру, больше, чем
+всё остальное в дескрипторах. Раньше плотность считалась дважды —
+в geometry_validate и в compute_basic_descriptors.
+
+Здесь структуры упаковываются в непрерывные массивы (pack_structures):
+
+    lattices          (n, 3, 3)  матрицы решёток
+    n_sites           (n,)       число сайтов
+    entry_structure   (m,)       записи "сайт × вид": номер структуры,
+    entry_species     (m,)       индекс вида в таблице species,
+    entry_occupancy   (m,)       заселённость
+    masses            (k,)       атомные массы видов таблицы (а.е.м.)
+
+и compute_batch_descriptors за один проход считает объём, массу, плотность,
+объём на атом, число атомов каждого элемента и приведённую формулу
+(одинаковые составы — один вызов pymatgen на пачку).
+
+Порядок операций с плавающей точкой тот же, что в pymatgen
+(Structure.composition → Composition.weight → Structure.density,
+Lattice.volume), поэтому значения совпадают с pymatgen побитово:
+all_structures.csv не меняется.
+
+Результат раздаётся стадиям: geometry_validate получает готовые
+Descriptors и плотность не пересчитывает (см. pipeline.stages).
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymatgen.core import Composition, Structure
+from pymatgen.core.units import Length, Mass
+
+from ..utils.types import Descriptors
+
+# коэффициенты пересчёта единиц — те же числа, что pymatgen получает в density
+_G_PER_AMU = float(Mass(1.0, "amu").to("g"))
+_CM3_PER_ANG3 = float(Length(1.0, "ang").to("cm") ** 3)
+
+
+@dataclass(frozen=True)
+class PackedStructures:
+    """
+    Пачка структур в непрерывных массивах (см. описание модуля).
+
+    species
+        Таблица видов пачки (Element / Species pymatgen), masses — их массы.
+    """
+
+    lattices: np.ndarray
+    n_sites: np.ndarray
+    entry_structure: np.ndarray
+    entry_species: np.ndarray
+    entry_occupancy: np.ndarray
+    species: Tuple[Any, ...]
+    masses: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.n_sites)
+
+
+@dataclass(frozen=True)
+class BatchDescriptors:
+    """
+    Дескрипторы пачки: массивы длины n (по структуре на элемент).
+
+    element_counts
+        (n, len(elements)) — число атомов каждого элемента (с учётом
+        заселённостей; виды с разной степенью окисления — один элемент).
+    """
+
+    n_atoms: np.ndarray
+    volume: np.ndarray
+    weight: np.ndarray
+    density: np.ndarray
+    volume_per_atom: np.ndarray
+    elements: Tuple[str, ...]
+    element_counts: np.ndarray
+    reduced_formulas: List[str]
+
+    def __len__(self) -> int:
+        return len(self.n_atoms)
+
+    def descriptors(self, k: int, spacegroup: Optional[int] = None) -> Descriptors:
+        """Descriptors k-й структуры пачки (как compute_basic_descriptors)."""
+        return Descriptors(
+            n_atoms=int(self.n_atoms[k]),
+            density=float(self.density[k]),
+            volume_per_atom=float(self.volume_per_atom[k]),
+            reduced_formula=self.reduced_formulas[k],
+            spacegroup=spacegroup,
+        )
+
+
+def pack_structures(structures: Sequence[Structure]) -> PackedStructures:
+    """Упаковывает структуры в массивы PackedStructures."""
+    species_index: Dict[Any, int] = {}
+    entry_structure: List[int] = []
+    entry_species: List[int] = []
+    entry_occupancy: List[float] = []
+
+    for k, struct in enumerate(structures):
+        for site in struct:
+            for sp, occu in site.species.items():
+                i = species_index.setdefault(sp, len(species_index))
+                entry_structure.append(k)
+                entry_species.append(i)
+                entry_occupancy.append(occu)
+
+    species = tuple(species_index)
+
+    return PackedStructures(
+        lattices=np.array(
+            [s.lattice.matrix for s in structures], dtype=float
+        ).reshape(-1, 3, 3),
+        n_sites=np.array([len(s) for s in structures], dtype=np.int64),
+        entry_structure=np.array(entry_structure, dtype=np.int64),
+        entry_species=np.array(entry_species, dtype=np.int64),
+        entry_occupancy=np.array(entry_occupancy, dtype=float),
+        species=species,
+        masses=np.array([float(sp.atomic_mass) for sp in species], dtype=float),
+    )
+
+
+def _volumes(lattices: np.ndarray) -> np.ndarray:
+    """|(a × b) · c| для каждой решётки — как Lattice.volume."""
+    cross = np.cross(lattices[:, 0], lattices[:, 1])
+    # скалярное произведение через matmul: то же округление, что np.dot
+    # в Lattice.volume (поэлементная сумма даёт расхождения в последнем бите)
+    dot = cross[:, None, :] @ lattices[:, 2, :, None]
+    return np.abs(dot[:, 0, 0])
+
+
+def compute_batch_descriptors(packed: PackedStructures) -> BatchDescriptors:
+    """
+    Объём, масса, плотность, объём на атом, состав и приведённая формула
+    всех структур пачки.
+    """
+    n = len(packed)
+    n_species = len(packed.species)
+
+    # ячейки (структура, вид) в порядке первого появления — как ключи
+    # словаря в Structure.composition
+    cell_key = packed.entry_structure * max(n_species, 1) + packed.entry_species
+    keys, first, inverse = np.unique(cell_key, return_index=True, return_inverse=True)
+
+    # суммы заселённостей: последовательно, в порядке сайтов
+    # (np.add.at не буферизует — тот же результат, что "+=" по сайтам)
+    amounts = np.zeros(len(keys))
+    np.add.at(amounts, inverse, packed.entry_occupancy)
+
+    order = np.argsort(first, kind="stable")
+    keys, amounts = keys[order], amounts[order]
+    cell_structure = keys // max(n_species, 1)
+    cell_species = keys % max(n_species, 1)
+
+    # Composition отбрасывает виды с заселённостью ниже amount_tolerance
+    kept = np.abs(amounts) >= Composition.amount_tolerance
+    keys, amounts = keys[kept], amounts[kept]
+    cell_structure, cell_species = cell_structure[kept], cell_species[kept]
+
+    # масса: сумма amount * mass по видам в порядке появления (Composition.weight)
+    weight = np.zeros(n)
+    np.add.at(weight, cell_structure, amounts * packed.masses[cell_species])
+
+    volume = _volumes(packed.lattices)
+    density = (weight * _G_PER_AMU) / (volume * _CM3_PER_ANG3)
+
+    n_atoms = packed.n_sites
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volume_per_atom = np.where(n_atoms > 0, volume / np.maximum(n_atoms, 1), 0.0)
+
+    # число атомов по элементам (Fe2+ и Fe3+ → Fe)
+    elements = tuple(dict.fromkeys(sp.symbol for sp in packed.species))
+    element_of = np.array(
+        [elements.index(sp.symbol) for sp in packed.species], dtype=np.int64
+    )
+    element_counts = np.zeros((n, len(elements)))
+    if len(keys):
+        np.add.at(element_counts, (cell_structure, element_of[cell_species]), amounts)
+
+    # приведённая формула: один вызов pymatgen на каждый различный состав
+    bounds = np.searchsorted(cell_structure, np.arange(n + 1))
+    formulas: Dict[Tuple[Any, ...], str] = {}
+    reduced_formulas: List[str] = []
+    for k in range(n):
+        lo, hi = bounds[k], bounds[k + 1]
+        composition = tuple(
+            zip(cell_species[lo:hi].tolist(), amounts[lo:hi].tolist())
+        )
+        if composition not in formulas:
+            formulas[composition] = Composition(
+                {packed.species[i]: amount for i, amount in composition}
+            ).reduced_formula
+        reduced_formulas.append(formulas[composition])
+
+    return BatchDescriptors(
+        n_atoms=n_atoms,
+        volume=volume,
+        weight=weight,
+        density=density,
+        volume_per_atom=volume_per_atom,
+        elements=elements,
+        element_counts=element_counts,
+        reduced_formulas=reduced_formulas,
+    )
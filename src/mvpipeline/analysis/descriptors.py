@@ -3,6 +3,8 @@ from pymatgen.core import Structure
 from ..utils.types import Descriptors
 from typing import Optional
 
+from .batch_descriptors import compute_batch_descriptors, pack_structures
+
 
 def compute_basic_descriptors(
     struct: Structure, spacegroup: Optional[int]
@@ -22,7 +24,8 @@ def compute_basic_descriptors(
 
     density
         Плотность кристалла в g/cm³.
-        Рассчитывается pymatgen на основе состава и объёма ячейки.
+        Из состава и объёма ячейки — то же значение, что struct.density,
+        но без пересчёта единиц pymatgen (см. batch_descriptors).
 
     volume_per_atom
         Объём, приходящийся на один атом (Å³/atom).
@@ -56,23 +59,8 @@ def compute_basic_descriptors(
     Descriptors
         Dataclass с вычисленными дескрипторами структуры.
     """
-    n_atoms = len(struct)
-
-    # объём на атом (Å³/atom)
-    # используется для проверки реалистичности структуры
-    vpa = struct.volume / n_atoms if n_atoms else 0.0
-
-    # плотность (g/cm³)
-    # pymatgen вычисляет автоматически на основе атомных масс и объёма
-    dens = float(struct.density)
-
-    # приведённая формула (например Fe4O6 → Fe2O3)
-    formula = struct.composition.reduced_formula
+    # пачка из одной структуры: n_atoms, density, volume_per_atom
+    # и приведённая формула (например Fe4O6 → Fe2O3) за один проход
+    batch = compute_batch_descriptors(pack_structures([struct]))
 
-    return Descriptors(
-        n_atoms=n_atoms,
-        density=dens,
-        volume_per_atom=vpa,
-        reduced_formula=formula,
-        spacegroup=spacegroup,
-    )
+    return batch.descriptors(0, spacegroup)
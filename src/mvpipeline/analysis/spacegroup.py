@@ -1,12 +1,176 @@
 from __future__ import annotations
 
-from typing import Optional
+"""
+spacegroup.py — номер пространственной группы через spglib.
 
+SpacegroupAnalyzer ради одного числа собирает копию структуры, site_properties,
+кортежи координат и полный анализатор: ~0.7 мс сверху к самому spglib
+(~0.6 мс на структуру). Здесь spglib вызывается напрямую на массивах
+структуры (symmetry_cell) — с теми же номерами видов, что даёт
+SpacegroupAnalyzer, поэтому и результат тот же.
+
+Структуры с магнитными моментами (site property magmom, Species со spin)
+идут через SpacegroupAnalyzer: там spglib получает ещё и моменты.
+
+Результаты запоминаются по каноническому хэшу структуры и symprec
+(in-process LRU): точные копии файлов и одна структура при переборе
+symprec не пересчитываются. Между запусками номер группы хранит кэш
+результатов pipeline (--cache-dir), по тому же хэшу структуры
+(см. pipeline.stages).
+
+Канонический хэш — sha256 решётки, дробных координат и составов сайтов
+(в порядке сайтов). Он не зависит от текста CIF (форматирование чисел,
+порядок тегов, комментарии), но сайты не сортируются: у spglib на
+границе допуска результат может зависеть от порядка атомов, а кэш
+не должен менять ответ.
+
+    cell = symmetry_cell(struct)
+    get_spacegroup_numbers(cell, [0.001, 0.01, 0.1])   # {symprec: номер группы}
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import spglib
 from pymatgen.core import Structure
 from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 
+# допуск по углам — как по умолчанию в SpacegroupAnalyzer
+ANGLE_TOLERANCE = 5.0
+
+# размер in-process LRU (cell.key, symprec, angle_tolerance) → номер группы
+_MEMO_SIZE = 4096
+
+_MEMO: "OrderedDict[Tuple[str, float, float], Optional[int]]" = OrderedDict()
+
+
+@dataclass(frozen=True)
+class SymmetryCell:
+    """
+    Ячейка для spglib: массивы структуры и её канонический хэш.
+
+    numbers
+        Номер состава сайта по порядку первого появления (1, 2, ...) —
+        как в SpacegroupAnalyzer.
 
-def get_spacegroup_number(struct: Structure, symprec: float) -> Optional[int]:
+    structure
+        Исходная структура — только если у неё есть магнитные моменты
+        (тогда номер группы считает SpacegroupAnalyzer), иначе None.
+    """
+
+    lattice: np.ndarray
+    positions: np.ndarray
+    numbers: np.ndarray
+    key: str
+    structure: Optional[Structure] = None
+
+
+def _has_magmoms(struct: Structure) -> bool:
+    """Есть ли моменты, которые SpacegroupAnalyzer передал бы в spglib."""
+    if any("magmom" in site.properties for site in struct):
+        return True
+    return any(
+        getattr(sp, "spin", None) is not None for sp in struct.types_of_species
+    )
+
+
+def symmetry_cell(struct: Structure) -> SymmetryCell:
+    """Собирает SymmetryCell структуры (массивы для spglib и хэш)."""
+    lattice = np.array(struct.lattice.matrix, dtype=float)
+    positions = np.array(struct.frac_coords, dtype=float)
+
+    # номера составов сайтов: одинаковый состав — один номер
+    index: Dict[object, int] = {}
+    numbers = np.array(
+        [index.setdefault(site.species, len(index) + 1) for site in struct],
+        dtype=np.intc,
+    )
+
+    table = [
+        sorted((str(sp), float(amount)) for sp, amount in species.items())
+        for species in index
+    ]
+
+    h = hashlib.sha256()
+    h.update(lattice.tobytes())
+    h.update(positions.tobytes())
+    h.update(numbers.tobytes())
+    h.update(json.dumps(table).encode("utf-8"))
+
+    magnetic = _has_magmoms(struct)
+    if magnetic:
+        # моменты тоже влияют на группу — в хэш их строковое представление
+        h.update(repr([site.properties.get("magmom") for site in struct]).encode())
+        h.update(repr([str(sp) for sp in struct.species]).encode())
+
+    return SymmetryCell(
+        lattice=lattice,
+        positions=positions,
+        numbers=numbers,
+        key=h.hexdigest(),
+        structure=struct if magnetic else None,
+    )
+
+
+def _spglib_number(cell: SymmetryCell, symprec: float) -> Optional[int]:
+    """Номер группы одной ячейки при одном symprec (None — не определён)."""
+    try:
+        if cell.structure is not None:
+            sga = SpacegroupAnalyzer(
+                cell.structure, symprec=symprec, angle_tolerance=ANGLE_TOLERANCE
+            )
+            return int(sga.get_space_group_number())
+
+        dataset = spglib.get_symmetry_dataset(
+            (cell.lattice, cell.positions, cell.numbers),
+            symprec=symprec,
+            angle_tolerance=ANGLE_TOLERANCE,
+        )
+        if dataset is None:
+            return None
+        return int(dataset.number)
+
+    except Exception:
+        return None
+
+
+def get_spacegroup_numbers(
+    struct: Union[Structure, SymmetryCell], symprecs: Iterable[float]
+) -> Dict[float, Optional[int]]:
+    """
+    Номера пространственной группы при нескольких symprec за один вызов
+    (ячейка для spglib собирается один раз).
+
+    Для перебора допусков: {symprec: номер группы или None}.
+    """
+    cell = struct if isinstance(struct, SymmetryCell) else symmetry_cell(struct)
+
+    result: Dict[float, Optional[int]] = {}
+    for symprec in symprecs:
+        symprec = float(symprec)
+        memo_key = (cell.key, symprec, ANGLE_TOLERANCE)
+
+        if memo_key in _MEMO:
+            _MEMO.move_to_end(memo_key)
+            result[symprec] = _MEMO[memo_key]
+            continue
+
+        number = _spglib_number(cell, symprec)
+        _MEMO[memo_key] = number
+        if len(_MEMO) > _MEMO_SIZE:
+            _MEMO.popitem(last=False)
+        result[symprec] = number
+
+    return result
+
+
+def get_spacegroup_number(
+    struct: Union[Structure, SymmetryCell], symprec: float
+) -> Optional[int]:
     """
     Определяет номер пространственной группы (spacegroup) кристаллической структуры.
 
@@ -19,13 +183,14 @@ def get_spacegroup_number(struct: Structure, symprec: float) -> Optional[int]:
     - анализа симметрии сгенерированных кристаллов
     - формирования validation_report.json
 
-    Функция использует SpacegroupAnalyzer из pymatgen, который анализирует
-    симметрию структуры с заданной точностью symprec.
+    Функция вызывает spglib напрямую (см. описание модуля) — результат
+    тот же, что у SpacegroupAnalyzer из pymatgen с заданной точностью symprec.
 
     Parameters
     ----------
-    struct : Structure
-        Объект pymatgen Structure, представляющий кристалл.
+    struct : Structure | SymmetryCell
+        Объект pymatgen Structure, представляющий кристалл
+        (или уже собранная symmetry_cell(struct)).
 
     symprec : float
         Допуск (Å) для определения симметрии.
@@ -52,11 +217,6 @@ def get_spacegroup_number(struct: Structure, symprec: float) -> Optional[int]:
     В этом случае структура может всё ещё быть валидной, но некоторые проверки,
     такие как novelty или дедупликация, будут менее точными.
     """
-    try:
-        sga = SpacegroupAnalyzer(struct, symprec=symprec)
-        return int(sga.get_space_group_number())
-
-    except Exception:
-        # Если симметрию определить не удалось, возвращаем None
-        # вместо того чтобы прерывать весь pipeline
-        return None
+    # Если симметрию определить не удалось, получаем None
+    # вместо того чтобы прерывать весь pipeline
+    return get_spacegroup_numbers(struct, (symprec,))[float(symprec)]
@@ -8,14 +8,25 @@ Deduplication module: обнаружение дубликатов кристал
     SimilarityChecker — класс для обнаружения дубликатов на основе
     pymatgen StructureMatcher.
 
+    StructureSignature / compute_signature — дешёвая подпись структуры
+    для префильтра кандидатов внутри бакета.
+
+    DedupIndex — постоянный SQLite-индекс принятых структур
+    (дедупликация между запусками).
+
 Используется в validation pipeline для:
     - удаления повторяющихся структур,
     - предотвращения искажения статистики метрик,
     - обеспечения корректного сравнения генеративных моделей.
 """
 
+from .index import DedupIndex
 from .matcher import SimilarityChecker
+from .signature import StructureSignature, compute_signature
 
 __all__ = [
+    "DedupIndex",
     "SimilarityChecker",
+    "StructureSignature",
+    "compute_signature",
 ]
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+"""
+index.py — постоянный (между запусками) индекс принятых структур для дедупликации.
+
+Зачем:
+    SimilarityChecker хранит принятые структуры только в памяти, поэтому
+    дубликаты ищутся лишь внутри одного запуска. С индексом можно спросить:
+    "есть ли в новой пачке MatterGen структуры, которые уже принимались
+    на прошлой неделе или у Con-CDVAE?".
+
+Хранилище — один SQLite-файл (mvp --dedup-index path.db). Для каждой
+принятой структуры хранится:
+
+    - source / structure_id — откуда структура (out_dir запуска) и её id,
+    - бакет (formula, spacegroup) и n_sites приведённой ячейки,
+    - длины Niggli (l1..l3) — для префильтра прямо в SQL (см. signature.may_match),
+    - остальная подпись (JSON) — для ранжирования кандидатов,
+    - приведённая структура: zlib(JSON Structure.as_dict()) — компактно
+      и восстанавливается без pickle (не зависит от версий классов).
+
+Поиск идёт по индексу (formula, spacegroup, n_sites) и условиям на длины,
+поэтому в память поднимаются только подходящие кандидаты, а не весь индекс.
+Раскодированные структуры держатся в небольшом LRU-кэше.
+"""
+
+import json
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from pymatgen.core import Structure
+
+from .signature import StructureSignature, lengths_lower_bound
+
+# сколько раскодированных структур держим в памяти
+_DECODED_CACHE_SIZE = 4096
+
+# как часто (в числе вставок) делаем commit
+_COMMIT_EVERY = 500
+
+
+@dataclass
+class IndexedStructure:
+    """
+    Структура из индекса (кандидат на совпадение).
+
+    source / structure_id
+        Запуск (out_dir), в котором структура была принята, и её id.
+
+    model
+        Имя модели этого запуска (если было указано).
+
+    reduced
+        Приведённая (primitive + Niggli) форма структуры.
+
+    signature
+        Подпись приведённой структуры.
+    """
+
+    source: str
+    structure_id: str
+    model: Optional[str]
+    reduced: Structure
+    signature: StructureSignature
+
+
+def _encode_signature(sig: StructureSignature) -> str:
+    return json.dumps(
+        {
+            "angles": list(sig.angles),
+            "volume_per_atom": sig.volume_per_atom,
+            "pair_hist": list(sig.pair_hist),
+        }
+    )
+
+
+def _decode_signature(
+    n_sites: int, lengths: Tuple[float, float, float], raw: str
+) -> StructureSignature:
+    data = json.loads(raw)
+    return StructureSignature(
+        n_sites=n_sites,
+        lengths=tuple(lengths),
+        angles=tuple(data["angles"]),
+        volume_per_atom=data["volume_per_atom"],
+        pair_hist=tuple(data["pair_hist"]),
+    )
+
+
+def _encode_structure(struct: Structure) -> bytes:
+    return zlib.compress(json.dumps(struct.as_dict(verbosity=0)).encode("utf-8"))
+
+
+def _decode_structure(blob: bytes) -> Structure:
+    return Structure.from_dict(json.loads(zlib.decompress(blob)))
+
+
+class DedupIndex:
+    """
+    SQLite-индекс принятых структур.
+
+    source
+        Ключ текущего запуска (runner передаёт out_dir).
+        Поиск (candidates) не возвращает записи своего source: структуры
+        текущего запуска SimilarityChecker и так держит в памяти.
+
+    model
+        Имя модели текущего запуска (для информации в индексе).
+    """
+
+    def __init__(self, path: Path, *, source: str, model: Optional[str] = None):
+        self.path = Path(path)
+        self.source = source
+        self.model = model
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS structures ("
+            " id INTEGER PRIMARY KEY,"
+            " source TEXT NOT NULL,"
+            " structure_id TEXT NOT NULL,"
+            " model TEXT,"
+            " formula TEXT NOT NULL,"
+            " spacegroup INTEGER NOT NULL,"
+            " n_sites INTEGER NOT NULL,"
+            " l1 REAL NOT NULL,"
+            " l2 REAL NOT NULL,"
+            " l3 REAL NOT NULL,"
+            " signature TEXT NOT NULL,"
+            " structure BLOB NOT NULL,"
+            " added REAL NOT NULL,"
+            " UNIQUE(source, structure_id))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS structures_bucket"
+            " ON structures(formula, spacegroup, n_sites)"
+        )
+        self._conn.commit()
+
+        self._decoded: OrderedDict[int, Tuple[Structure, StructureSignature]] = (
+            OrderedDict()
+        )
+        self._pending = 0
+
+    def __len__(self) -> int:
+        row = self._conn.execute("SELECT COUNT(*) FROM structures").fetchone()
+        return int(row[0])
+
+    # ------------------------------------------------------------------
+    # поиск
+    # ------------------------------------------------------------------
+
+    def candidates(
+        self,
+        formula: str,
+        sg: int,
+        signature: StructureSignature,
+        ltol: float,
+    ) -> Iterator[IndexedStructure]:
+        """
+        Кандидаты на совпадение из других запусков.
+
+        В SQL отбираются только записи того же бакета с тем же n_sites
+        и длинами Niggli, проходящими необходимое условие fit
+        (см. signature.lengths_lower_bound / may_match).
+        """
+        l1, l2, l3 = lengths_lower_bound(signature, ltol)
+
+        rows = self._conn.execute(
+            "SELECT id, source, structure_id, model, l1, l2, l3, signature"
+            " FROM structures"
+            " WHERE formula = ? AND spacegroup = ? AND n_sites = ?"
+            " AND source <> ? AND l1 > ? AND l2 > ? AND l3 > ?",
+            (formula, sg, signature.n_sites, self.source, l1, l2, l3),
+        ).fetchall()
+
+        for row_id, source, structure_id, model, r1, r2, r3, raw_sig in rows:
+            reduced, sig = self._load(row_id, signature.n_sites, (r1, r2, r3), raw_sig)
+            yield IndexedStructure(
+                source=source,
+                structure_id=structure_id,
+                model=model,
+                reduced=reduced,
+                signature=sig,
+            )
+
+    def _load(
+        self,
+        row_id: int,
+        n_sites: int,
+        lengths: Tuple[float, float, float],
+        raw_sig: str,
+    ) -> Tuple[Structure, StructureSignature]:
+        """Раскодирует структуру записи (через LRU-кэш)."""
+        if row_id in self._decoded:
+            self._decoded.move_to_end(row_id)
+            return self._decoded[row_id]
+
+        (blob,) = self._conn.execute(
+            "SELECT structure FROM structures WHERE id = ?", (row_id,)
+        ).fetchone()
+
+        value = (_decode_structure(blob), _decode_signature(n_sites, lengths, raw_sig))
+
+        self._decoded[row_id] = value
+        if len(self._decoded) > _DECODED_CACHE_SIZE:
+            self._decoded.popitem(last=False)
+
+        return value
+
+    # ------------------------------------------------------------------
+    # запись
+    # ------------------------------------------------------------------
+
+    def add(
+        self,
+        *,
+        structure_id: str,
+        formula: str,
+        sg: int,
+        reduced: Structure,
+        signature: StructureSignature,
+    ) -> None:
+        """Добавляет (или перезаписывает) принятую структуру текущего запуска."""
+        l1, l2, l3 = signature.lengths
+        self._conn.execute(
+            "INSERT OR REPLACE INTO structures("
+            " source, structure_id, model, formula, spacegroup, n_sites,"
+            " l1, l2, l3, signature, structure, added)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.source,
+                structure_id,
+                self.model,
+                formula,
+                sg,
+                signature.n_sites,
+                l1,
+                l2,
+                l3,
+                _encode_signature(signature),
+                _encode_structure(reduced),
+                time.time(),
+            ),
+        )
+
+        self._pending += 1
+        if self._pending >= _COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def forget_source(self) -> None:
+        """
+        Удаляет записи текущего source.
+
+        Вызывается в начале запуска: повторный запуск в тот же out_dir
+        заменяет свой вклад в индекс, а не дублирует его
+        (при resume восстановленные структуры добавляются заново).
+        """
+        self._conn.execute("DELETE FROM structures WHERE source = ?", (self.source,))
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
@@ -1,6 +1,70 @@
+import math
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
 from pymatgen.analysis.structure_matcher import StructureMatcher
 from pymatgen.core import Structure
 
+from ..utils.config import DedupConfig
+from .index import DedupIndex
+from .signature import StructureSignature, compute_signature, distance, may_match
+
+# параллельный fit включается, только если кандидатов после префильтра
+# не меньше jobs * _PARALLEL_MIN_PER_WORKER (иначе pickle/IPC дороже самих fit)
+_PARALLEL_MIN_PER_WORKER = 4
+
+
+@dataclass
+class _Accepted:
+    """
+    Принятая структура в бакете.
+
+    structure
+        Исходная структура — хранится только до первого сравнения
+        с ней (пока бакет состоит из одной структуры, приводить её незачем).
+
+    reduced
+        Приведённая (primitive + Niggli) форма структуры.
+        Считается один раз за запуск (SimilarityChecker._prepared), после
+        чего исходная структура отбрасывается; fit вызывается с
+        skip_structure_reduction=True и не приводит её заново.
+        Обычно она и компактнее исходной (примитивная ячейка).
+
+    signature
+        Подпись приведённой структуры для префильтра (см. signature.py).
+    """
+
+    structure: Optional[Structure] = None
+    reduced: Optional[Structure] = None
+    signature: Optional[StructureSignature] = None
+
+
+# StructureMatcher в воркерах пула: (ltol, stol, angle_tol) -> matcher
+_WORKER_MATCHERS: Dict[Tuple[float, float, float], StructureMatcher] = {}
+
+
+def _fit_any(
+    params: Tuple[float, float, float],
+    struct: Structure,
+    candidates: List[Structure],
+) -> bool:
+    """
+    Выполняется в воркере: есть ли среди candidates совпадение со struct.
+
+    struct и candidates — уже приведённые формы.
+    """
+    if params not in _WORKER_MATCHERS:
+        ltol, stol, angle_tol = params
+        _WORKER_MATCHERS[params] = StructureMatcher(
+            ltol=ltol, stol=stol, angle_tol=angle_tol
+        )
+    matcher = _WORKER_MATCHERS[params]
+    return any(
+        matcher.fit(struct, existing, skip_structure_reduction=True)
+        for existing in candidates
+    )
+
 
 class SimilarityChecker:
     """
@@ -24,9 +88,29 @@ class SimilarityChecker:
         key = (reduced_formula, spacegroup)
 
     Это резко снижает число сравнений и делает алгоритм масштабируемым.
+
+    Внутри бакета перед fit работает префильтр по подписи (signature.py):
+    кандидаты, которые точно не совпадут, отсекаются, остальные проверяются
+    от самых похожих к менее похожим. Ответ is_duplicate при этом такой же,
+    как при полном переборе.
+
+    jobs > 1 — fit по кандидатам бакета раздаётся в пул процессов
+    (имеет смысл для больших бакетов у "схлопнувшихся" генераторов).
+
+    index — постоянный индекс (DedupIndex): структура дополнительно
+    сравнивается с принятыми в других запусках, а принятые в этом
+    запуске дописываются в индекс.
+
+    После работы нужно вызвать close() (пул процессов, индекс).
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        cfg: Optional[DedupConfig] = None,
+        *,
+        jobs: int = 1,
+        index: Optional[DedupIndex] = None,
+    ):
         """
         Инициализация StructureMatcher и структуры хранения бакетов.
 
@@ -44,32 +128,62 @@ class SimilarityChecker:
 
         Эти параметры позволяют matcher считать структуры одинаковыми,
         даже если они немного искажены генератором.
+
+        Значения берутся из DedupConfig (секция dedup в thresholds.yaml).
+
+        jobs
+            Число процессов для параллельного fit (1 — без пула).
+
+        index
+            Постоянный индекс принятых структур (или None).
         """
+        self.cfg = cfg or DedupConfig()
+        self.jobs = max(1, jobs)
+
         self.matcher = StructureMatcher(
-            ltol=0.2,
-            stol=0.3,
-            angle_tol=5,
+            ltol=self.cfg.ltol,
+            stol=self.cfg.stol,
+            angle_tol=self.cfg.angle_tol,
         )
 
+        self.index = index
+
+        # с чем совпала последняя структура-дубликат, если совпадение
+        # найдено в индексе (другой запуск); None — совпала с принятой
+        # в этом запуске или не дубликат
+        self.last_match: Optional[Dict[str, Any]] = None
+
+        # пул для параллельного fit (создаётся при первой необходимости)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        # приведённая форма и подпись последней проверенной структуры:
+        # runner вызывает is_duplicate и сразу add_to_accepted для той же
+        # структуры, так что каждая структура приводится ровно один раз
+        self._last: Optional[Tuple[Structure, _Accepted]] = None
+
+        # счётчики (для профилирования): сколько fit вызвано / отсечено префильтром
+        self.n_fit = 0
+        self.n_skipped = 0
+
         # Buckets: индекс уже принятых структур для ускорения поиска дубликатов.
         #
         # Формат:
         #
         # {
-        #   (formula, spacegroup): [Structure, Structure, ...],
+        #   (formula, spacegroup): [_Accepted, _Accepted, ...],
         #   ...
         # }
         #
         # Пример:
         #
         # {
-        #   ("Fe2O3", 167): [struct1, struct2],
-        #   ("NiO", 225): [struct3]
+        #   ("Fe2O3", 167): [_Accepted(reduced1, sig1), _Accepted(reduced2, sig2)],
+        #   ("NiO", 225): [_Accepted(reduced3, sig3)]
         # }
         #
         # Это позволяет сравнивать новую структуру только с похожими,
         # а не со всеми ранее принятыми структурами.
-        self._buckets = {}
+        self._buckets: Dict[Tuple[str, int], List[_Accepted]] = {}
 
     def is_duplicate(self, struct: Structure, formula: str, sg: int) -> bool:
         """
@@ -78,9 +192,14 @@ class SimilarityChecker:
         Алгоритм:
 
         1. Определяем бакет по (formula, spacegroup)
-        2. Если бакет пуст → структура точно новая
-        3. Если бакет существует → сравниваем структуру с каждой в бакете
-        4. Если matcher.fit(...) возвращает True → структура дубликат
+        2. Если бакет пуст → в этом запуске совпадений нет
+        3. Если бакет существует → считаем подпись структуры и отсекаем
+           кандидатов, с которыми fit точно не совпадёт (may_match)
+        4. Оставшихся сортируем по похожести подписи и сравниваем
+           по очереди (или в пуле процессов, если jobs > 1)
+        5. Если matcher.fit(...) возвращает True → структура дубликат
+        6. Если есть постоянный индекс — то же самое для структур,
+           принятых в других запусках (в last_match пишется, с чем совпало)
 
         Parameters
         ----------
@@ -100,27 +219,158 @@ class SimilarityChecker:
             False → структура новая
         """
 
+        self.last_match = None
+
         # Формируем ключ бакета
         key = (formula, sg)
 
-        # Если такого бакета ещё нет,
-        # значит структуры с такой формулой и симметрией ещё не было
-        if key not in self._buckets:
-            return False
+        if key in self._buckets and self._bucket_has_match(struct, key):
+            return True
+
+        if self.index is not None:
+            return self._index_has_match(struct, formula, sg)
+
+        # Если совпадений не найдено → структура новая
+        return False
+
+    def _bucket_has_match(self, struct: Structure, key: Tuple[str, int]) -> bool:
+        """Сравнивает структуру с принятыми в этом запуске (бакет key)."""
 
         # Сравниваем только с структурами внутри соответствующего бакета.
         # Это резко ускоряет работу по сравнению со сравнением со всеми структурами.
-        for existing in self._buckets[key]:
+        #
+        # Внутри бакета: префильтр по подписи + порядок "самые похожие первыми".
+        prepared = self._prepare(struct)
+        sig = prepared.signature
+
+        candidates = [
+            existing
+            for existing in map(self._prepared, self._buckets[key])
+            if may_match(sig, existing.signature, self.cfg.ltol)
+        ]
+        self.n_skipped += len(self._buckets[key]) - len(candidates)
+
+        candidates.sort(key=lambda existing: distance(sig, existing.signature))
+
+        if self.jobs > 1 and len(candidates) >= self.jobs * _PARALLEL_MIN_PER_WORKER:
+            return self._fit_parallel(
+                prepared.reduced, [c.reduced for c in candidates]
+            )
+
+        for existing in candidates:
 
             # matcher.fit проверяет геометрическую эквивалентность структур.
             # Возвращает True, если структуры совпадают с учётом допусков.
-            if self.matcher.fit(struct, existing):
+            # Обе структуры уже приведены → пропускаем повторную редукцию.
+            self.n_fit += 1
+            if self.matcher.fit(
+                prepared.reduced, existing.reduced, skip_structure_reduction=True
+            ):
+                return True
+
+        return False
+
+    def _index_has_match(self, struct: Structure, formula: str, sg: int) -> bool:
+        """
+        Сравнивает структуру с принятыми в других запусках (DedupIndex).
+
+        Индекс сам отбирает кандидатов по бакету и необходимым условиям
+        на подпись, здесь они только упорядочиваются и проверяются fit.
+        """
+        prepared = self._prepare(struct)
+        sig = prepared.signature
+
+        candidates = sorted(
+            self.index.candidates(formula, sg, sig, self.cfg.ltol),
+            key=lambda existing: distance(sig, existing.signature),
+        )
+
+        for existing in candidates:
+            self.n_fit += 1
+            if self.matcher.fit(
+                prepared.reduced, existing.reduced, skip_structure_reduction=True
+            ):
+                self.last_match = {
+                    "source": existing.source,
+                    "model": existing.model,
+                    "structure_id": existing.structure_id,
+                }
                 return True
 
-        # Если совпадений не найдено → структура новая
         return False
 
-    def add_to_accepted(self, struct: Structure, formula: str, sg: int):
+    def _fit_parallel(self, reduced: Structure, candidates: List[Structure]) -> bool:
+        """
+        Раздаёт fit по кандидатам (приведённым формам) в пул процессов.
+
+        Кандидаты режутся на пачки в порядке похожести; как только
+        любая пачка нашла совпадение (или ожидание прервано таймаутом),
+        остальные отменяются.
+        Ответ тот же, что у последовательного перебора (any по всем).
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs)
+
+        params = (self.cfg.ltol, self.cfg.stol, self.cfg.angle_tol)
+        size = math.ceil(len(candidates) / (self.jobs * _PARALLEL_MIN_PER_WORKER))
+
+        pending: Set[Future] = {
+            self._pool.submit(_fit_any, params, reduced, candidates[i : i + size])
+            for i in range(0, len(candidates), size)
+        }
+        self.n_fit += len(candidates)
+
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if any(f.result() for f in done):
+                    return True
+        finally:
+            # совпадение найдено или ожидание прервано (лимит времени dedup)
+            for f in pending:
+                f.cancel()
+
+        return False
+
+    def _reduce(self, struct: Structure) -> Structure:
+        """
+        Приведённая (primitive + Niggli) форма структуры —
+        та же, что StructureMatcher строит внутри fit, поэтому
+        fit(..., skip_structure_reduction=True) на приведённых формах
+        даёт тот же ответ, что fit на исходных структурах.
+        """
+        return StructureMatcher._get_reduced_structure(
+            struct, primitive_cell=True, niggli=True
+        )
+
+    def _prepare(self, struct: Structure) -> _Accepted:
+        """
+        Приведённая форма + подпись проверяемой структуры
+        (последняя запоминается для add_to_accepted).
+        """
+        if self._last is not None and self._last[0] is struct:
+            return self._last[1]
+
+        prepared = self._prepared(_Accepted(structure=struct))
+        self._last = (struct, prepared)
+        return prepared
+
+    def _prepared(self, entry: _Accepted) -> _Accepted:
+        """Приводит структуру записи (один раз) и считает подпись."""
+        if entry.signature is None:
+            entry.reduced = self._reduce(entry.structure)
+            entry.signature = compute_signature(entry.reduced)
+            entry.structure = None
+        return entry
+
+    def add_to_accepted(
+        self,
+        struct: Structure,
+        formula: str,
+        sg: int,
+        *,
+        structure_id: Optional[str] = None,
+    ):
         """
         Добавляет валидированную структуру в индекс (bucket).
 
@@ -137,6 +387,10 @@ class SimilarityChecker:
 
         sg : int
             Номер пространственной группы.
+
+        structure_id : Optional[str]
+            Id структуры. Если задан и подключён постоянный индекс,
+            структура записывается и в него.
         """
 
         key = (formula, sg)
@@ -145,5 +399,33 @@ class SimilarityChecker:
         if key not in self._buckets:
             self._buckets[key] = []
 
-        # Добавляем структуру в бакет
-        self._buckets[key].append(struct)
+        # Добавляем в бакет запись о структуре.
+        # Если структуру только что проверяли в is_duplicate — сразу берём
+        # её приведённую форму и подпись, иначе они посчитаются при первом
+        # сравнении с ней.
+        if self._last is not None and self._last[0] is struct:
+            entry = self._last[1]
+        else:
+            entry = _Accepted(structure=struct)
+
+        self._buckets[key].append(entry)
+
+        # В постоянный индекс — сразу в приведённой форме
+        if self.index is not None and structure_id is not None:
+            entry = self._prepared(entry)
+            self.index.add(
+                structure_id=structure_id,
+                formula=formula,
+                sg=sg,
+                reduced=entry.reduced,
+                signature=entry.signature,
+            )
+
+    def close(self) -> None:
+        """Останавливает пул процессов и закрывает индекс (если есть)."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+        if self.index is not None:
+            self.index.close()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+"""
+signature.py — дешёвая "подпись" структуры для префильтра дедупликации.
+
+StructureMatcher.fit дорогой (поиск отображений решёток + перебор
+трансляций), а в одном бакете (formula, spacegroup) у "схлопнувшегося"
+генератора могут быть тысячи структур. Подпись позволяет:
+
+1. Отсечь кандидатов, которые ТОЧНО не совпадут (may_match):
+
+    - разное число сайтов в приведённой (primitive) ячейке:
+      при attempt_supercell=False fit требует равного числа сайтов;
+
+    - успешные минимумы решётки (длины Niggli a ≤ b ≤ c, нормированные
+      на (V/N)^(1/3)): fit(new, existing) ищет базис решётки new с длинами
+      в пределах (1 + ltol) от длин решётки existing, поэтому
+      λ_k(new) < (1 + ltol) · λ_k(existing) для k = 1..3.
+
+   Обе проверки — необходимые условия fit=True, поэтому префильтр не меняет
+   ответ is_duplicate по сравнению с полным перебором.
+
+2. Упорядочить оставшихся кандидатов по похожести (distance), чтобы
+   совпадение находилось как можно раньше (early exit).
+
+   Сюда входят углы Niggli, объём на атом и гистограмма межатомных
+   расстояний. Для отсечения они не используются: StructureMatcher
+   по умолчанию масштабирует объёмы (scale=True) и допускает смещения
+   сайтов до stol, поэтому жёсткий порог по ним мог бы выкинуть
+   настоящий дубликат.
+"""
+
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+from pymatgen.core import Structure
+
+# радиус гистограммы расстояний в единицах (V/N)^(1/3)
+_HIST_RADIUS = 3.0
+
+# число бинов гистограммы
+_HIST_BINS = 12
+
+# запас на численные допуски Niggli-редукции в pymatgen
+_LENGTH_MARGIN = 1e-3
+
+
+@dataclass(frozen=True)
+class StructureSignature:
+    """
+    Инварианты приведённой (primitive + Niggli) структуры.
+
+    n_sites
+        Число сайтов в приведённой ячейке.
+
+    lengths
+        Длины Niggli a ≤ b ≤ c, делённые на (V/N)^(1/3)
+        (не зависят от масштаба ячейки).
+
+    angles
+        Углы Niggli α, β, γ (градусы).
+
+    volume_per_atom
+        Объём на атом (Å³/atom) — только для ранжирования.
+
+    pair_hist
+        Нормированная гистограмма межатомных расстояний
+        (в единицах (V/N)^(1/3)), в среднем на один сайт.
+    """
+
+    n_sites: int
+    lengths: Tuple[float, float, float]
+    angles: Tuple[float, float, float]
+    volume_per_atom: float
+    pair_hist: Tuple[float, ...]
+
+
+def compute_signature(reduced: Structure) -> StructureSignature:
+    """
+    Считает подпись по УЖЕ приведённой структуре
+    (см. SimilarityChecker._reduce).
+    """
+    n_sites = len(reduced)
+    vpa = reduced.volume / n_sites
+    norm = vpa ** (1 / 3)
+
+    lattice = reduced.lattice
+    lengths = tuple(sorted(float(x) / norm for x in lattice.abc))
+    angles = tuple(float(x) for x in lattice.angles)
+
+    # межатомные расстояния в радиусе _HIST_RADIUS (с учётом периодичности)
+    _, _, _, dists = reduced.get_neighbor_list(r=_HIST_RADIUS * norm)
+    hist, _ = np.histogram(
+        dists / norm, bins=_HIST_BINS, range=(0.0, _HIST_RADIUS)
+    )
+
+    return StructureSignature(
+        n_sites=n_sites,
+        lengths=lengths,
+        angles=angles,
+        volume_per_atom=float(vpa),
+        pair_hist=tuple(float(x) / n_sites for x in hist),
+    )
+
+
+def lengths_lower_bound(
+    new: StructureSignature, ltol: float
+) -> Tuple[float, float, float]:
+    """
+    Нижняя граница нормированных длин Niggli для existing,
+    при которой fit(new, existing) ещё возможен:
+
+        λ_k(new) < (1 + ltol) · λ_k(existing)  ⇔  λ_k(existing) > λ_k(new) / (1 + ltol)
+    """
+    bound = (1 + ltol) * (1 + _LENGTH_MARGIN)
+    return tuple(x / bound for x in new.lengths)
+
+
+def may_match(
+    new: StructureSignature, existing: StructureSignature, ltol: float
+) -> bool:
+    """
+    Необходимое условие StructureMatcher.fit(new, existing) == True.
+
+    False → структуры точно не совпадут, fit можно не вызывать.
+    True  → совпадение возможно, решает fit.
+    """
+    if new.n_sites != existing.n_sites:
+        return False
+
+    lower = lengths_lower_bound(new, ltol)
+    return all(b > lo for lo, b in zip(lower, existing.lengths))
+
+
+def distance(a: StructureSignature, b: StructureSignature) -> float:
+    """
+    Мера непохожести подписей (только для порядка проверки кандидатов).
+    """
+    d_len = float(np.sum(np.abs(np.log(np.divide(a.lengths, b.lengths)))))
+    d_ang = float(np.sum(np.abs(np.subtract(a.angles, b.angles)))) / 90.0
+    d_vpa = abs(float(np.log(a.volume_per_atom / b.volume_per_atom)))
+    d_hist = float(np.sum(np.abs(np.subtract(a.pair_hist, b.pair_hist))))
+    d_hist /= max(sum(a.pair_hist) + sum(b.pair_hist), 1e-9)
+
+    return d_len + d_ang + d_vpa + d_hist
@@ -3,24 +3,62 @@ IO module: работа с файловой системой.
 
 Отвечает за:
     - обнаружение CIF-файлов,
+    - табличный вход (CIF, встроенные в CSV),
+    - архивы (CIF из tar/zip без распаковки, выход в tar),
     - чтение структур,
     - запись validated и rejected структур,
-    - запись reason.json.
+    - запись reason.json (или единого журнала rejections.jsonl),
+    - бинарное хранилище разобранных структур (structures.arrow/).
 
 Публичный API:
     discover_cifs
+    iter_cifs
+    iter_inputs
+    input_name
+    is_archive
+    iter_archive
+    TarArchiveWriter
+    InputTable
+    iter_table
+    check_table
     read_structure
+    parse_cif
     write_validated
     write_rejected
+    StructureWriter
+    RejectionLogReader
+    StructureStore
+    StructureStoreWriter
+    open_structure_store
 """
 
-from .discover import discover_cifs
-from .cif_reader import read_structure
-from .writers import write_validated, write_rejected
+from .archive import TarArchiveWriter, is_archive, iter_archive
+from .discover import discover_cifs, input_name, iter_cifs, iter_inputs
+from .table import InputTable, check_table, iter_table
+from .cif_reader import parse_cif, read_structure
+from .writers import StructureWriter, write_validated, write_rejected
+from .rejection_log import RejectionLogReader, RejectionLogWriter
+from .structure_store import StructureStore, StructureStoreWriter, open_structure_store
 
 __all__ = [
     "discover_cifs",
+    "iter_cifs",
+    "iter_inputs",
+    "input_name",
+    "is_archive",
+    "iter_archive",
+    "TarArchiveWriter",
+    "InputTable",
+    "iter_table",
+    "check_table",
     "read_structure",
+    "parse_cif",
     "write_validated",
     "write_rejected",
+    "StructureWriter",
+    "RejectionLogReader",
+    "RejectionLogWriter",
+    "StructureStore",
+    "StructureStoreWriter",
+    "open_structure_store",
 ]
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+"""
+archive.py — архивы вместо директорий: вход из tar/zip, выход в tar.
+
+Вход (--input-dir model_outputs.tar.zst):
+    генераторы отдают десятки тысяч CIF одним архивом. Вместо распаковки
+    (время + inode) архив читается последовательно, член за членом,
+    и каждый *.cif становится StructureItem с текстом CIF в памяти
+    (cif_text, как у табличного входа) — дальше тот же pipeline.
+
+    Поддерживаются .tar, .tar.gz / .tgz, .tar.bz2, .tar.xz, .zip
+    и .tar.zst / .tzst (нужен пакет zstandard — опциональная зависимость).
+
+    structure_id — путь члена в архиве ("gen/A.cif", без "./").
+    Порядок — порядок членов в архиве (как они были упакованы);
+    архив, собранный с tar --sort=name, даёт тот же порядок, что и обход
+    распакованной директории. Члены с абсолютным путём или ".."
+    пропускаются — иначе запись результатов вышла бы за пределы out_dir.
+
+Выход (--output-mode tar / tar.gz / tar.zst):
+    вместо деревьев validated_structures/ и rejected_structures/ —
+    два архива validated_structures.tar[.gz|.zst] и
+    rejected_structures.tar[.gz|.zst]. Пути внутри те же, что в режиме copy
+    (validated_structures/sub/A.cif, rejected_structures/sub/B.reason.json):
+    распакованный архив совпадает с результатом copy.
+
+    Архив пишется потоково; flush (перед checkpoint журнала прогресса)
+    сбрасывает сжатый поток на диск, так что всё попавшее в checkpoint
+    читается из архива. В PAX-заголовке comment каждого члена — structure_id:
+    при resume архив переписывается (TarArchiveWriter.reopen), в нём
+    остаются только структуры из checkpoint, и запись продолжается.
+"""
+
+import io
+import os
+import tarfile
+import time
+import zipfile
+import zlib
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Callable, Iterator, Optional, Set, Tuple
+
+from ..utils.types import StructureItem
+
+# расширения архивов, которые принимает --input-dir
+ARCHIVE_SUFFIXES: Tuple[str, ...] = (
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+    ".tar.zst",
+    ".tzst",
+    ".zip",
+)
+
+_ZSTD_SUFFIXES = (".tar.zst", ".tzst")
+
+# PAX-заголовок члена выходного архива со structure_id: стандартный
+# "comment" — tar и другие распаковщики его молча пропускают
+PAX_STRUCTURE_ID = "comment"
+
+
+def _require_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "Для архивов .tar.zst нужен zstandard: pip install zstandard"
+        ) from e
+
+    return zstandard
+
+
+def is_archive(path: Path) -> bool:
+    """Является ли path архивом (по расширению), а не директорией."""
+    return path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def archive_stem(path: Path) -> str:
+    """Имя архива без расширения архива: outputs.tar.zst → outputs."""
+    name = path.name
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+# =============================================================================
+# Вход: чтение CIF из архива
+# =============================================================================
+
+
+def _member_path(name: str) -> Optional[PurePosixPath]:
+    """Нормализованный относительный путь члена или None, если он небезопасен."""
+    path = PurePosixPath(name.replace("\\", "/"))
+    if path.is_absolute() or ".." in path.parts:
+        return None
+
+    parts = [p for p in path.parts if p != "."]
+    if not parts:
+        return None
+    return PurePosixPath(*parts)
+
+
+def _iter_tar_members(path: Path) -> Iterator[Tuple[str, bytes]]:
+    """(имя, содержимое) файлов tar-архива — потоково, в порядке архива."""
+    with path.open("rb") as raw:
+        if path.name.lower().endswith(_ZSTD_SUFFIXES):
+            zstd = _require_zstandard()
+            fileobj: BinaryIO = zstd.ZstdDecompressor().stream_reader(
+                raw, read_across_frames=True
+            )
+            mode = "r|"
+        else:
+            fileobj = raw
+            mode = "r|*"
+
+        # "r|" — потоковый режим: члены читаются строго по порядку,
+        # без перемотки и без индекса всего архива в памяти
+        with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                f = tar.extractfile(member)
+                yield member.name, f.read() if f is not None else b""
+
+
+def _iter_zip_members(path: Path) -> Iterator[Tuple[str, bytes]]:
+    """(имя, содержимое) файлов zip-архива в порядке архива."""
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            yield info.filename, zf.read(info)
+
+
+def iter_archive(path: Path) -> Iterator[StructureItem]:
+    """
+    StructureItem для каждого *.cif в архиве path (в порядке архива).
+
+    item.cif_text — текст CIF, item.path — сам архив.
+    """
+    if path.name.lower().endswith(".zip"):
+        members = _iter_zip_members(path)
+    else:
+        members = _iter_tar_members(path)
+
+    for name, data in members:
+        rel = _member_path(name)
+        if rel is None or not rel.name.endswith(".cif"):
+            continue
+
+        yield StructureItem(
+            structure_id=rel.as_posix(),
+            path=path,
+            rel_path=Path(rel),
+            cif_text=data.decode("utf-8", errors="replace"),
+        )
+
+
+# =============================================================================
+# Выход: потоковая запись tar
+# =============================================================================
+
+
+class TarArchiveWriter:
+    """
+    Потоково пишет tar (без сжатия, gzip или zstd) из байтов в памяти.
+
+    compression: "" / "gz" / "zst".
+    """
+
+    def __init__(self, path: Path, compression: str = ""):
+        self.path = path
+        self.compression = compression
+        self._mtime = int(time.time())
+
+        self._raw = path.open("wb")
+        self._stream: BinaryIO
+        if compression == "gz":
+            import gzip
+
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        elif compression == "zst":
+            zstd = _require_zstandard()
+            self._stream = zstd.ZstdCompressor().stream_writer(
+                self._raw, closefd=False
+            )
+        else:
+            self._stream = self._raw
+
+        # режим "w" (не "w|"): tarfile пишет каждый член сразу в _stream,
+        # без собственного буфера — flush() действительно сбрасывает всё
+        self._tar: Optional[tarfile.TarFile] = tarfile.open(
+            fileobj=self._stream, mode="w", format=tarfile.PAX_FORMAT
+        )
+
+    def add(self, name: str, data: bytes, *, structure_id: str) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self._mtime
+        info.mode = 0o644
+        info.pax_headers = {PAX_STRUCTURE_ID: structure_id}
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def flush(self) -> None:
+        """Сбрасывает записанные члены на диск (сжатый поток — до границы блока)."""
+        if self.compression == "gz":
+            self._stream.flush()
+        elif self.compression == "zst":
+            zstd = _require_zstandard()
+            self._stream.flush(zstd.FLUSH_BLOCK)
+        self._raw.flush()
+
+    def close(self) -> None:
+        if self._tar is None:
+            return
+
+        # конец архива (нулевые блоки), затем конец сжатого потока
+        self._tar.close()
+        self._tar = None
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+    @classmethod
+    def reopen(
+        cls, path: Path, compression: str, keep_ids: Set[str]
+    ) -> "TarArchiveWriter":
+        """
+        Resume: новый архив по тому же пути, в который перенесены члены
+        структур из keep_ids (каждый путь — один раз), и запись продолжается.
+
+        Старый архив мог быть оборван посреди члена (процесс убит) —
+        читается всё до обрыва. Копия прошлого архива лежит рядом
+        (<path>.prev) до конца переноса: если перенос сам прервётся,
+        следующий resume начнёт с неё же.
+        """
+        prev = path.with_name(path.name + ".prev")
+        if not prev.exists():
+            if not path.exists():
+                return cls(path, compression)
+            os.replace(path, prev)
+
+        writer = cls(path, compression)
+        seen: Set[str] = set()
+
+        for info, data in _iter_written(prev, compression):
+            structure_id = info.pax_headers.get(PAX_STRUCTURE_ID)
+            if structure_id in keep_ids and info.name not in seen:
+                seen.add(info.name)
+                writer.add(info.name, data, structure_id=structure_id)
+
+        writer.flush()
+        prev.unlink()
+        return writer
+
+
+class _SalvageReader:
+    """
+    Распаковывает оборванный сжатый поток до места обрыва.
+
+    GzipFile / stream_reader на обрыве поднимают исключение и теряют
+    уже распакованный хвост последнего чтения — а в нём могут быть члены
+    из checkpoint. Здесь обрыв (или ошибка) — просто конец данных.
+    """
+
+    def __init__(self, raw: BinaryIO, decompress: Callable[[bytes], bytes]):
+        self._raw = raw
+        self._decompress = decompress
+        self._buf = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buf) < size):
+            chunk = self._raw.read(1 << 16)
+            if not chunk:
+                self._eof = True
+                break
+            try:
+                self._buf += self._decompress(chunk)
+            except Exception:
+                self._eof = True
+
+        if size < 0:
+            size = len(self._buf)
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+
+def _iter_written(
+    path: Path, compression: str
+) -> Iterator[Tuple[tarfile.TarInfo, bytes]]:
+    """Члены архива TarArchiveWriter до конца или до места обрыва."""
+    with path.open("rb") as raw:
+        fileobj: Any = raw
+        if compression == "gz":
+            # wbits=31 — формат gzip (заголовок + deflate + трейлер)
+            fileobj = _SalvageReader(raw, zlib.decompressobj(wbits=31).decompress)
+        elif compression == "zst":
+            zstd = _require_zstandard()
+            fileobj = _SalvageReader(
+                raw, zstd.ZstdDecompressor().decompressobj().decompress
+            )
+
+        try:
+            with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+                for member in tar:
+                    f = tar.extractfile(member)
+                    data = f.read() if f is not None else b""
+                    if len(data) != member.size:
+                        break
+                    yield member, data
+        except (tarfile.TarError, EOFError, OSError):
+            # обрыв посреди члена: всё до checkpoint уже прочитано
+            return
@@ -1,5 +1,7 @@
 from __future__ import annotations
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
 import warnings
 from pymatgen.core import Structure
 
@@ -36,10 +38,26 @@ def read_structure(path: Path) -> Structure:
         Ошибка должна обрабатываться на уровне pipeline.runner,
         где структура будет помечена как rejected с причиной cif_parse_error.
     """
+    with _quiet_cif_warnings():
+        return Structure.from_file(path)
+
+
+def parse_cif(text: str) -> Structure:
+    """
+    Разбирает CIF из строки (табличный вход, см. io.table).
+
+    Результат и ошибки — как у read_structure для файла с тем же текстом.
+    """
+    with _quiet_cif_warnings():
+        return Structure.from_str(text, fmt="cif")
+
+
+@contextmanager
+def _quiet_cif_warnings() -> Iterator[None]:
     with warnings.catch_warnings():
         warnings.filterwarnings(
             "ignore",
             message=r".*fractional coordinates rounded to ideal values.*",
             category=UserWarning,
         )
-        return Structure.from_file(path)
+        yield
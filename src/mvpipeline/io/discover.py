@@ -1,7 +1,18 @@
 from __future__ import annotations
+
+import os
+import tempfile
+import warnings
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, Optional
+
 from ..utils.types import StructureItem
+from .archive import archive_stem, is_archive, iter_archive
+from .table import InputTable, iter_table
+
+# первая строка файла-манифеста: MANIFEST_HEADER + абсолютный путь input_dir
+# (остальные строки — относительные пути CIF)
+MANIFEST_HEADER = "# mvpipeline manifest: "
 
 
 def discover_cifs(input_dir: Path) -> List[StructureItem]:
@@ -32,6 +43,9 @@ def discover_cifs(input_dir: Path) -> List[StructureItem]:
     - воспроизводимость,
     - сохранение структуры директорий в output.
 
+    Для больших директорий лучше iter_cifs: он отдаёт структуры по мере
+    обхода, не собирая весь список в памяти.
+
     Parameters
     ----------
     input_dir : Path
@@ -42,26 +56,196 @@ def discover_cifs(input_dir: Path) -> List[StructureItem]:
     List[StructureItem]
         Список найденных структур, отсортированный по пути для воспроизводимости.
     """
+    return list(iter_cifs(input_dir))
+
+
+def iter_cifs(input_dir: Path, *, ordered: bool = True) -> Iterator[StructureItem]:
+    """
+    Потоковый обход input_dir (os.scandir): отдаёт StructureItem по мере обхода.
+
+    ordered=True
+        Внутри каждой директории записи сортируются по имени, обход — в глубину.
+        Порядок совпадает с sorted(input_dir.rglob("*.cif")) (пути сравниваются
+        по компонентам), поэтому результат запуска тот же, что у discover_cifs.
+        В памяти держится только листинг текущей директории.
+
+    ordered=False
+        Порядок файловой системы (без сортировки) — быстрее на огромных
+        директориях, но порядок (а значит, и то, какая из одинаковых структур
+        считается "первой" при дедупликации) может меняться между запусками.
+
+    Как и rglob, не заходит в символические ссылки на директории
+    и пропускает директории, которые не удаётся прочитать.
+    """
+    root = str(input_dir)
+
+    for path in _walk(root, ordered):
+        yield _make_item(input_dir, Path(path))
+
+
+def _walk(dir_path: str, ordered: bool) -> Iterator[str]:
+    """Пути *.cif под dir_path (в глубину)."""
+    try:
+        with os.scandir(dir_path) as it:
+            entries = sorted(it, key=lambda e: e.name) if ordered else list(it)
+    except OSError:
+        return
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path, ordered)
+            elif entry.name.endswith(".cif") and entry.is_file():
+                yield entry.path
+        except OSError:
+            continue
 
-    # Рекурсивно находим все *.cif
-    files = sorted(input_dir.rglob("*.cif"))
 
-    items: List[StructureItem] = []
+def input_name(input_dir: Path) -> str:
+    """Имя входа для model_name по умолчанию: имя папки или архива без расширения."""
+    if is_archive(input_dir) and input_dir.is_file():
+        return archive_stem(input_dir)
+    return input_dir.name
 
-    for f in files:
 
-        # относительный путь используется как уникальный ID структуры
-        rel = f.relative_to(input_dir)
+def _make_item(input_dir: Path, path: Path) -> StructureItem:
+    # относительный путь используется как уникальный ID структуры
+    rel = path.relative_to(input_dir)
 
-        # нормализуем путь (важно для Windows/Linux совместимости)
-        structure_id = str(rel).replace("\\", "/")
+    # нормализуем путь (важно для Windows/Linux совместимости)
+    structure_id = str(rel).replace("\\", "/")
 
-        items.append(
-            StructureItem(
-                structure_id=structure_id,
-                path=f,
-                rel_path=rel,
-            )
+    return StructureItem(structure_id=structure_id, path=path, rel_path=rel)
+
+
+# =============================================================================
+# Манифест: заранее сохранённый список входных файлов
+# =============================================================================
+
+
+def iter_manifest(manifest: Path, input_dir: Path) -> Iterator[StructureItem]:
+    """
+    Читает манифест: по относительному пути CIF на строку (в порядке обработки).
+
+    Пустые строки и строки, начинающиеся с "#", пропускаются.
+    Если в заголовке записана другая input_dir — ValueError
+    (иначе все пути из манифеста указывали бы мимо).
+
+    Манифест — кэш обхода и может устареть: файлы, которых уже нет,
+    пропускаются (одно предупреждение в конце — сколько и какой первый).
+    Новые файлы, появившиеся после построения манифеста, в него не
+    попадают — манифест нужно удалить и построить заново.
+    """
+    root = str(input_dir.resolve())
+    missing = 0
+    first_missing = ""
+
+    with manifest.open("r", encoding="utf-8") as f:
+        for line in f:
+            rel = line.rstrip("\n")
+            if rel.startswith(MANIFEST_HEADER):
+                built_for = rel[len(MANIFEST_HEADER):]
+                if built_for != root:
+                    raise ValueError(
+                        f"Манифест {manifest} построен для {built_for}, а не для {root}"
+                    )
+                continue
+            if not rel or rel.startswith("#"):
+                continue
+
+            path = input_dir / rel
+            if not path.is_file():
+                missing += 1
+                first_missing = first_missing or rel
+                continue
+            yield _make_item(input_dir, path)
+
+    if missing:
+        warnings.warn(
+            f"Манифест {manifest}: {missing} файл(ов) нет в {input_dir} "
+            f"(например, {first_missing}) — пропущены",
+            stacklevel=2,
         )
 
-    return items
+
+def _tee_manifest(
+    items: Iterable[StructureItem], manifest: Path, input_dir: Path
+) -> Iterator[StructureItem]:
+    """
+    Пропускает items дальше и параллельно пишет их в манифест.
+
+    Манифест появляется (атомарно, через rename) только если обход
+    дошёл до конца — недописанный список не будет принят за полный.
+
+    Временный файл у каждого процесса свой (mkstemp): шарды (--shard i/N)
+    с общим --manifest строят его одновременно и не затирают друг друга;
+    побеждает последний rename, содержимое у всех одинаковое.
+    """
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=manifest.parent, prefix=manifest.name + ".", suffix=".tmp"
+    )
+    tmp = Path(tmp_name)
+
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(MANIFEST_HEADER + str(input_dir.resolve()) + "\n")
+            for item in items:
+                f.write(item.structure_id + "\n")
+                yield item
+
+        # mkstemp создаёт файл 0600; манифест — с правами обычного open()
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, manifest)
+    finally:
+        # обход прерван — недописанный временный файл не нужен
+        tmp.unlink(missing_ok=True)
+
+
+def iter_inputs(
+    input_dir: Optional[Path],
+    *,
+    manifest: Optional[Path] = None,
+    ordered: bool = True,
+    table: Optional[InputTable] = None,
+) -> Iterator[StructureItem]:
+    """
+    Источник входных структур для runner.
+
+    table задана
+        Строки таблицы (iter_table); input_dir, manifest и ordered
+        не используются.
+
+    input_dir — архив (.tar, .tar.gz, .tar.zst, .zip, ...)
+        Члены архива по порядку, без распаковки (iter_archive);
+        manifest и ordered не используются.
+
+    manifest=None
+        Потоковый обход input_dir (iter_cifs).
+
+    manifest существует
+        Список берётся из манифеста — без обхода файловой системы.
+
+    manifest задан, но файла нет
+        Обход input_dir, найденные пути по ходу записываются в манифест
+        (следующий запуск с тем же манифестом стартует мгновенно).
+    """
+    if table is not None:
+        yield from iter_table(table)
+        return
+
+    if is_archive(input_dir) and input_dir.is_file():
+        yield from iter_archive(input_dir)
+        return
+
+    if manifest is not None and manifest.exists():
+        yield from iter_manifest(manifest, input_dir)
+        return
+
+    items = iter_cifs(input_dir, ordered=ordered)
+    if manifest is not None:
+        items = _tee_manifest(items, manifest, input_dir)
+
+    yield from items
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+"""
+rejection_log.py — единый журнал причин отклонения вместо *.reason.json.
+
+При --rejection-log jsonl (или jsonl.gz) содержимое, которое раньше шло
+в отдельный rejected_structures/<path>.reason.json, дописывается строкой
+в out_dir/rejections.jsonl (rejections.jsonl.gz):
+
+    {"structure_id": "a.cif", "reason": "duplicate", "details": {...}}
+
+Рядом лежит индекс смещений rejections.idx:
+
+    <block>\t<inner>\t<structure_id>     — где лежит запись
+    =<size>                              — граница сброшенного блока
+
+    jsonl     block — смещение строки в файле, inner = 0
+    jsonl.gz  block — смещение gzip-member (один member на сброс),
+              inner — смещение строки внутри распакованного member
+
+Файл .gz — обычная конкатенация gzip-member'ов: zcat / gzip.open читают его
+целиком, а RejectionLogReader по индексу распаковывает только нужный блок.
+
+Запись буферизуется и сбрасывается вместе с checkpoint журнала прогресса
+(runner вызывает flush перед checkpoint), так что всё, что попало
+в checkpoint, уже есть в журнале причин. При продолжении (append) файл
+и индекс обрезаются до последней границы "=<size>" — недописанный блок
+убитого процесса отбрасывается. Новый журнал (не append) удаляет журнал
+другого формата: индекс у форматов общий, и в out_dir должен остаться
+только тот журнал, которому он соответствует.
+
+После resume в журнале могут встретиться повторы одной структуры
+(обработанной после checkpoint) — читатель берёт последнюю запись.
+"""
+
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..utils.constants import RejectionLogFormat
+
+REJECTION_LOG_FILENAME = "rejections.jsonl"
+REJECTION_LOG_GZ_FILENAME = "rejections.jsonl.gz"
+REJECTION_INDEX_FILENAME = "rejections.idx"
+
+
+def rejection_log_path(out_dir: Path, fmt: RejectionLogFormat) -> Path:
+    """Путь к журналу причин для формата fmt."""
+    if RejectionLogFormat(fmt) == RejectionLogFormat.JSONL_GZ:
+        return out_dir / REJECTION_LOG_GZ_FILENAME
+    return out_dir / REJECTION_LOG_FILENAME
+
+
+def _read_index(
+    index_path: Path,
+) -> Tuple[List[Tuple[int, int, str]], int, int]:
+    """
+    Читает индекс до последней границы блока.
+
+    Returns
+    -------
+    (entries, log_size, index_size)
+        записи (block, inner, structure_id), размер журнала и индекса
+        на последней границе.
+    """
+    entries: List[Tuple[int, int, str]] = []
+    committed: List[Tuple[int, int, str]] = []
+    log_size = 0
+    index_size = 0
+
+    if not index_path.exists():
+        return committed, log_size, index_size
+
+    with index_path.open("rb") as f:
+        offset = 0
+        for raw in f:
+            offset += len(raw)
+            if not raw.endswith(b"\n"):
+                # недописанная строка (процесс убит посреди записи)
+                break
+
+            line = raw[:-1].decode("utf-8")
+            if line.startswith("="):
+                committed = list(entries)
+                log_size = int(line[1:])
+                index_size = offset
+                continue
+
+            block, inner, structure_id = line.split("\t", 2)
+            entries.append((int(block), int(inner), structure_id))
+
+    return committed, log_size, index_size
+
+
+class RejectionLogWriter:
+    """
+    Писатель журнала причин отклонения.
+
+    add(payload)
+        Запоминает запись (payload как у reason.json) в буфере.
+
+    flush()
+        Дописывает буфер одним блоком (для .gz — одним gzip-member)
+        и границу блока в индекс, делает fsync.
+    """
+
+    def __init__(
+        self,
+        out_dir: Path,
+        fmt: RejectionLogFormat = RejectionLogFormat.JSONL,
+        *,
+        append: bool = False,
+    ):
+        self.fmt = RejectionLogFormat(fmt)
+        self.path = rejection_log_path(out_dir, self.fmt)
+        self.index_path = out_dir / REJECTION_INDEX_FILENAME
+        self._pending: List[Tuple[str, bytes]] = []
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        if append and self.path.exists():
+            # отбрасываем всё после последнего полностью записанного блока
+            _, self._size, index_size = _read_index(self.index_path)
+            with self.path.open("r+b") as f:
+                f.truncate(self._size)
+            if self.index_path.exists():
+                with self.index_path.open("r+b") as f:
+                    f.truncate(index_size)
+            self._log = self.path.open("ab")
+            self._index = self.index_path.open("ab")
+        else:
+            # rejections.idx общий у обоих форматов, а читатель выбирает формат
+            # по наличию .gz: журнал другого формата от прошлого запуска
+            # иначе читался бы по новому индексу
+            for name in (REJECTION_LOG_FILENAME, REJECTION_LOG_GZ_FILENAME):
+                if out_dir / name != self.path:
+                    (out_dir / name).unlink(missing_ok=True)
+
+            self._size = 0
+            self._log = self.path.open("wb")
+            self._index = self.index_path.open("wb")
+
+    def add(self, payload: Dict[str, Any]) -> None:
+        line = json.dumps(payload, ensure_ascii=False) + "\n"
+        self._pending.append((payload["structure_id"], line.encode("utf-8")))
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+
+        block = self._size
+        index_lines: List[str] = []
+
+        if self.fmt == RejectionLogFormat.JSONL_GZ:
+            inner = 0
+            for structure_id, line in self._pending:
+                index_lines.append(f"{block}\t{inner}\t{structure_id}\n")
+                inner += len(line)
+
+            # mtime=0 в заголовке → одинаковый вход даёт одинаковый файл
+            comp = zlib.compressobj(6, zlib.DEFLATED, 31)
+            data = comp.compress(b"".join(line for _, line in self._pending))
+            data += comp.flush()
+        else:
+            offset = block
+            for structure_id, line in self._pending:
+                index_lines.append(f"{offset}\t0\t{structure_id}\n")
+                offset += len(line)
+            data = b"".join(line for _, line in self._pending)
+
+        self._log.write(data)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._size += len(data)
+
+        # индекс — после данных: граница блока появляется, только когда блок на диске
+        index_lines.append(f"={self._size}\n")
+        self._index.write("".join(index_lines).encode("utf-8"))
+        self._index.flush()
+        os.fsync(self._index.fileno())
+
+        self._pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._log.close()
+        self._index.close()
+
+
+class RejectionLogReader:
+    """
+    Чтение журнала причин отклонения по structure_id.
+
+        reader = RejectionLogReader(out_dir)
+        reader.get("subdir/a.cif")
+        → {"structure_id": "subdir/a.cif", "reason": "duplicate", "details": {...}}
+
+    Индекс (structure_id → смещение) загружается в память при открытии;
+    каждый get читает одну строку (для .gz — распаковывает один блок,
+    последний распакованный блок кэшируется).
+    """
+
+    def __init__(self, out_dir: Path):
+        gz = out_dir / REJECTION_LOG_GZ_FILENAME
+        self.compressed = gz.exists()
+        self.path = gz if self.compressed else out_dir / REJECTION_LOG_FILENAME
+
+        if not self.path.exists():
+            raise FileNotFoundError(f"Журнал причин не найден в {out_dir}")
+
+        entries, _, _ = _read_index(out_dir / REJECTION_INDEX_FILENAME)
+
+        # при повторах (resume) побеждает последняя запись
+        self._offsets: Dict[str, Tuple[int, int]] = {
+            structure_id: (block, inner) for block, inner, structure_id in entries
+        }
+
+        self._block_offset: Optional[int] = None
+        self._block: bytes = b""
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, structure_id: str) -> bool:
+        return structure_id in self._offsets
+
+    def ids(self) -> Iterator[str]:
+        return iter(self._offsets)
+
+    def get(self, structure_id: str) -> Optional[Dict[str, Any]]:
+        """Запись для structure_id (None, если структура не отклонялась)."""
+        loc = self._offsets.get(structure_id)
+        if loc is None:
+            return None
+
+        block, inner = loc
+
+        if not self.compressed:
+            with self.path.open("rb") as f:
+                f.seek(block)
+                return json.loads(f.readline())
+
+        data = self._load_block(block)
+        end = data.index(b"\n", inner)
+        return json.loads(data[inner:end])
+
+    def _load_block(self, block: int) -> bytes:
+        """Распаковывает один gzip-member, начинающийся со смещения block."""
+        if self._block_offset == block:
+            return self._block
+
+        decomp = zlib.decompressobj(31)
+        parts: List[bytes] = []
+
+        with self.path.open("rb") as f:
+            f.seek(block)
+            while not decomp.eof:
+                chunk = f.read(1 << 16)
+                if not chunk:
+                    break
+                parts.append(decomp.decompress(chunk))
+
+        self._block_offset = block
+        self._block = b"".join(parts)
+        return self._block
@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+"""
+structure_store.py — бинарное хранилище разобранных структур (Arrow IPC).
+
+Разбор CIF (pymatgen) — самая дорогая часть чтения, а одни и те же файлы
+разбирают несколько раз: pipeline, страница Explore, ноутбуки анализа.
+mvp --structure-store пишет рядом с результатами
+
+    structures.arrow/
+        part-00000.arrow
+        part-00001.arrow
+        ...
+
+— уже разобранные структуры-кандидаты (прошедшие per-structure стадии:
+validated и отклонённые как duplicate) в виде непрерывных массивов:
+
+    structure_id   string
+    status         validated / rejected
+    lattice        fixed_size_list<float64, 9>       — матрица решётки (Å)
+    frac_coords    list<fixed_size_list<float64, 3>> — дробные координаты
+    species        list<int16>                       — индексы в таблице видов
+
+Таблица видов (состав сайта: {"Fe": 1.0}, {"O2-": 1.0}, {"Fe": 0.5, "Co": 0.5})
+лежит в метаданных схемы part-файла (ключ "species"). Свойства сайтов
+(magmom и т.п.) не сохраняются.
+
+Part-файлы — Arrow IPC без сжатия, поэтому StructureStore открывает их
+через memory map: данные не копируются в память, пока их не тронули,
+а Structure собирается только для запрошенных structure_id.
+
+    store = StructureStore("outputs/my_model/structures.arrow")
+    struct = store.get("gen/A.cif")
+    lattice, frac, species = store.arrays("gen/A.cif")   # numpy, без копий
+
+Part-файл пишется при каждом checkpoint журнала прогресса (как part-файлы
+all_structures.parquet), при resume из хранилища убираются структуры,
+не попавшие в checkpoint (StructureStoreWriter.prune).
+
+pyarrow — опциональная зависимость: нужен только для хранилища.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from pymatgen.core import Lattice, Structure
+
+from ..utils.constants import ValidationStatus
+
+DEFAULT_STORE_DIRNAME = "structures.arrow"
+
+_PART_PATTERN = "part-{:05d}.arrow"
+
+# ключ метаданных схемы с таблицей видов part-файла
+_SPECIES_KEY = b"species"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "Для --structure-store нужен pyarrow: pip install pyarrow"
+        ) from e
+
+    return pyarrow
+
+
+def store_schema():
+    """Схема part-файла хранилища (без метаданных)."""
+    pa = _require_pyarrow()
+
+    return pa.schema(
+        [
+            ("structure_id", pa.string()),
+            ("status", pa.dictionary(pa.int8(), pa.string())),
+            ("lattice", pa.list_(pa.float64(), 9)),
+            ("frac_coords", pa.list_(pa.list_(pa.float64(), 3))),
+            ("species", pa.list_(pa.int16())),
+        ]
+    )
+
+
+def _site_species(struct: Structure) -> List[Dict[str, float]]:
+    """Состав каждого сайта: {вид: заселённость} (вид — "Fe", "O2-", ...)."""
+    return [
+        {str(sp): float(amount) for sp, amount in site.species.items()}
+        for site in struct
+    ]
+
+
+def _part_paths(path: Path) -> List[Path]:
+    if not path.is_dir():
+        return []
+    return sorted(
+        p
+        for p in path.iterdir()
+        if p.name.startswith("part-") and p.name.endswith(".arrow")
+    )
+
+
+# =============================================================================
+# Запись
+# =============================================================================
+
+
+class StructureStoreWriter:
+    """
+    Буферизированная запись хранилища: add() копит структуры, flush()
+    пишет их новым part-файлом (атомарно: .tmp → rename).
+
+    runner вызывает flush() перед каждым checkpoint журнала прогресса,
+    так что всё, что попало в checkpoint, уже лежит в хранилище.
+    """
+
+    def __init__(self, path: Path, *, append: bool = False):
+        self.path = path
+        self._pa = _require_pyarrow()
+        self._schema = store_schema()
+
+        if not append:
+            # part-файлы прошлого запуска в этом out_dir
+            for part in _part_paths(path):
+                part.unlink()
+        path.mkdir(parents=True, exist_ok=True)
+
+        parts = _part_paths(path)
+        self._n_parts = (
+            int(parts[-1].name[len("part-") : -len(".arrow")]) + 1 if parts else 0
+        )
+        self._rows: List[Tuple[str, str, Structure]] = []
+
+    def add(
+        self, structure_id: str, status: ValidationStatus, struct: Structure
+    ) -> None:
+        self._rows.append((structure_id, ValidationStatus(status).value, struct))
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+
+        species_index: Dict[str, int] = {}
+        species_table: List[Dict[str, float]] = []
+
+        ids, statuses, lattices, coords, species = [], [], [], [], []
+        for structure_id, status, struct in self._rows:
+            indices = []
+            for composition in _site_species(struct):
+                key = json.dumps(composition, sort_keys=True)
+                if key not in species_index:
+                    species_index[key] = len(species_table)
+                    species_table.append(composition)
+                indices.append(species_index[key])
+
+            ids.append(structure_id)
+            statuses.append(status)
+            lattices.append(struct.lattice.matrix.reshape(9).tolist())
+            coords.append(struct.frac_coords.tolist())
+            species.append(indices)
+
+        self._write_part(ids, statuses, lattices, coords, species, species_table)
+        self._rows.clear()
+
+    def _write_part(
+        self,
+        ids: List[str],
+        statuses: List[str],
+        lattices: List[List[float]],
+        coords: List[List[List[float]]],
+        species: List[List[int]],
+        species_table: List[Dict[str, float]],
+    ) -> None:
+        pa = self._pa
+        import pyarrow.ipc
+
+        schema = self._schema.with_metadata(
+            {_SPECIES_KEY: json.dumps(species_table).encode("utf-8")}
+        )
+        table = pa.Table.from_arrays(
+            [
+                pa.array(ids, type=pa.string()),
+                pa.array(statuses, type=pa.string()).dictionary_encode(),
+                pa.array(lattices, type=schema.field("lattice").type),
+                pa.array(coords, type=schema.field("frac_coords").type),
+                pa.array(species, type=schema.field("species").type),
+            ],
+            schema=schema,
+        )
+
+        dst = self.path / _PART_PATTERN.format(self._n_parts)
+        tmp = dst.with_name(dst.name + ".tmp")
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with pyarrow.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, dst)
+
+        self._n_parts += 1
+
+    def prune(self, keep_ids: Set[str]) -> None:
+        """
+        Resume: оставляет в хранилище только структуры из keep_ids.
+
+        Part-файл, записанный перед checkpoint, который сам не успел
+        лечь на диск, содержит лишние структуры — он переписывается.
+        """
+        for tmp in self.path.glob("*.tmp"):
+            tmp.unlink()
+
+        for part in _part_paths(self.path):
+            table = _read_part(part)
+            ids = table.column("structure_id").to_pylist()
+            keep = [i for i, structure_id in enumerate(ids) if structure_id in keep_ids]
+            if len(keep) == len(ids):
+                continue
+
+            if not keep:
+                part.unlink()
+                continue
+
+            import pyarrow.ipc
+
+            table = table.take(keep)
+            tmp = part.with_name(part.name + ".tmp")
+            with self._pa.OSFile(str(tmp), "wb") as sink:
+                with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp, part)
+
+    def close(self) -> None:
+        self.flush()
+
+
+def _read_part(path: Path) -> Any:
+    """Part-файл как pyarrow.Table поверх memory map (без копирования)."""
+    pa = _require_pyarrow()
+    import pyarrow.ipc
+
+    source = pa.memory_map(str(path), "r")
+    return pyarrow.ipc.open_file(source).read_all()
+
+
+# =============================================================================
+# Чтение
+# =============================================================================
+
+
+class StructureStore:
+    """
+    Хранилище structures.arrow/ для чтения (memory map, ленивая сборка Structure).
+
+    ids
+        structure_id всех структур (в порядке записи).
+
+    get(structure_id) / store[structure_id]
+        pymatgen Structure — собирается при каждом вызове.
+
+    arrays(structure_id)
+        (lattice 3×3, frac_coords n×3, species n) — numpy-представления
+        данных part-файла без копирования; виды — индексы в species_table().
+
+    status(structure_id)
+        "validated" / "rejected".
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._parts = [_read_part(p) for p in _part_paths(self.path)]
+        self._species = [
+            json.loads(part.schema.metadata[_SPECIES_KEY]) for part in self._parts
+        ]
+
+        # structure_id → (part, строка); при повторе побеждает последняя запись
+        self._index: Dict[str, Tuple[int, int]] = {}
+        for p, part in enumerate(self._parts):
+            for row, structure_id in enumerate(part.column("structure_id").to_pylist()):
+                self._index[structure_id] = (p, row)
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, structure_id: object) -> bool:
+        return structure_id in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __getitem__(self, structure_id: str) -> Structure:
+        return self.get(structure_id)
+
+    def _locate(self, structure_id: str) -> Tuple[int, int]:
+        try:
+            return self._index[structure_id]
+        except KeyError:
+            raise KeyError(f"Структуры {structure_id!r} нет в {self.path}") from None
+
+    def species_table(self, structure_id: str) -> List[Dict[str, float]]:
+        """Таблица видов part-файла, в котором лежит structure_id."""
+        p, _ = self._locate(structure_id)
+        return self._species[p]
+
+    def status(self, structure_id: str) -> str:
+        p, row = self._locate(structure_id)
+        return self._parts[p].column("status")[row].as_py()
+
+    def arrays(self, structure_id: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        p, row = self._locate(structure_id)
+        part = self._parts[p]
+
+        lattice = part.column("lattice")[row].values.to_numpy().reshape(3, 3)
+        frac = part.column("frac_coords")[row].values.flatten().to_numpy()
+        species = part.column("species")[row].values.to_numpy()
+        return lattice, frac.reshape(-1, 3), species
+
+    def get(self, structure_id: str) -> Structure:
+        lattice, frac, species = self.arrays(structure_id)
+        table = self.species_table(structure_id)
+        return Structure(
+            Lattice(lattice),
+            [table[i] for i in species],
+            frac,
+        )
+
+    def iter_structures(self) -> Iterator[Tuple[str, Structure]]:
+        """(structure_id, Structure) по порядку записи — по одной за раз."""
+        for structure_id in self._index:
+            yield structure_id, self.get(structure_id)
+
+
+def open_structure_store(path: Path) -> Optional[StructureStore]:
+    """StructureStore, если хранилище есть и pyarrow установлен, иначе None."""
+    if not _part_paths(Path(path)):
+        return None
+    try:
+        return StructureStore(path)
+    except ImportError:
+        return None
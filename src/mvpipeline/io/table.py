@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+"""
+table.py — табличный вход: CIF, встроенные в CSV (без распаковки в файлы).
+
+Датасеты вроде datasets/raw_data/concdvae.csv хранят CIF целиком
+в колонке cif. Вместо того чтобы раскладывать их по отдельным *.cif
+ради discover_cifs, таблица читается кусками (pandas, chunksize строк)
+и каждая строка превращается в StructureItem с текстом CIF в памяти —
+дальше тот же pipeline.
+
+    mvp --input-table concdvae.csv --cif-column cif --id-column material_id ...
+
+Вместо колонки с текстом CIF можно указать колонку с путями к файлам
+(path_column) — таблица тогда работает как список входов
+(например, samples/concdvae_cifs/merge_all_cif.csv, колонка cif_path).
+Пути не проверяются при чтении: отсутствующий или нечитаемый файл
+отклоняется как input_unreadable (stages), без копии в out_dir.
+
+Память: строки читаются кусками, но имя файла (для validated/rejected)
+и ID каждой прочитанной строки хранятся, чтобы поймать повтор ID
+и совпадение имён — O(число строк), порядка сотни байт на строку
+(1 млн строк — ~100–200 МБ).
+"""
+
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from ..utils.types import StructureItem
+
+# строк таблицы в одном куске чтения
+DEFAULT_TABLE_CHUNK_ROWS = 1000
+
+
+@dataclass(frozen=True)
+class InputTable:
+    """
+    Табличный источник входных структур.
+
+    path
+        CSV-файл (сжатие .gz / .bz2 / .zst / ... — по расширению, как в pandas).
+
+    cif_column
+        Колонка с текстом CIF.
+
+    id_column
+        Колонка с уникальным ID структуры (structure_id). None — номер
+        строки данных (0, 1, 2, ...).
+
+    path_column
+        Колонка с путями к CIF-файлам — вместо cif_column. Относительные
+        пути считаются от директории таблицы.
+
+    chunk_rows
+        Сколько строк читать за раз (в памяти — один кусок).
+    """
+
+    path: Path
+    cif_column: str = "cif"
+    id_column: Optional[str] = None
+    path_column: Optional[str] = None
+    chunk_rows: int = DEFAULT_TABLE_CHUNK_ROWS
+
+    @property
+    def name(self) -> str:
+        """Имя таблицы без расширений (имя модели по умолчанию)."""
+        return self.path.name.split(".")[0]
+
+
+def _file_name(structure_id: str) -> str:
+    """Имя файла структуры в validated/rejected: ID без разделителей пути + .cif."""
+    name = structure_id.replace("/", "_").replace("\\", "_")
+    return name if name.endswith(".cif") else name + ".cif"
+
+
+def _unique_file_name(structure_id: str, names: Dict[str, str]) -> Optional[str]:
+    """
+    _file_name, не занятое другим ID ("a/b" и "a_b" дают одно имя a_b.cif).
+
+    При совпадении к имени добавляется хэш ID: a_b~1f3a9c0d.cif.
+    Какой из ID получит суффикс, зависит только от порядка строк,
+    поэтому при resume и в шардах имена те же.
+
+    names — имя файла → ID (заполняется); None — ID уже встречался.
+    """
+    name = _file_name(structure_id)
+    if name in names:
+        if names[name] == structure_id:
+            return None
+        digest = hashlib.sha1(structure_id.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:-len('.cif')]}~{digest}.cif"
+        if names.get(name) == structure_id:
+            return None
+    names[name] = structure_id
+    return name
+
+
+def _columns(table: InputTable) -> List[str]:
+    columns = [table.path_column or table.cif_column]
+    if table.id_column is not None:
+        columns.append(table.id_column)
+    return columns
+
+
+def check_table(table: InputTable) -> None:
+    """
+    Проверяет, что в таблице есть нужные колонки (читается только заголовок).
+
+    Raises
+    ------
+    ValueError
+        Если колонок нет.
+    """
+    header = pd.read_csv(table.path, nrows=0).columns
+    missing = [c for c in _columns(table) if c not in header]
+    if missing:
+        raise ValueError(f"В таблице {table.path} нет колонок: {', '.join(missing)}")
+
+
+def iter_table(table: InputTable) -> Iterator[StructureItem]:
+    """
+    Потоково читает таблицу и отдаёт StructureItem в порядке строк.
+
+    cif_column: item.cif_text — текст CIF, item.path — сама таблица.
+    path_column: item.path — путь из таблицы, как у обычного CIF-файла.
+
+    Память — O(число строк): имена файлов и ID (см. модуль).
+
+    Raises
+    ------
+    ValueError
+        Если в таблице нет нужных колонок или ID повторяется
+        (structure_id — ключ журнала прогресса и all_structures).
+    """
+    check_table(table)
+
+    columns = _columns(table)
+    value_column = columns[0]
+    base_dir = table.path.parent
+    names: Dict[str, str] = {}
+    row = 0
+
+    chunks = pd.read_csv(
+        table.path,
+        usecols=columns,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=max(1, table.chunk_rows),
+    )
+
+    for chunk in chunks:
+        values = chunk[value_column].tolist()
+        ids = (
+            chunk[table.id_column].tolist()
+            if table.id_column is not None
+            else range(row, row + len(chunk))
+        )
+
+        for structure_id, value in zip(ids, values):
+            structure_id = str(structure_id)
+            name = _unique_file_name(structure_id, names)
+            if name is None:
+                raise ValueError(
+                    f"ID {structure_id!r} повторяется в таблице {table.path}"
+                )
+            rel_path = Path(name)
+
+            if table.path_column is not None:
+                yield StructureItem(
+                    structure_id=structure_id,
+                    path=base_dir / value,
+                    rel_path=rel_path,
+                )
+            else:
+                yield StructureItem(
+                    structure_id=structure_id,
+                    path=table.path,
+                    rel_path=rel_path,
+                    cif_text=value,
+                )
+
+        row += len(chunk)
@@ -1,11 +1,100 @@
 from __future__ import annotations
+import csv
 import json
+import os
 import shutil
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from typing import Dict, Optional, Set
+
+from ..utils.constants import OutputMode, RejectionLogFormat
 from ..utils.types import StructureItem, ValidationResult
+from .archive import TarArchiveWriter
+from .rejection_log import RejectionLogWriter
+
+# индекс путей для OutputMode.MANIFEST
+OUTPUT_MANIFEST_FILENAME = "output_manifest.csv"
+
+# OutputMode.TAR* → сжатие архивов validated/rejected
+_ARCHIVE_COMPRESSION = {
+    OutputMode.TAR: "",
+    OutputMode.TAR_GZ: "gz",
+    OutputMode.TAR_ZST: "zst",
+}
+
+OUTPUT_MANIFEST_FIELDS = ["structure_id", "status", "input_path"]
+
+# ioctl(FICLONE) — reflink на Linux (Btrfs, XFS, bcachefs, ...)
+_FICLONE = 0x40049409
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    """Copy-on-write клон src → dst. OSError, если ФС/ОС не умеет."""
+    import fcntl
+
+    with src.open("rb") as fsrc, dst.open("wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+
+
+def _place(src: Path, dst: Path, mode: OutputMode) -> None:
+    """
+    Кладёт входной CIF по пути dst согласно mode.
+
+    hardlink / reflink при неудаче (другая ФС, нет поддержки)
+    откатываются на обычную копию — результат тот же, только без экономии.
+    """
+    # dst мог остаться от прошлого запуска (возможно, ссылкой на src):
+    # удаляем, чтобы не писать "сквозь" ссылку во входной файл
+    if dst.is_symlink() or dst.exists():
+        dst.unlink()
+
+    if mode == OutputMode.SYMLINK:
+        os.symlink(src.resolve(), dst)
+        return
+
+    if mode == OutputMode.HARDLINK:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+
+    elif mode == OutputMode.REFLINK:
+        try:
+            _reflink(src, dst)
+            return
+        except (OSError, ImportError):
+            dst.unlink(missing_ok=True)
+
+    shutil.copy(src, dst)
+
+
+def _source_readable(item: StructureItem) -> bool:
+    """Есть ли что класть в out_dir (нет — rejection input_unreadable)."""
+    if item.cif_text is not None:
+        return True
+    return item.path.is_file() and os.access(item.path, os.R_OK)
+
+
+def _place_item(item: StructureItem, dst: Path, mode: OutputMode) -> None:
+    """
+    _place для входного файла; CIF из таблицы (item.cif_text) просто
+    записывается в dst — ссылаться не на что, поэтому mode не важен.
+
+    Если входного файла нет (или он не читается), ничего не создаётся.
+    """
+    if item.cif_text is None:
+        if _source_readable(item):
+            _place(item.path, dst, mode)
+        return
+
+    if dst.is_symlink() or dst.exists():
+        dst.unlink()
+    dst.write_text(item.cif_text, encoding="utf-8")
 
 
-def write_validated(item: StructureItem, out_dir: Path) -> Path:
+def write_validated(
+    item: StructureItem, out_dir: Path, mode: OutputMode = OutputMode.COPY
+) -> Path:
     """
     Сохраняет валидированную структуру в validated_structures/.
 
@@ -28,6 +117,9 @@ def write_validated(item: StructureItem, out_dir: Path) -> Path:
     out_dir : Path
         Корневая директория output.
 
+    mode : OutputMode
+        Копия / hardlink / reflink / symlink (MANIFEST — см. StructureWriter).
+
     Returns
     -------
     Path
@@ -39,16 +131,28 @@ def write_validated(item: StructureItem, out_dir: Path) -> Path:
     # создаём директории, если их нет
     dst.parent.mkdir(parents=True, exist_ok=True)
 
-    # копируем исходный CIF
-    shutil.copy(item.path, dst)
+    # копируем (или связываем) исходный CIF
+    _place_item(item, dst, mode)
 
     return dst
 
 
+def rejection_payload(item: StructureItem, result: ValidationResult) -> dict:
+    """Содержимое reason.json (и строки журнала rejections.jsonl)."""
+    return {
+        "structure_id": item.structure_id,
+        "reason": result.rejection.reason if result.rejection else "unknown",
+        "details": result.rejection.details if result.rejection else {},
+    }
+
+
 def write_rejected(
     item: StructureItem,
     out_dir: Path,
     result: ValidationResult,
+    mode: OutputMode = OutputMode.COPY,
+    *,
+    reason_file: bool = True,
 ) -> Path:
     """
     Сохраняет отклонённую структуру и файл причины отклонения.
@@ -79,6 +183,13 @@ def write_rejected(
     result : ValidationResult
         Результат валидации структуры.
 
+    mode : OutputMode
+        Копия / hardlink / reflink / symlink (MANIFEST — см. StructureWriter).
+
+    reason_file : bool
+        Писать ли reason.json (False — причина уходит в журнал
+        rejections.jsonl, см. StructureWriter).
+
     Returns
     -------
     Path
@@ -90,24 +201,204 @@ def write_rejected(
     # создаём директории
     dst.parent.mkdir(parents=True, exist_ok=True)
 
-    # копируем CIF
-    shutil.copy(item.path, dst)
+    # копируем (или связываем) CIF
+    _place_item(item, dst, mode)
+
+    if not reason_file:
+        return dst
 
     # создаём reason.json рядом с CIF
     reason_path = dst.with_suffix(".reason.json")
 
-    payload = {
-        "structure_id": item.structure_id,
-        "reason": result.rejection.reason if result.rejection else "unknown",
-        "details": result.rejection.details if result.rejection else {},
-    }
-
     reason_path.write_text(
         json.dumps(
-            payload,
+            rejection_payload(item, result),
             ensure_ascii=False,
             indent=2,
         )
     )
 
     return dst
+
+
+class StructureWriter:
+    """
+    Раскладывает результаты по out_dir согласно OutputMode.
+
+    Для COPY / HARDLINK / REFLINK / SYMLINK — те же validated_structures/
+    и rejected_structures/ (+ *.reason.json), что и write_validated / write_rejected.
+
+    Для MANIFEST файлы не создаются: каждая структура — строка
+    в out_dir/output_manifest.csv (structure_id, status, input_path).
+
+    Для TAR / TAR_GZ / TAR_ZST — те же пути, но членами архивов
+    validated_structures.<mode> и rejected_structures.<mode>
+    (io/archive.py). При append архивы открывает prune().
+
+    rejection_log (jsonl / jsonl.gz) — причины отклонения вместо *.reason.json
+    пишутся в единый журнал (RejectionLogWriter). Его буфер сбрасывается
+    в flush(), который runner вызывает перед checkpoint журнала прогресса.
+    Для MANIFEST без rejection_log причины есть только в all_structures.csv.
+
+    Строки манифеста пишутся сразу (как и файлы в остальных режимах),
+    поэтому после прерванного запуска в нём могут быть структуры,
+    не попавшие в checkpoint журнала — их убирает prune() при resume.
+    """
+
+    def __init__(
+        self,
+        out_dir: Path,
+        mode: OutputMode = OutputMode.COPY,
+        *,
+        rejection_log: RejectionLogFormat = RejectionLogFormat.FILES,
+        append: bool = False,
+    ):
+        self.out_dir = out_dir
+        self.mode = OutputMode(mode)
+
+        self._log: Optional[RejectionLogWriter] = None
+        if RejectionLogFormat(rejection_log) != RejectionLogFormat.FILES:
+            self._log = RejectionLogWriter(out_dir, rejection_log, append=append)
+
+        self._file = None
+        self._writer: Optional[csv.writer] = None
+
+        # "validated_structures" / "rejected_structures" → архив
+        self._archives: Dict[str, TarArchiveWriter] = {}
+        if self.mode in _ARCHIVE_COMPRESSION and not append:
+            for kind in ("validated_structures", "rejected_structures"):
+                self._archives[kind] = TarArchiveWriter(
+                    self.archive_path(kind), _ARCHIVE_COMPRESSION[self.mode]
+                )
+
+        if self.mode == OutputMode.MANIFEST:
+            path = self.manifest_path
+            fresh = not (append and path.exists())
+            self._file = path.open("w" if fresh else "a", encoding="utf-8", newline="")
+            self._writer = csv.writer(self._file)
+            if fresh:
+                self._writer.writerow(OUTPUT_MANIFEST_FIELDS)
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.out_dir / OUTPUT_MANIFEST_FILENAME
+
+    def archive_path(self, kind: str) -> Path:
+        """validated_structures.tar.gz и т.п. (для режимов TAR*)."""
+        return self.out_dir / f"{kind}.{self.mode.value}"
+
+    def _add_to_archive(self, kind: str, item: StructureItem) -> PurePosixPath:
+        name = PurePosixPath(kind, item.rel_path.as_posix())
+        if not _source_readable(item):
+            return name
+        data = (
+            item.cif_text.encode("utf-8")
+            if item.cif_text is not None
+            else item.path.read_bytes()
+        )
+        self._archives[kind].add(str(name), data, structure_id=item.structure_id)
+        return name
+
+    def validated(self, item: StructureItem) -> None:
+        if self._writer is not None:
+            self._writer.writerow([item.structure_id, "validated", str(item.path)])
+            return
+
+        if self._archives:
+            self._add_to_archive("validated_structures", item)
+            return
+
+        write_validated(item, self.out_dir, self.mode)
+
+    def rejected(self, item: StructureItem, result: ValidationResult) -> None:
+        if self._log is not None:
+            self._log.add(rejection_payload(item, result))
+
+        if self._writer is not None:
+            self._writer.writerow([item.structure_id, "rejected", str(item.path)])
+            return
+
+        if self._archives:
+            name = self._add_to_archive("rejected_structures", item)
+            if self._log is None:
+                payload = json.dumps(
+                    rejection_payload(item, result), ensure_ascii=False, indent=2
+                )
+                self._archives["rejected_structures"].add(
+                    str(name.with_suffix(".reason.json")),
+                    payload.encode("utf-8"),
+                    structure_id=item.structure_id,
+                )
+            return
+
+        write_rejected(
+            item, self.out_dir, result, self.mode, reason_file=self._log is None
+        )
+
+    def prune(self, done_ids: Set[str]) -> None:
+        """
+        Resume: оставляет в манифесте (архивах) только структуры из done_ids
+        (по одной строке / одному члену на путь) и открывает их для дописывания.
+        В остальных режимах ничего не делает — файлы перезаписываются
+        при повторной обработке.
+        """
+        if self.mode in _ARCHIVE_COMPRESSION:
+            for kind in ("validated_structures", "rejected_structures"):
+                if kind in self._archives:
+                    self._archives[kind].close()
+                self._archives[kind] = TarArchiveWriter.reopen(
+                    self.archive_path(kind),
+                    _ARCHIVE_COMPRESSION[self.mode],
+                    done_ids,
+                )
+            return
+
+        if self._writer is None:
+            return
+
+        self._file.close()
+
+        path = self.manifest_path
+        tmp = path.with_name(path.name + ".tmp")
+        seen: Set[str] = set()
+
+        with path.open("r", encoding="utf-8", newline="") as fin, tmp.open(
+            "w", encoding="utf-8", newline=""
+        ) as fout:
+            reader = csv.reader(fin)
+            writer = csv.writer(fout)
+            writer.writerow(next(reader, OUTPUT_MANIFEST_FIELDS))
+            for row in reader:
+                if row and row[0] in done_ids and row[0] not in seen:
+                    seen.add(row[0])
+                    writer.writerow(row)
+
+        os.replace(tmp, path)
+
+        self._file = path.open("a", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+
+    def flush(self) -> None:
+        """Сбрасывает на диск журнал причин, манифест и архивы."""
+        if self._log is not None:
+            self._log.flush()
+
+        for archive in self._archives.values():
+            archive.flush()
+
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+        for archive in self._archives.values():
+            archive.close()
+        self._archives = {}
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
@@ -9,10 +9,17 @@ Pipeline module: сборка всех компонентов в единый va
 
 Публичный API:
     run_validation
+    merge_shards
+    run_batch             — несколько моделей в одном процессе (mvp batch)
+    load_batch_manifest
 """
 
-from .runner import run_validation
+from .batch import load_batch_manifest, run_batch
+from .runner import merge_shards, run_validation
 
 __all__ = [
     "run_validation",
+    "merge_shards",
+    "run_batch",
+    "load_batch_manifest",
 ]
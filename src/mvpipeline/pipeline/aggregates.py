@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+"""
+aggregates.py — потоковые (O(1) по памяти) агрегаты для RunStats.
+
+Раньше RunStats копил плотности и объёмы на атом всех валидных структур
+в списках ради одного среднего в конце. Здесь каждое значение сразу
+"вливается" в накопители фиксированного размера:
+
+    - сумма, min/max;
+    - среднее и дисперсия по Уэлфорду (устойчиво к округлению);
+    - гистограмма с фиксированными границами бинов (+ underflow / overflow);
+    - квантили: точные, пока значений не больше EXACT_QUANTILE_LIMIT
+      (значения хранятся в буфере); дальше — приближённые алгоритмом P²
+      (Jain & Chlamtac, 1985): 5 маркеров на квантиль, без хранения выборки.
+
+Обычный запуск — десятки–тысячи валидных структур: на таких выборках P²
+заметно ошибается и зависит от порядка входа (архив или манифест дают
+другой порядок — другие p5/p95). Точный буфер даёт одинаковые числа
+при любом порядке; память ограничена EXACT_QUANTILE_LIMIT значениями.
+
+Границы гистограмм фиксированы (не зависят от данных), поэтому гистограммы
+разных запусков и моделей можно сравнивать бин в бин. Исключение —
+min_distance в RunStats: значение известно только ниже радиуса поиска
+geometry (distance_cutoff), и гистограмма строится на [0, cutoff).
+"""
+
+import math
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# квантили в отчёте
+REPORT_QUANTILES: Tuple[float, ...] = (0.05, 0.5, 0.95)
+
+# число бинов гистограмм в отчёте
+HISTOGRAM_BINS = 40
+
+# до стольких значений квантили считаются точно (буфер значений),
+# больше — P² (буфер проигрывается в оценщики и освобождается)
+EXACT_QUANTILE_LIMIT = 10_000
+
+
+def _exact_quantile(xs: List[float], p: float) -> Optional[float]:
+    """Квантиль отсортированной выборки: линейная интерполяция, как numpy."""
+    if not xs:
+        return None
+    pos = p * (len(xs) - 1)
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+
+class P2Quantile:
+    """
+    Оценка p-квантиля алгоритмом P² за O(1) памяти.
+
+    Хранит 5 маркеров: min, p/2, p, (1+p)/2, max. При каждом новом значении
+    позиции маркеров сдвигаются, а высоты корректируются параболической
+    (при необходимости — линейной) интерполяцией.
+    """
+
+    def __init__(self, p: float):
+        self.p = p
+        self._head: List[float] = []
+        self._q: List[float] = []
+        self._n = [0, 1, 2, 3, 4]
+        self._want = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self._step = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float) -> None:
+        if not self._q:
+            self._head.append(x)
+            if len(self._head) == 5:
+                self._q = sorted(self._head)
+            return
+
+        q, n = self._q, self._n
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect_right(q, x) - 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._want[i] += self._step[i]
+
+        for i in (1, 2, 3):
+            d = self._want[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                qp = self._parabolic(i, s)
+                if q[i - 1] < qp < q[i + 1]:
+                    q[i] = qp
+                else:
+                    q[i] = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                n[i] += s
+
+    def _parabolic(self, i: int, s: int) -> float:
+        q, n = self._q, self._n
+        return q[i] + s / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        if self._q:
+            return self._q[2]
+
+        if not self._head:
+            return None
+
+        # < 5 значений — точный квантиль
+        return _exact_quantile(sorted(self._head), self.p)
+
+
+@dataclass
+class Histogram:
+    """
+    Гистограмма с фиксированными бинами [lo, hi) (равной ширины).
+
+    Значения < lo и >= hi считаются в underflow / overflow.
+    """
+
+    lo: float
+    hi: float
+    bins: int = HISTOGRAM_BINS
+
+    counts: List[int] = field(init=False)
+    underflow: int = 0
+    overflow: int = 0
+
+    def __post_init__(self) -> None:
+        self.counts = [0] * self.bins
+
+    def add(self, x: float) -> None:
+        if x < self.lo:
+            self.underflow += 1
+        elif x >= self.hi:
+            self.overflow += 1
+        else:
+            k = int((x - self.lo) / (self.hi - self.lo) * self.bins)
+            self.counts[min(k, self.bins - 1)] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lo": self.lo,
+            "hi": self.hi,
+            "counts": list(self.counts),
+            "underflow": self.underflow,
+            "overflow": self.overflow,
+        }
+
+
+class StreamingStats:
+    """
+    Потоковые агрегаты одной величины.
+
+    add(x)
+        Учитывает значение; None — значение неизвестно (например,
+        min_distance больше радиуса поиска) и идёт в счётчик n_missing.
+
+    summary()
+        count, mean, std (по генеральной совокупности, как numpy.std),
+        min, max, p5/p50/p95, гистограмма. Квантили точные, пока
+        count <= exact_limit, дальше — P² ("quantiles": "exact" / "p2").
+    """
+
+    def __init__(
+        self,
+        lo: float,
+        hi: float,
+        *,
+        bins: int = HISTOGRAM_BINS,
+        exact_limit: int = EXACT_QUANTILE_LIMIT,
+    ):
+        self.count = 0
+        self.n_missing = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.histogram = Histogram(lo, hi, bins)
+        self._exact_limit = exact_limit
+        # значения для точных квантилей; None — перешли на P²
+        self._values: Optional[List[float]] = []
+        self._quantiles: List[P2Quantile] = []
+
+    def add(self, x: Optional[float]) -> None:
+        if x is None:
+            self.n_missing += 1
+            return
+
+        x = float(x)
+
+        self.count += 1
+        self.total += x
+
+        # Welford
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+
+        self.histogram.add(x)
+
+        if self._values is not None:
+            self._values.append(x)
+            if len(self._values) <= self._exact_limit:
+                return
+            # буфер переполнен: дальше — P², буфер проигрывается в порядке прихода
+            self._quantiles = [P2Quantile(p) for p in REPORT_QUANTILES]
+            values, self._values = self._values, None
+            for v in values:
+                for q in self._quantiles:
+                    q.add(v)
+            return
+
+        for q in self._quantiles:
+            q.add(x)
+
+    @property
+    def avg(self) -> float:
+        """Среднее как sum / count (0, если значений нет)."""
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / self.count) if self.count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "count": self.count,
+            "n_missing": self.n_missing,
+            "mean": self.avg,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+        }
+
+        if self._values is not None:
+            xs = sorted(self._values)
+            for p in REPORT_QUANTILES:
+                out[f"p{round(p * 100)}"] = _exact_quantile(xs, p)
+            out["quantiles"] = "exact"
+        else:
+            for p, q in zip(REPORT_QUANTILES, self._quantiles):
+                out[f"p{round(p * 100)}"] = q.value()
+            out["quantiles"] = "p2"
+
+        out["histogram"] = self.histogram.to_dict()
+        return out
@@ -0,0 +1,453 @@
+from __future__ import annotations
+
+"""
+batch.py — несколько моделей за один запуск: mvp batch batch.yaml.
+
+scripts/run_validation.sh вызывал mvp на каждую модель: каждый вызов заново
+импортировал pymatgen, читал thresholds.yaml и train_reference.csv и
+поднимал холодный пул процессов. Здесь все модели идут в одном процессе:
+
+    - thresholds.yaml читается один раз на файл;
+    - пул процессов (jobs > 1) один на весь batch: воркеры загружают каждый
+      train_reference один раз (stages._get_reference) и сохраняют прогретые
+      кэши (spglib, степени окисления, читатель --cache-dir) между моделями;
+    - модели выполняются по очереди, каждая — на всём пуле: per-structure
+      стадии занимают все ядра, а дедупликация и запись (главный процесс)
+      остаются такими же, как у отдельного mvp;
+    - ошибка одной модели не останавливает остальные: она попадает в сводку.
+
+Результаты каждой модели — те же файлы, что у mvp с теми же параметрами
+(<out_dir модели>/validation_report.json, all_structures.csv, ...).
+В корневой out_dir batch пишется общая сводка по моделям:
+
+    batch_summary.json   — метрики отчётов, причины отклонения по моделям,
+                           время и статус каждой модели
+    batch_summary.csv    — таблица метрик: строка на модель
+
+Формат batch.yaml (пути — как в аргументах mvp, от текущей директории):
+
+    jobs: 0                         # процессов на весь batch (0 — все ядра)
+    out_dir: outputs                # сводка; out_dir модели по умолчанию —
+                                    # out_dir/<model_name>
+    defaults:                       # общие параметры моделей
+      thresholds: config/thresholds.yaml
+      cache_dir: .mvp-cache
+
+    models:
+      - input_dir: samples/mattergen_cifs
+        train_reference: datasets/mattergen/train_reference.csv
+      - model_name: concdvae
+        input_table: datasets/raw_data/concdvae.csv
+        output_mode: manifest
+
+Параметры модели (в defaults и в models) называются как опции mvp:
+_JOB_KEYS. Значение в models перекрывает defaults.
+"""
+
+import csv
+import json
+import time
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from ..io import InputTable, check_table, input_name, is_archive
+from ..utils import PipelineConfig, load_config
+from ..utils.constants import OutputMode, RecordsFormat, RejectionLogFormat
+from .parallel import WorkerPool, resolve_jobs
+from .runner import run_validation
+
+BATCH_SUMMARY_FILENAME = "batch_summary.json"
+BATCH_SUMMARY_CSV_FILENAME = "batch_summary.csv"
+
+# ключи верхнего уровня batch.yaml
+_MANIFEST_KEYS = {"jobs", "out_dir", "defaults", "models"}
+
+# параметры модели: вход, выход и опции run_validation (как у mvp)
+_JOB_KEYS = {
+    "model_name",
+    "input_dir",
+    "input_table",
+    "cif_column",
+    "id_column",
+    "path_column",
+    "out_dir",
+    "thresholds",
+    "train_reference",
+    "cache_dir",
+    "cache_max_mb",
+    "dedup_jobs",
+    "dedup_index",
+    "manifest",
+    "fs_order",
+    "output_mode",
+    "rejection_log",
+    "records_format",
+    "structure_store",
+    "profile",
+    "resume",
+}
+
+# метрики validation_report.json, которые попадают в сводку
+_SUMMARY_METRICS = (
+    "n_total",
+    "n_validated",
+    "n_rejected",
+    "validity_ratio",
+    "duplicate_ratio",
+    "magnetic_ratio",
+    "novelty_ratio",
+    "avg_density",
+    "avg_volume_per_atom",
+)
+
+
+# =============================================================================
+# Описание batch
+# =============================================================================
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    """
+    Одна модель batch: вход, выход и параметры run_validation.
+
+    options
+        Остальные аргументы run_validation (cache_dir, output_mode, ...),
+        уже приведённые к нужным типам.
+    """
+
+    model_name: str
+    out_dir: Path
+    input_dir: Optional[Path] = None
+    input_table: Optional[InputTable] = None
+    thresholds: Optional[Path] = None
+    train_reference: Optional[Path] = None
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class BatchManifest:
+    """
+    Разобранный batch.yaml.
+
+    jobs
+        Число процессов на весь batch (как --jobs: 1 — без пула, 0 — все ядра).
+
+    out_dir
+        Куда писать batch_summary.json / batch_summary.csv.
+    """
+
+    path: Path
+    jobs: int
+    out_dir: Path
+    models: List[BatchJob]
+
+
+def _optional_path(value: Any) -> Optional[Path]:
+    return None if value is None else Path(value)
+
+
+def _job_from_dict(params: Dict[str, Any], *, root: Path) -> BatchJob:
+    """
+    BatchJob из параметров модели (defaults + запись models).
+
+    Raises
+    ------
+    ValueError
+        Если параметры неизвестны, значения некорректны или вход не найден.
+    """
+    unknown = sorted(set(params) - _JOB_KEYS)
+    if unknown:
+        raise ValueError(f"неизвестные параметры: {', '.join(unknown)}")
+
+    input_dir = _optional_path(params.get("input_dir"))
+    table_path = _optional_path(params.get("input_table"))
+
+    # ------------------------------------------------------------
+    # вход — те же проверки, что у mvp
+    # ------------------------------------------------------------
+
+    if (input_dir is None) == (table_path is None):
+        raise ValueError("нужен ровно один вход: input_dir или input_table")
+
+    table: Optional[InputTable] = None
+    if table_path is not None:
+        if not table_path.is_file():
+            raise ValueError(f"input_table не найден: {table_path}")
+        table = InputTable(
+            path=table_path,
+            cif_column=params.get("cif_column", "cif"),
+            id_column=params.get("id_column"),
+            path_column=params.get("path_column"),
+        )
+        check_table(table)
+    elif not input_dir.exists():
+        raise ValueError(f"input_dir не существует: {input_dir}")
+    elif is_archive(input_dir) and not input_dir.is_file():
+        raise ValueError(f"input_dir: архив не найден: {input_dir}")
+
+    if (table is not None or is_archive(input_dir)) and (
+        params.get("manifest") is not None or params.get("fs_order")
+    ):
+        raise ValueError("manifest и fs_order относятся только к input_dir-директории")
+
+    # опечатка в пути молча выключила бы novelty или пороги —
+    # в batch это обнаружилось бы только в сводке, поэтому ошибка сразу
+    thresholds = _optional_path(params.get("thresholds"))
+    if thresholds is not None and not thresholds.is_file():
+        raise ValueError(f"thresholds не найден: {thresholds}")
+
+    train_reference = _optional_path(params.get("train_reference"))
+    if train_reference is not None and not train_reference.is_file():
+        raise ValueError(f"train_reference не найден: {train_reference}")
+
+    model_name = params.get("model_name") or (
+        table.name if table is not None else input_name(input_dir)
+    )
+    out_dir = _optional_path(params.get("out_dir")) or root / model_name
+
+    options: Dict[str, Any] = {
+        "cache_dir": _optional_path(params.get("cache_dir")),
+        "dedup_jobs": int(params.get("dedup_jobs", 1)),
+        "dedup_index": _optional_path(params.get("dedup_index")),
+        "manifest": _optional_path(params.get("manifest")),
+        "fs_order": bool(params.get("fs_order", False)),
+        "output_mode": OutputMode(params.get("output_mode", OutputMode.COPY)),
+        "rejection_log": RejectionLogFormat(
+            params.get("rejection_log", RejectionLogFormat.FILES)
+        ),
+        "records_format": RecordsFormat(
+            params.get("records_format", RecordsFormat.CSV)
+        ),
+        "structure_store": bool(params.get("structure_store", False)),
+        "profile": bool(params.get("profile", False)),
+        "resume": bool(params.get("resume", False)),
+    }
+    if "cache_max_mb" in params:
+        options["cache_max_bytes"] = int(params["cache_max_mb"]) * 1024 * 1024
+
+    return BatchJob(
+        model_name=str(model_name),
+        out_dir=out_dir,
+        input_dir=input_dir,
+        input_table=table,
+        thresholds=thresholds,
+        train_reference=train_reference,
+        options=options,
+    )
+
+
+def load_batch_manifest(path: Path) -> BatchManifest:
+    """
+    Читает и проверяет batch.yaml (формат — в описании модуля).
+
+    Все модели проверяются до запуска первой из них: входы существуют,
+    параметры известны, out_dir моделей не совпадают.
+
+    Raises
+    ------
+    ValueError
+        Если batch.yaml некорректен.
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        raw = yaml.safe_load(f) or {}
+
+    if not isinstance(raw, dict):
+        raise ValueError(f"{path}: ожидается словарь с ключом models")
+
+    unknown = sorted(set(raw) - _MANIFEST_KEYS)
+    if unknown:
+        raise ValueError(f"{path}: неизвестные ключи: {', '.join(unknown)}")
+
+    defaults = raw.get("defaults") or {}
+    entries = raw.get("models") or []
+    if not isinstance(defaults, dict):
+        raise ValueError(f"{path}: defaults должен быть словарём")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: models — непустой список моделей")
+
+    root = Path(raw.get("out_dir", "outputs"))
+
+    models: List[BatchJob] = []
+    for k, entry in enumerate(entries):
+        where = f"{path}: models[{k}]"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: ожидается словарь параметров модели")
+        try:
+            models.append(_job_from_dict({**defaults, **entry}, root=root))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{where}: {e}") from None
+
+    seen: Dict[Path, str] = {}
+    for job in models:
+        key = job.out_dir.resolve()
+        if key in seen:
+            raise ValueError(
+                f"{path}: у моделей {seen[key]!r} и {job.model_name!r} "
+                f"один out_dir: {job.out_dir}"
+            )
+        seen[key] = job.model_name
+
+    return BatchManifest(
+        path=path,
+        jobs=int(raw.get("jobs", 1)),
+        out_dir=root,
+        models=models,
+    )
+
+
+# =============================================================================
+# Запуск
+# =============================================================================
+
+
+def _model_summary(
+    job: BatchJob,
+    report: Optional[Dict[str, Any]],
+    wall_s: float,
+    error: Optional[str],
+) -> Dict[str, Any]:
+    row: Dict[str, Any] = {
+        "model_name": job.model_name,
+        "out_dir": str(job.out_dir),
+        "status": "failed" if error is not None else "ok",
+        "wall_s": round(wall_s, 3),
+    }
+    if error is not None:
+        row["error"] = error
+        return row
+
+    for key in _SUMMARY_METRICS:
+        row[key] = report.get(key)
+    row["rejection_reasons"] = report.get("rejection_reasons", {})
+    return row
+
+
+def batch_summary(
+    manifest: BatchManifest,
+    models: List[Dict[str, Any]],
+    *,
+    jobs: int,
+    wall_s: float,
+) -> Dict[str, Any]:
+    """
+    Сводка batch по моделям: метрики отчётов, общие итоги и таблица
+    причин отклонения reason → {model_name: count}.
+    """
+    done = [m for m in models if m["status"] == "ok"]
+
+    reasons: Dict[str, Dict[str, int]] = {}
+    for m in done:
+        for reason, count in m["rejection_reasons"].items():
+            reasons.setdefault(reason, {})[m["model_name"]] = count
+
+    totals = {
+        key: sum(m[key] or 0 for m in done)
+        for key in ("n_total", "n_validated", "n_rejected")
+    }
+    totals["validity_ratio"] = (
+        totals["n_validated"] / totals["n_total"] if totals["n_total"] else 0.0
+    )
+
+    return {
+        "manifest": str(manifest.path),
+        "jobs": jobs,
+        "wall_s": round(wall_s, 3),
+        "n_models": len(models),
+        "n_failed": len(models) - len(done),
+        "totals": totals,
+        "models": models,
+        "rejection_reasons": dict(sorted(reasons.items())),
+    }
+
+
+def _write_summary(out_dir: Path, summary: Dict[str, Any]) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    (out_dir / BATCH_SUMMARY_FILENAME).write_text(
+        json.dumps(summary, indent=2, ensure_ascii=False)
+    )
+
+    columns = ["model_name", "status", *_SUMMARY_METRICS, "wall_s", "out_dir"]
+    with open(out_dir / BATCH_SUMMARY_CSV_FILENAME, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(summary["models"])
+
+
+def run_batch(
+    manifest: BatchManifest,
+    *,
+    jobs: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Выполняет все модели batch по очереди в одном процессе и пишет сводку.
+
+    jobs
+        Число процессов (None — из batch.yaml). При jobs > 1 один пул
+        процессов обслуживает все модели.
+
+    Returns
+    -------
+    dict
+        batch_summary.json.
+    """
+    n_jobs = resolve_jobs(manifest.jobs if jobs is None else jobs)
+    configs: Dict[Optional[Path], PipelineConfig] = {}
+
+    pool: Optional[WorkerPool] = None
+    if n_jobs > 1:
+        pool = WorkerPool(n_jobs)
+
+    started = time.perf_counter()
+    models: List[Dict[str, Any]] = []
+
+    try:
+        for job in manifest.models:
+            if job.thresholds not in configs:
+                configs[job.thresholds] = (
+                    load_config(job.thresholds)
+                    if job.thresholds is not None
+                    else PipelineConfig()
+                )
+
+            t0 = time.perf_counter()
+            report, error = None, None
+            try:
+                report = run_validation(
+                    input_dir=job.input_dir,
+                    input_table=job.input_table,
+                    out_dir=job.out_dir,
+                    cfg=configs[job.thresholds],
+                    train_reference=job.train_reference,
+                    model_name=job.model_name,
+                    jobs=n_jobs,
+                    pool=pool,
+                    **job.options,
+                )
+            except BrokenProcessPool as e:
+                # упавший воркер ломает пул целиком — следующим моделям новый
+                error = f"{type(e).__name__}: {e}"
+                pool.restart()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+
+            models.append(
+                _model_summary(job, report, time.perf_counter() - t0, error)
+            )
+
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    summary = batch_summary(
+        manifest, models, jobs=n_jobs, wall_s=time.perf_counter() - started
+    )
+    _write_summary(manifest.out_dir, summary)
+
+    return summary
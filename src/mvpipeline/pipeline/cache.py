@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+"""
+cache.py — постоянный (на диске) кэш результатов per-structure стадий.
+
+Зачем:
+    Одни и те же samples/*_cifs прогоняются много раз (после каждой правки
+    порогов). Без кэша каждая структура заново парсится и анализируется.
+
+Ключ записи:
+
+    (версия pipeline, стадия, sha256 содержимого CIF, хэш нужных полей конфига)
+
+У каждой стадии свой набор полей конфига:
+
+    parse       — не зависит от конфига
+    spacegroup  — symprec (вместе со spacegroup кэшируются Descriptors);
+                  вместо sha256 CIF — канонический хэш структуры
+                  (analysis.spacegroup.symmetry_cell)
+    geometry    — геометрические/физические пороги и max_n_atoms
+    charge      — таблица oxidation_states
+
+Кроме полей конфига в хэш входит версия алгоритма стадии (_STAGE_VERSIONS),
+чтобы изменение кода стадии не отдавало устаревшие результаты из кэша.
+
+Поэтому, например, правка min_density инвалидирует только geometry,
+а парсинг, symmetry и charge берутся из кэша.
+
+Хранилище — один SQLite-файл (stdlib, без внешних зависимостей):
+
+    - читать могут сразу несколько процессов (воркеры пула),
+    - пишет только главный процесс (runner.py),
+    - размер ограничен max_bytes, при превышении удаляются записи,
+      к которым дольше всего не обращались (LRU).
+"""
+
+import hashlib
+import json
+import pickle
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..utils import PipelineConfig
+from ..utils.constants import PIPELINE_VERSION
+
+DEFAULT_CACHE_FILENAME = "results.sqlite"
+
+# лимит размера кэша по умолчанию (байты payload)
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024**3
+
+# после переполнения чистим до этой доли от лимита,
+# чтобы не запускать eviction на каждой вставке
+_EVICT_TO_RATIO = 0.9
+
+# как часто (в числе изменений) делаем commit
+_COMMIT_EVERY = 500
+
+# версии алгоритмов стадий: увеличиваем, когда меняется результат стадии
+# при том же конфиге (старые записи этой стадии перестают находиться)
+_STAGE_VERSIONS: Dict[str, int] = {
+    "parse": 1,
+    "spacegroup": 2,  # ключ — хэш структуры, spglib без SpacegroupAnalyzer
+    "geometry": 2,  # min_distance через поиск соседей в радиусе cutoff
+    "charge": 2,  # guard по числу элементов поднят до MAX_ELEMENTS
+}
+
+
+# =============================================================================
+# Ключи
+# =============================================================================
+
+
+def content_hash(data: bytes) -> str:
+    """sha256 содержимого CIF."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _digest(payload: Any) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def config_digests(cfg: PipelineConfig) -> Dict[str, str]:
+    """
+    Хэши полей конфига, от которых зависит каждая кэшируемая стадия.
+
+    Returns
+    -------
+    Dict[str, str]
+        stage -> короткий хэш соответствующих полей cfg.
+    """
+    fields: Dict[str, Any] = {
+        "parse": None,
+        "spacegroup": {"symprec": cfg.symprec},
+        "geometry": {
+            "d_min_reject": cfg.d_min_reject,
+            "d_max_suspicious": cfg.d_max_suspicious,
+            "vol_min": cfg.vol_min,
+            "vol_max": cfg.vol_max,
+            "min_density": cfg.min_density,
+            "max_density": cfg.max_density,
+            "max_n_atoms": cfg.max_n_atoms,
+        },
+        "charge": {"oxidation_states": cfg.oxidation_states or {}},
+    }
+    return {
+        stage: _digest({"v": _STAGE_VERSIONS[stage], "cfg": payload})
+        for stage, payload in fields.items()
+    }
+
+
+def make_key(stage: str, data_hash: str, cfg_digest: str) -> str:
+    """Ключ записи кэша для одной стадии одной структуры."""
+    return f"{PIPELINE_VERSION}:{stage}:{data_hash}:{cfg_digest}"
+
+
+# =============================================================================
+# Хранилище
+# =============================================================================
+
+
+class ResultCache:
+    """
+    SQLite-кэш результатов стадий с LRU-вытеснением.
+
+    Значения хранятся как pickle (Structure, Descriptors, GeometryOutcome,
+    ChargeCheckResult — всё picklable). Версия pipeline входит в ключ,
+    поэтому после обновления кода старые pickle просто не находятся.
+
+    readonly=True — режим для воркеров: только get(), без записи.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        readonly: bool = False,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.readonly = readonly
+
+        if readonly:
+            self._conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, timeout=30
+            )
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30)
+
+        # WAL: читатели (воркеры) не блокируют писателя и наоборот
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " atime REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries(atime)")
+        self._conn.commit()
+
+        row = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        self._total_bytes = int(row[0])
+        self._pending = 0
+
+    # ------------------------------------------------------------------
+    # чтение
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Возвращает распакованное значение или None, если записи нет.
+
+        Битые записи (например, pickle от несовместимой версии класса)
+        считаются промахом.
+        """
+        row = self._conn.execute(
+            "SELECT value FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            return None
+
+    # ------------------------------------------------------------------
+    # запись (только главный процесс)
+    # ------------------------------------------------------------------
+
+    def put_many(self, entries: Iterable[Tuple[str, bytes]]) -> None:
+        """Добавляет (или перезаписывает) записи: key -> pickle bytes."""
+        now = time.time()
+        for key, blob in entries:
+            old = self._conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if old is not None:
+                self._total_bytes -= int(old[0])
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries(key, value, size, atime)"
+                " VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), now),
+            )
+            self._total_bytes += len(blob)
+            self._pending += 1
+
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+        self._maybe_commit()
+
+    def touch_many(self, keys: Iterable[str]) -> None:
+        """Обновляет время последнего обращения (для LRU)."""
+        now = time.time()
+        rows = [(now, key) for key in keys]
+        if not rows:
+            return
+        self._conn.executemany("UPDATE entries SET atime = ? WHERE key = ?", rows)
+        self._pending += len(rows)
+        self._maybe_commit()
+
+    def _evict(self) -> None:
+        """Удаляет самые давние записи, пока размер не станет ниже лимита."""
+        target = int(self.max_bytes * _EVICT_TO_RATIO)
+        cur = self._conn.execute("SELECT key, size FROM entries ORDER BY atime ASC")
+
+        doomed: List[Tuple[str]] = []
+        for key, size in cur:
+            if self._total_bytes <= target:
+                break
+            doomed.append((key,))
+            self._total_bytes -= int(size)
+
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def _maybe_commit(self) -> None:
+        if self._pending >= _COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        if not self.readonly:
+            self._conn.commit()
+        self._conn.close()
+
+
+# читатели кэша в текущем процессе: path -> ResultCache(readonly)
+_READERS: Dict[Path, ResultCache] = {}
+
+
+def get_reader(path: Path) -> ResultCache:
+    """Возвращает read-only соединение с кэшем (одно на процесс)."""
+    if path not in _READERS:
+        _READERS[path] = ResultCache(path, readonly=True)
+    return _READERS[path]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+"""
+journal.py — журнал прогресса для checkpoint/resume (mvp --resume).
+
+Файл out_dir/progress.jsonl содержит по строке на каждую обработанную
+структуру (в порядке обработки) и периодические checkpoint-строки:
+
+    {"structure_id": "a.cif", "status": "rejected", "reason": "duplicate"}
+    {"structure_id": "b.cif", "status": "validated", "density": ..., "dedup": {...}}
+    ...
+    {"checkpoint": 500, "csv_bytes": 123456}
+
+Checkpoint пишется сразу после того, как BufferedCSVWriter сбросил пачку
+строк на диск, и фиксирует:
+
+    - сколько структур уже полностью обработано,
+    - размер all_structures.csv в этот момент
+      (для --records-format parquet — число part-файлов all_structures.parquet/).
+
+При resume берутся только записи до последнего checkpoint, а CSV и сам
+журнал обрезаются до зафиксированного размера. Так журнал и CSV всегда
+согласованы, даже если процесс убили посреди записи.
+
+Для validated структур в журнал пишется всё, что нужно для восстановления
+состояния: дескрипторы для RunStats и структура (as_dict) с ключом бакета
+для SimilarityChecker.
+
+Журнал живёт только пока запуск не завершён: после записи
+validation_report.json runner его удаляет. --resume завершённого запуска
+(журнала нет) считает всё заново с тем же результатом.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+JOURNAL_FILENAME = "progress.jsonl"
+
+
+@dataclass
+class JournalState:
+    """
+    Восстановленное из журнала состояние.
+
+    entries
+        Записи обработанных структур (до последнего checkpoint), по порядку.
+
+    csv_bytes
+        Размер all_structures.csv на момент последнего checkpoint
+        (для Parquet — число part-файлов).
+    """
+
+    entries: List[Dict[str, Any]] = field(default_factory=list)
+    csv_bytes: int = 0
+
+    @property
+    def done_ids(self) -> set[str]:
+        return {e["structure_id"] for e in self.entries}
+
+
+def load_journal(path: Path) -> Optional[JournalState]:
+    """
+    Читает журнал и обрезает его до последнего checkpoint.
+
+    Returns
+    -------
+    Optional[JournalState]
+        None, если журнала нет (resume невозможен — начинаем с нуля).
+    """
+    if not path.exists():
+        return None
+
+    entries: List[Dict[str, Any]] = []
+    committed = 0
+    csv_bytes = 0
+    committed_offset = 0
+
+    with path.open("rb") as f:
+        offset = 0
+        for raw in f:
+            offset += len(raw)
+
+            try:
+                line = json.loads(raw)
+            except ValueError:
+                # недописанная строка (процесс убит посреди записи)
+                break
+
+            if "checkpoint" in line:
+                committed = len(entries)
+                csv_bytes = int(line["csv_bytes"])
+                committed_offset = offset
+            else:
+                entries.append(line)
+
+    # всё, что после последнего checkpoint, не согласовано с CSV → отбрасываем
+    with path.open("r+b") as f:
+        f.truncate(committed_offset)
+
+    return JournalState(entries=entries[:committed], csv_bytes=csv_bytes)
+
+
+class ProgressJournal:
+    """
+    Писатель журнала прогресса.
+
+    record(entry)
+        Запоминает запись об обработанной структуре (в памяти).
+
+    checkpoint(csv_bytes)
+        Дописывает накопленные записи и checkpoint-строку, делает fsync.
+        Вызывается BufferedCSVWriter после каждого сброса буфера на диск.
+    """
+
+    def __init__(self, path: Path, *, n_done: int = 0, append: bool = False):
+        self.path = path
+        self._n_done = n_done
+        self._pending: List[str] = []
+        self._file = path.open("a" if append else "w", encoding="utf-8")
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        self._pending.append(json.dumps(entry, ensure_ascii=False))
+
+    def checkpoint(self, csv_bytes: int) -> None:
+        if not self._pending:
+            return
+
+        self._n_done += len(self._pending)
+        self._pending.append(
+            json.dumps({"checkpoint": self._n_done, "csv_bytes": csv_bytes})
+        )
+
+        self._file.write("\n".join(self._pending) + "\n")
+        self._pending.clear()
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+"""
+parallel.py — упорядоченное выполнение per-structure стадий.
+
+Публичная функция iter_outcomes(...) отдаёт StructureOutcome строго в том же
+порядке, в котором пришли входные структуры, независимо от того,
+считаются они в текущем процессе (jobs=1) или в пуле процессов (jobs>1).
+
+Это важно, потому что дедупликация в runner.py зависит от порядка:
+"первая" из одинаковых структур принимается, остальные — duplicate.
+Сохраняя порядок, мы получаем побайтно тот же all_structures.csv и
+validation_report.json, что и при последовательном запуске.
+
+Пул процессов (WorkerPool) создаётся на один вызов iter_outcomes или
+передаётся снаружи (pool=...): mvp batch держит один пул на все модели —
+воркеры уже импортировали pymatgen, загрузили train_reference и прогрели
+свои кэши (см. batch.py).
+
+Сторож: пока главный процесс ждёт пачку, он проверяет сроки стадий
+воркеров (timeouts.overdue). Воркер, застрявший в вызове C-кода дольше
+лимита стадии, убивается вместе с пулом; пачки в работе отправляются
+в новый пул заново, а застрявшая структура отклоняется с timeout.
+"""
+
+import itertools
+import os
+import signal
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import RawArray, Value
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional
+
+from ..utils import Rejection, RejectionReason, StructureItem
+from .stages import StageContext, StructureOutcome, process_chunk, process_structure
+from .timeouts import SLOT_SIZE, attach_watchdog, overdue, watchdog_pids
+
+# размер пачки структур, отправляемой в воркер одной задачей
+DEFAULT_CHUNKSIZE = 8
+
+# сколько пачек держим "в полёте" на один воркер
+# (ограничивает память, если входных структур очень много)
+_INFLIGHT_PER_WORKER = 4
+
+# как часто главный процесс проверяет сроки стадий воркеров, секунды
+_WATCHDOG_POLL_S = 0.5
+
+# зависший в C-коде воркер не реагирует на SIGTERM-обработчики
+_KILL_SIGNAL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+# номера пачек (их видит сторож в слотах воркеров)
+_CHUNK_IDS = itertools.count()
+
+
+def resolve_jobs(jobs: Optional[int]) -> int:
+    """
+    Нормализует число воркеров.
+
+    None / 1 → 1 (последовательный режим)
+    0 или отрицательное → все доступные ядра
+    """
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def _chunked(
+    items: Iterable[StructureItem], size: int
+) -> Iterator[List[StructureItem]]:
+    chunk: List[StructureItem] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# =============================================================================
+# Пул процессов со сторожем
+# =============================================================================
+
+
+def _init_worker(slots: Any, counter: Any) -> None:
+    """initializer воркера: занять свободный слот сторожа."""
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    attach_watchdog(slots, index, os.getpid())
+
+
+class WorkerPool:
+    """
+    ProcessPoolExecutor и слоты сторожа его воркеров.
+
+    Слот — строка общего массива, куда воркер пишет текущую пачку,
+    структуру, стадию и срок (timeouts.time_limit). restart() убивает
+    воркеры и поднимает новый пул с новыми слотами.
+    """
+
+    def __init__(self, jobs: int):
+        self.jobs = jobs
+        self._start()
+
+    def _start(self) -> None:
+        self._slots = RawArray("d", self.jobs * SLOT_SIZE)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.jobs,
+            initializer=_init_worker,
+            initargs=(self._slots, Value("i", 0)),
+        )
+
+    def submit(
+        self, items: List[StructureItem], ctx: StageContext, chunk_id: int
+    ) -> Future:
+        return self._executor.submit(process_chunk, items, ctx, chunk_id)
+
+    def overdue(self) -> Optional[Dict[str, Any]]:
+        """Воркер, не вышедший из стадии после срока (см. timeouts.overdue)."""
+        return overdue(self._slots, self.jobs)
+
+    def restart(self) -> None:
+        """Убивает воркеры (в том числе зависшие в C-коде) и создаёт новый пул."""
+        pids = set(watchdog_pids(self._slots, self.jobs))
+        # воркеры, ещё не занявшие слот
+        pids.update((getattr(self._executor, "_processes", None) or {}).keys())
+        for pid in pids:
+            try:
+                os.kill(pid, _KILL_SIGNAL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._start()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.shutdown()
+
+
+@dataclass
+class _Chunk:
+    """Пачка в полёте: future в пуле или готовые результаты."""
+
+    id: int
+    items: List[StructureItem]
+    future: Optional[Future] = None
+    outcomes: Optional[List[StructureOutcome]] = None
+
+    def finished(self) -> bool:
+        """Результат есть и не потерян при перезапуске пула."""
+        if self.outcomes is not None:
+            return True
+        return (
+            self.future.done()
+            and not self.future.cancelled()
+            and self.future.exception() is None
+        )
+
+
+def iter_outcomes(
+    items: Iterable[StructureItem],
+    ctx: StageContext,
+    *,
+    jobs: int = 1,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    pool: Optional[WorkerPool] = None,
+) -> Iterator[StructureOutcome]:
+    """
+    Прогоняет структуры через per-structure стадии и отдаёт результаты по порядку.
+
+    jobs == 1
+        Всё считается в текущем процессе, по одной структуре.
+        Лимиты стадий — только SIGALRM (сторожа нет).
+
+    jobs > 1
+        Структуры группируются в пачки по chunksize и отправляются
+        в WorkerPool. Одновременно в работе не больше
+        jobs * _INFLIGHT_PER_WORKER пачек, а результаты отдаются
+        в порядке отправки (FIFO), а не в порядке завершения.
+
+    pool
+        Готовый пул (jobs > 1) — используется вместо нового и не
+        закрывается: его жизнью управляет вызывающий (mvp batch).
+    """
+    if jobs <= 1:
+        for item in items:
+            yield process_structure(item, ctx)
+        return
+
+    if pool is not None:
+        yield from _iter_pooled(pool, items, ctx, jobs, chunksize)
+        return
+
+    with WorkerPool(jobs) as own_pool:
+        yield from _iter_pooled(own_pool, items, ctx, jobs, chunksize)
+
+
+def _submit(
+    pool: WorkerPool, items: List[StructureItem], ctx: StageContext
+) -> _Chunk:
+    chunk_id = next(_CHUNK_IDS)
+    return _Chunk(chunk_id, items, pool.submit(items, ctx, chunk_id))
+
+
+def _iter_pooled(
+    pool: WorkerPool,
+    items: Iterable[StructureItem],
+    ctx: StageContext,
+    jobs: int,
+    chunksize: int,
+) -> Iterator[StructureOutcome]:
+    max_inflight = jobs * _INFLIGHT_PER_WORKER
+    pending: Deque[_Chunk] = deque()
+
+    def pop_results() -> List[StructureOutcome]:
+        # ждём самую старую пачку, по пути проверяя сроки воркеров
+        head = pending[0]
+        while not head.finished():
+            if head.future.done():
+                # ошибка в пачке (BrokenProcessPool и т.п.) — наружу
+                head.future.result()
+            wait([head.future], timeout=_WATCHDOG_POLL_S)
+            stuck = pool.overdue()
+            if stuck is not None:
+                _recover(pool, pending, ctx, stuck)
+                head = pending[0]
+
+        pending.popleft()
+        if head.outcomes is not None:
+            return head.outcomes
+        return head.future.result()
+
+    try:
+        for chunk in _chunked(items, chunksize):
+            pending.append(_submit(pool, chunk, ctx))
+
+            # окно заполнено → ждём самую старую пачку и отдаём её результаты
+            if len(pending) >= max_inflight:
+                yield from pop_results()
+
+        while pending:
+            yield from pop_results()
+
+    finally:
+        # запуск прерван (ошибка, таймаут dedup и т.п.): пачки, которые
+        # ещё не начались, в общем пуле не нужны следующему запуску
+        for chunk in pending:
+            if chunk.future is not None:
+                chunk.future.cancel()
+
+
+def _recover(
+    pool: WorkerPool,
+    pending: Deque[_Chunk],
+    ctx: StageContext,
+    stuck: Dict[str, Any],
+) -> None:
+    """
+    Воркер завис в стадии: перезапускает пул и переотправляет пачки.
+
+    Готовые результаты сохраняются; застрявшая структура получает
+    rejection timeout, остальные структуры её пачки считаются заново.
+    """
+    for chunk in pending:
+        if chunk.outcomes is None and chunk.finished():
+            chunk.outcomes = chunk.future.result()
+
+    pool.restart()
+
+    chunks = list(pending)
+    pending.clear()
+    for chunk in chunks:
+        if chunk.outcomes is not None:
+            pending.append(chunk)
+            continue
+
+        if chunk.id != stuck["chunk"]:
+            pending.append(_submit(pool, chunk.items, ctx))
+            continue
+
+        k = stuck["index"]
+        before, item, after = chunk.items[:k], chunk.items[k], chunk.items[k + 1:]
+        if before:
+            pending.append(_submit(pool, before, ctx))
+        details = {
+            "stage": stuck["stage"],
+            "limit_s": stuck["limit_s"],
+            "watchdog": True,
+        }
+        pending.append(
+            _Chunk(
+                next(_CHUNK_IDS),
+                [item],
+                outcomes=[
+                    StructureOutcome(
+                        item=item,
+                        rejection=Rejection(RejectionReason.TIMEOUT, details),
+                    )
+                ],
+            )
+        )
+        if after:
+            pending.append(_submit(pool, after, ctx))
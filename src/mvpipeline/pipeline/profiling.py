@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+"""
+profiling.py — замеры времени по стадиям (mvp --profile / --trace).
+
+Зачем:
+    по одному общему времени запуска не видно, куда оно уходит:
+    в парсинг CIF, spglib, поиск соседей, подбор степеней окисления
+    или StructureMatcher.fit. Здесь считаем по каждой стадии:
+
+        - число вызовов,
+        - суммарное wall- и CPU-время,
+        - среднее / максимум,
+        - N самых медленных структур (кандидаты в "патологические" CIF).
+
+Как устроено:
+    - StageTimer замеряет стадии одной структуры там, где она считается
+      (в главном процессе или в воркере), и записи (stage, start, wall, cpu)
+      возвращаются в StructureOutcome.timings;
+    - главный процесс сам замеряет свои стадии (dedup, write);
+    - Profiler агрегирует всё в секцию performance отчёта и (опционально)
+      пишет таймлайн в формате Chrome Trace Event (открывается в
+      chrome://tracing и https://ui.perfetto.dev): одна дорожка на процесс.
+
+Время — time.perf_counter_ns (монотонные часы, общие для процессов
+на одной машине) и time.process_time_ns (CPU текущего процесса).
+При resume замеряется только текущий сеанс.
+"""
+
+import heapq
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# сколько самых медленных структур храним по каждой стадии
+SLOWEST_N = 10
+
+# запись замера: (стадия, начало perf_counter_ns, wall ns, cpu ns)
+Timing = Tuple[str, int, int, int]
+
+
+class StageTimer:
+    """Замеры стадий одной структуры."""
+
+    def __init__(self) -> None:
+        self.records: List[Timing] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter_ns()
+        c0 = time.process_time_ns()
+        try:
+            yield
+        finally:
+            self.records.append(
+                (
+                    name,
+                    t0,
+                    time.perf_counter_ns() - t0,
+                    time.process_time_ns() - c0,
+                )
+            )
+
+
+class NullTimer:
+    """StageTimer без замеров (профилирование выключено)."""
+
+    records: List[Timing] = []
+
+    def stage(self, name: str):
+        return nullcontext()
+
+
+NULL_TIMER = NullTimer()
+
+
+class _StageStats:
+    """Агрегаты одной стадии."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall_ns = 0
+        self.cpu_ns = 0
+        self.max_ns = 0
+        # min-heap (wall_ns, порядковый номер, structure_id) — N самых медленных
+        self._slowest: List[Tuple[int, int, str]] = []
+
+    def add(self, structure_id: str, wall_ns: int, cpu_ns: int) -> None:
+        self.calls += 1
+        self.wall_ns += wall_ns
+        self.cpu_ns += cpu_ns
+        self.max_ns = max(self.max_ns, wall_ns)
+
+        entry = (wall_ns, self.calls, structure_id)
+        if len(self._slowest) < SLOWEST_N:
+            heapq.heappush(self._slowest, entry)
+        elif wall_ns > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "wall_s": self.wall_ns / 1e9,
+            "cpu_s": self.cpu_ns / 1e9,
+            "mean_ms": self.wall_ns / self.calls / 1e6 if self.calls else 0.0,
+            "max_ms": self.max_ns / 1e6,
+            "slowest": [
+                {"structure_id": sid, "wall_ms": wall / 1e6}
+                for wall, _, sid in sorted(self._slowest, reverse=True)
+            ],
+        }
+
+
+class Profiler:
+    """
+    Сбор замеров в главном процессе.
+
+    enabled
+        False — все методы ничего не делают (runner вызывает их
+        безусловно, без проверок --profile на каждом шаге).
+
+    add(structure_id, timings)
+        Учитывает замеры одной структуры (StructureOutcome.timings).
+
+    stage(name, structure_id)
+        Контекстный менеджер для стадий главного процесса (dedup, write).
+
+    trace_path
+        Куда писать Chrome Trace (None — не писать). События пишутся
+        потоково (JSON Array Format), память не растёт с числом структур.
+    """
+
+    def __init__(self, *, enabled: bool = True, trace_path: Optional[Path] = None):
+        self.enabled = enabled or trace_path is not None
+        self._stages: Dict[str, _StageStats] = {}
+        self._t0 = time.perf_counter_ns()
+        self._c0 = time.process_time_ns()
+        self._n_structures = 0
+        self._pid = os.getpid()
+
+        self.trace_path = trace_path
+        self._trace = None
+        if trace_path is not None:
+            trace_path.parent.mkdir(parents=True, exist_ok=True)
+            self._trace = trace_path.open("w", encoding="utf-8")
+            self._trace.write("[\n")
+            self._first_event = True
+
+    def add(
+        self, structure_id: str, timings: List[Timing], pid: Optional[int] = None
+    ) -> None:
+        if not self.enabled:
+            return
+
+        self._n_structures += 1
+
+        for name, start, wall, cpu in timings:
+            self._record(name, structure_id, start, wall, cpu, pid or self._pid)
+
+    def stage(self, name: str, structure_id: str):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name, structure_id)
+
+    @contextmanager
+    def _timed(self, name: str, structure_id: str) -> Iterator[None]:
+        t0 = time.perf_counter_ns()
+        c0 = time.process_time_ns()
+        try:
+            yield
+        finally:
+            self._record(
+                name,
+                structure_id,
+                t0,
+                time.perf_counter_ns() - t0,
+                time.process_time_ns() - c0,
+                self._pid,
+            )
+
+    def _record(
+        self, name: str, structure_id: str, start: int, wall: int, cpu: int, pid: int
+    ) -> None:
+        stats = self._stages.get(name)
+        if stats is None:
+            stats = self._stages[name] = _StageStats()
+        stats.add(structure_id, wall, cpu)
+
+        if self._trace is not None:
+            event = {
+                "name": name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": (start - self._t0) / 1e3,
+                "dur": wall / 1e3,
+                "pid": pid,
+                "tid": pid,
+                "args": {"structure_id": structure_id},
+            }
+            sep = "" if self._first_event else ",\n"
+            self._first_event = False
+            self._trace.write(sep + json.dumps(event, ensure_ascii=False))
+
+    def summary(self, *, jobs: int = 1) -> Dict[str, Any]:
+        """Секция performance для validation_report.json."""
+        wall_s = (time.perf_counter_ns() - self._t0) / 1e9
+
+        return {
+            "wall_s": wall_s,
+            "main_cpu_s": (time.process_time_ns() - self._c0) / 1e9,
+            "jobs": jobs,
+            "n_structures": self._n_structures,
+            "throughput_per_s": self._n_structures / wall_s if wall_s > 0 else 0.0,
+            "stages": {
+                name: stats.summary() for name, stats in self._stages.items()
+            },
+            "trace": str(self.trace_path) if self.trace_path else None,
+        }
+
+    def close(self) -> None:
+        if self._trace is not None:
+            self._trace.write("\n]\n")
+            self._trace.close()
+            self._trace = None
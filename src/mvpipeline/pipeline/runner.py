@@ -9,21 +9,23 @@ runner.py — главный файл, который запускает вес
 
 Общий flow pipeline:
 
-    1. Находим все CIF файлы (discover_cifs)
-    2. Для каждого файла:
+    1. Находим CIF файлы (iter_inputs — потоково, по мере обхода директории,
+       из готового манифеста или из строк таблицы --input-table)
+    2. Для каждого файла (stages.py, можно в пуле процессов — jobs > 1):
         - читаем CIF
         - sanity проверка
-        - определяем spacegroup
-        - считаем дескрипторы
         - проверяем геометрию
         - проверяем электронейтральность
+        - определяем spacegroup (только для прошедших проверки выше)
+        - считаем дескрипторы
         - проверяем новизну
-        - проверяем дубликаты
         - проверяем магнитность
+    3. В главном процессе, строго в порядке discovery:
+        - проверяем дубликаты
         - сохраняем validated или rejected
         - обновляем статистику
 
-    3. После обработки всех структур:
+    4. После обработки всех структур:
         - считаем итоговые метрики
         - записываем validation_report.json
 """
@@ -31,16 +33,27 @@ runner.py — главный файл, который запускает вес
 import json
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 from pymatgen.core import Structure
 from tqdm import tqdm
 
-from ..analysis import compute_basic_descriptors, get_spacegroup_number
-from ..dedup import SimilarityChecker
-from ..io import discover_cifs, read_structure, write_rejected, write_validated
-from ..novelty import load_train_reference, is_novel
-from ..report import BufferedCSVWriter
+from ..dedup import DedupIndex, SimilarityChecker
+from ..io import InputTable, StructureWriter, input_name, is_archive, iter_inputs
+from ..io.structure_store import DEFAULT_STORE_DIRNAME, StructureStoreWriter
+from ..report import BufferedCSVWriter, ParquetRecordsWriter, records_schema
+from ..report.columnar import DEFAULT_PARQUET_DIRNAME, truncate_parts
 from ..utils import (
     PipelineConfig,
     Rejection,
@@ -48,12 +61,21 @@ from ..utils import (
     ValidationResult,
     ValidationStatus,
 )
-from ..validation import (
-    check_charge_neutrality,
-    geometry_validate,
-    has_magnetic_elements,
-    sanity_ok,
+from ..utils.constants import OutputMode, RecordsFormat, RejectionLogFormat
+from ..validation import distance_cutoff
+from .cache import (
+    DEFAULT_CACHE_FILENAME,
+    DEFAULT_CACHE_MAX_BYTES,
+    ResultCache,
+    config_digests,
 )
+from .aggregates import StreamingStats
+from .journal import JOURNAL_FILENAME, JournalState, ProgressJournal, load_journal
+from .parallel import WorkerPool, iter_outcomes, resolve_jobs
+from .profiling import Profiler
+from .timeouts import StageTimeout, time_limit
+from .sharding import iter_shard_outcomes, load_shards, run_shard, shard_config
+from .stages import StageContext, StructureOutcome
 
 
 # =============================================================================
@@ -68,9 +90,13 @@ class RunStats:
 
     Мы постепенно обновляем эти значения во время работы pipeline,
     а в конце используем их для создания validation_report.json.
+
+    Распределения дескрипторов валидных структур копятся потоково
+    (StreamingStats: среднее, std, min/max, квантили, гистограмма) —
+    память не растёт с числом структур.
     """
 
-    # сколько всего структур нашли
+    # сколько всего структур обработали (validated + rejected)
     total: int = 0
 
     # сколько приняли
@@ -85,15 +111,35 @@ class RunStats:
     # сколько валидных являются новыми
     novel_count: int = 0
 
-    # плотности валидных структур (для среднего)
-    densities: list[float] = field(default_factory=list)
+    # плотности валидных структур (g/cm³)
+    density: StreamingStats = field(default_factory=lambda: StreamingStats(0.0, 20.0))
+
+    # объем на атом валидных структур (Å³/atom)
+    volume_per_atom: StreamingStats = field(
+        default_factory=lambda: StreamingStats(0.0, 80.0)
+    )
+
+    # радиус поиска min_distance (Å), geometry.distance_cutoff
+    min_distance_cutoff: float = 1.2
+
+    # минимальное межатомное расстояние валидных структур (Å): известно
+    # только ниже min_distance_cutoff, гистограмма — [0, cutoff);
+    # None (нет пары ближе радиуса поиска) → n_missing (n_above_cutoff в отчёте)
+    min_distance: StreamingStats = field(init=False)
 
-    # объем на атом валидных структур (для среднего)
-    vpas: list[float] = field(default_factory=list)
+    # число атомов в ячейке валидных структур
+    n_atoms: StreamingStats = field(default_factory=lambda: StreamingStats(0.0, 400.0))
 
     # причины отклонения (словарь: причина -> сколько раз)
     rejection_reasons: Dict[str, int] = field(default_factory=dict)
 
+    # на какой стадии структуры не уложились в лимит времени
+    # (словарь: стадия -> сколько раз)
+    timeouts: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.min_distance = StreamingStats(0.0, self.min_distance_cutoff)
+
     def add_rejection_reason(self, reason: RejectionReason) -> None:
         """
         Увеличивает счетчик конкретной причины отклонения.
@@ -106,23 +152,59 @@ class RunStats:
         key = reason.value
         self.rejection_reasons[key] = self.rejection_reasons.get(key, 0) + 1
 
+    def add_rejected(
+        self, reason: RejectionReason, *, stage: Optional[str] = None
+    ) -> None:
+        """
+        Учитывает отклонённую структуру.
 
-# =============================================================================
-# Вспомогательная функция: безопасное среднее
-# =============================================================================
-
-
-def _avg(values: list[float]) -> float:
-    """
-    Возвращает среднее значение списка.
-
-    Если список пустой — возвращает 0.
-    """
-
-    if not values:
-        return 0.0
-
-    return sum(values) / len(values)
+        stage — для RejectionReason.TIMEOUT: стадия, превысившая лимит.
+        """
+        self.total += 1
+        self.rejected += 1
+        self.add_rejection_reason(reason)
+
+        if reason == RejectionReason.TIMEOUT:
+            key = stage or "unknown"
+            self.timeouts[key] = self.timeouts.get(key, 0) + 1
+
+    def add_validated(
+        self,
+        *,
+        density: float,
+        volume_per_atom: float,
+        is_magnetic: bool,
+        is_novel: Optional[bool],
+        min_distance: Optional[float] = None,
+        n_atoms: Optional[int] = None,
+    ) -> None:
+        """Учитывает валидную структуру."""
+        self.total += 1
+        self.validated += 1
+
+        if is_magnetic:
+            self.magnetic_count += 1
+
+        if is_novel:
+            self.novel_count += 1
+
+        self.density.add(density)
+        self.volume_per_atom.add(volume_per_atom)
+        self.min_distance.add(min_distance)
+        self.n_atoms.add(n_atoms)
+
+    def distributions(self) -> Dict[str, Any]:
+        """Сводка распределений для validation_report.json."""
+        return {
+            "density": self.density.summary(),
+            "volume_per_atom": self.volume_per_atom.summary(),
+            "min_distance": {
+                **self.min_distance.summary(),
+                "cutoff": self.min_distance_cutoff,
+                "n_above_cutoff": self.min_distance.n_missing,
+            },
+            "n_atoms": self.n_atoms.summary(),
+        }
 
 
 # =============================================================================
@@ -155,6 +237,7 @@ def _make_record(
     result: ValidationResult,
     geo_details: Optional[Dict[str, Any]] = None,
     charge_solution: Optional[Dict[str, int]] = None,
+    not_computed: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
     """
     Формирует одну строку для общего CSV (all_structures.csv).
@@ -171,7 +254,8 @@ def _make_record(
 
     Откуда берём min_distance:
         1) в первую очередь из geo_details (потому что geo проверка выполнялась почти всегда
-           и там min_distance посчитан одинаково и для валидных, и для rejected)
+           и там min_distance посчитан одинаково и для валидных, и для rejected;
+           None/пусто — ни одной пары ближе cutoff, см. geometry.min_distance_gt)
         2) если geo_details не передали (или там нет поля), пробуем взять из
            result.rejection.details (иногда туда может попасть)
 
@@ -184,8 +268,12 @@ def _make_record(
         - сюда складываем структурированные детали:
             {
               "geometry": {...},
-              "rejection_details": {...}
+              "rejection_details": {...},
+              "not_computed": ["spacegroup"]
             }
+        - not_computed перечисляет поля, которые для этой структуры намеренно
+          не считались (spacegroup у отклонённых по geometry/charge): пустая
+          колонка в таком случае значит "не считали", а не "не удалось определить".
         - это страховка на будущее: если позже понадобится новое поле
           (например, thresholds, плотность до округления, и т.п.) — его можно
           положить в details_json, не ломая схему CSV.
@@ -208,6 +296,8 @@ def _make_record(
         details_payload["geometry"] = geo_details
     if result.rejection:
         details_payload["rejection_details"] = result.rejection.details
+    if not_computed:
+        details_payload["not_computed"] = list(not_computed)
 
     # Основная “плоская” строка CSV
     record = {
@@ -248,6 +338,7 @@ def _emit_record(
     result: ValidationResult,
     geo_details: Optional[Dict[str, Any]] = None,
     charge_solution: Optional[Dict[str, int]] = None,
+    not_computed: Optional[List[str]] = None,
 ) -> None:
     """
     Добавляет одну строку в all_structures.csv.
@@ -263,10 +354,72 @@ def _emit_record(
             result=result,
             geo_details=geo_details,
             charge_solution=charge_solution,
+            not_computed=not_computed,
         )
     )
 
 
+# =============================================================================
+# Журнал прогресса: записи и восстановление состояния (resume)
+# =============================================================================
+
+
+def _rejected_entry(
+    item: Any, reason: RejectionReason, *, stage: Optional[str] = None
+) -> Dict[str, Any]:
+    """Запись журнала для отклонённой структуры (stage — для timeout)."""
+    entry = {
+        "structure_id": item.structure_id,
+        "status": ValidationStatus.REJECTED.value,
+        "reason": reason.value,
+    }
+    if stage is not None:
+        entry["stage"] = stage
+    return entry
+
+
+def _timeout_stage(rejection: Rejection) -> Optional[str]:
+    """Стадия, превысившая лимит (None, если причина — не timeout)."""
+    if rejection.reason != RejectionReason.TIMEOUT:
+        return None
+    return rejection.details.get("stage")
+
+
+def _restore_state(
+    state: JournalState, stats: RunStats, sim_checker: SimilarityChecker
+) -> None:
+    """
+    Восстанавливает RunStats и бакеты SimilarityChecker из журнала.
+
+    Записи применяются в исходном порядке, поэтому состояние (включая
+    порядок ключей rejection_reasons) совпадает с непрерванным запуском.
+    """
+    for entry in state.entries:
+
+        if entry["status"] == ValidationStatus.REJECTED.value:
+            stats.add_rejected(
+                RejectionReason(entry["reason"]), stage=entry.get("stage")
+            )
+            continue
+
+        dedup = entry["dedup"]
+        sim_checker.add_to_accepted(
+            Structure.from_dict(dedup["structure"]),
+            dedup["formula"],
+            dedup["spacegroup"],
+            structure_id=entry["structure_id"],
+        )
+
+        stats.add_validated(
+            density=entry["density"],
+            volume_per_atom=entry["volume_per_atom"],
+            is_magnetic=entry["is_magnetic"],
+            is_novel=entry["is_novel"],
+            min_distance=entry.get("min_distance"),
+            n_atoms=entry.get("n_atoms"),
+        )
+
+
 # =============================================================================
 # Главная функция pipeline
 # =============================================================================
@@ -274,17 +427,35 @@ def _emit_record(
 
 def run_validation(
     *,
-    input_dir: Path,
+    input_dir: Optional[Path] = None,
     out_dir: Path,
     cfg: PipelineConfig,
     train_reference: Optional[Path] = None,
     model_name: Optional[str] = None,
+    jobs: Optional[int] = 1,
+    cache_dir: Optional[Path] = None,
+    cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+    input_table: Optional[InputTable] = None,
+    resume: bool = False,
+    dedup_jobs: int = 1,
+    dedup_index: Optional[Path] = None,
+    manifest: Optional[Path] = None,
+    fs_order: bool = False,
+    output_mode: OutputMode = OutputMode.COPY,
+    rejection_log: RejectionLogFormat = RejectionLogFormat.FILES,
+    records_format: RecordsFormat = RecordsFormat.CSV,
+    structure_store: bool = False,
+    profile: bool = False,
+    trace: Optional[Path] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    pool: Optional[WorkerPool] = None,
 ) -> dict[str, Any]:
     """
     Главная функция, которая запускает весь pipeline.
 
     input_dir:
-        папка с CIF файлами
+        папка с CIF файлами или архив с ними (.tar, .tar.gz, .tar.zst, .zip, ...:
+        читается потоково, без распаковки); вместо неё — input_table
 
     out_dir:
         папка, куда сохраняем результаты
@@ -296,240 +467,571 @@ def run_validation(
         CSV файл с train dataset (для novelty проверки)
 
     model_name:
-        имя модели (если None — используем имя input_dir)
+        имя модели (если None — используем имя input_dir / архива / таблицы)
+
+    jobs:
+        число процессов для per-structure стадий.
+        1 — последовательно (по умолчанию), 0 — все ядра.
+        Результат (all_structures.csv, validation_report.json) от jobs не зависит.
+
+    cache_dir:
+        папка постоянного кэша результатов (None — без кэша).
+        Повторный запуск на тех же CIF берёт parse/spacegroup/geometry/charge
+        из кэша и пересчитывает только стадии, чьи пороги поменялись.
+
+    cache_max_bytes:
+        лимит размера кэша; при превышении удаляются давно не использованные записи.
+
+    input_table:
+        CSV с CIF в колонке (или путями к CIF) — вместо input_dir.
+        Читается кусками, CIF разбираются из памяти, без временных файлов
+        (см. io.table). manifest и fs_order с ней не используются.
+
+    resume:
+        продолжить прерванный запуск в том же out_dir: состояние (статистика,
+        принятые структуры для дедупликации) восстанавливается из
+        progress.jsonl, уже обработанные структуры пропускаются.
+        Итоговый отчёт совпадает с непрерванным запуском.
+
+    dedup_jobs:
+        число процессов для StructureMatcher.fit внутри больших бакетов
+        дедупликации (1 — без пула). На результат не влияет.
+
+    dedup_index:
+        SQLite-файл постоянного индекса принятых структур (None — без него).
+        Структуры дополнительно проверяются на совпадение с принятыми
+        в других запусках (другие out_dir), а принятые в этом запуске
+        дописываются в индекс. Повторный запуск в тот же out_dir заменяет
+        свои записи в индексе.
+
+    manifest:
+        файл со списком входных CIF (по относительному пути на строку).
+        Если файл есть — обход input_dir не нужен; если нет — он будет
+        записан по ходу обхода (и появится, только если обход завершился).
+
+    fs_order:
+        обходить input_dir в порядке файловой системы, без сортировки.
+        По умолчанию (False) порядок детерминированный — по пути, как раньше.
+        От порядка зависит, какая из одинаковых структур будет принята,
+        а какая отклонена как duplicate.
+
+    output_mode:
+        как раскладывать CIF по validated_structures/ и rejected_structures/:
+        copy (по умолчанию), hardlink, reflink, symlink, manifest
+        (без файлов — только индекс путей output_manifest.csv) или
+        tar / tar.gz / tar.zst (архивы validated_structures.* и rejected_structures.*).
+        all_structures.csv и validation_report.json от режима не зависят.
+
+    rejection_log:
+        куда писать причины отклонения: files — *.reason.json рядом с каждым
+        отклонённым CIF (по умолчанию), jsonl / jsonl.gz — единый журнал
+        rejections.jsonl[.gz] с индексом смещений (читать — RejectionLogReader).
+
+    records_format:
+        формат общей таблицы: csv (all_structures.csv, по умолчанию) или
+        parquet (all_structures.parquet/ — типизированная схема, geometry
+        развёрнута в колонки; нужен pyarrow).
+
+    structure_store:
+        записать разобранные структуры-кандидаты (validated и duplicate)
+        в бинарное хранилище structures.arrow/ (Arrow IPC, memory map):
+        повторно разбирать их CIF не нужно (см. io.structure_store; нужен pyarrow).
+
+    profile:
+        замерять время стадий (parse, spacegroup, geometry, charge, dedup, ...)
+        и добавить в отчёт секцию performance: вызовы, wall/CPU-время,
+        самые медленные структуры, пропускная способность.
+
+    trace:
+        файл таймлайна стадий в формате Chrome Trace Event
+        (chrome://tracing, ui.perfetto.dev). Включает profile.
+
+    shard:
+        (i, N) — выполнить только per-structure стадии для i-го из N шардов
+        (структуры с порядковым номером k, k % N == i) и записать частичные
+        артефакты в out_dir (см. sharding.py). Дедупликация, файлы структур
+        и validation_report.json — в merge_shards. Возвращает shard.json.
+
+    pool:
+        готовый пул процессов (parallel.WorkerPool) для per-structure
+        стадий (при jobs > 1) вместо нового на каждый запуск; не
+        закрывается (см. batch.run_batch).
     """
 
-    # создаем папку результатов
-    out_dir.mkdir(parents=True, exist_ok=True)
+    if (input_dir is None) == (input_table is None):
+        raise ValueError("Нужен ровно один вход: input_dir или input_table")
+
+    if (input_table is not None or is_archive(input_dir)) and (
+        manifest is not None or fs_order
+    ):
+        raise ValueError("manifest и fs_order относятся только к обходу директории")
+
+    if shard is not None:
+        if resume or fs_order:
+            # порядок обхода должен совпадать на всех узлах,
+            # а шард пересчитывается целиком
+            raise ValueError("--shard несовместим с --resume и --fs-order")
+
+        return run_shard(
+            input_dir=input_dir,
+            input_table=input_table,
+            out_dir=out_dir,
+            cfg=cfg,
+            shard=shard,
+            train_reference=train_reference,
+            model_name=model_name,
+            jobs=jobs,
+            cache_dir=cache_dir,
+            cache_max_bytes=cache_max_bytes,
+            manifest=manifest,
+        )
+
+    cache: Optional[ResultCache] = None
+    if cache_dir is not None:
+        cache = ResultCache(
+            cache_dir / DEFAULT_CACHE_FILENAME, max_bytes=cache_max_bytes
+        )
 
-    records_path = out_dir / "all_structures.csv"
-    records_writer = BufferedCSVWriter(
-        path=records_path,
-        fieldnames=RECORDS_FIELDS,
-        flush_every=500,
+    ctx = StageContext(
+        cfg=cfg,
+        train_reference=train_reference,
+        cache_path=cache.path if cache else None,
+        cache_digests=config_digests(cfg) if cache else None,
+        profile=profile or trace is not None,
     )
 
-    # находим все CIF файлы
-    items = discover_cifs(input_dir)
+    def _outcomes(done_ids: Set[str]) -> Iterator[StructureOutcome]:
+        # CIF файлы — генератор: обработка начинается сразу, без полного
+        # списка файлов в памяти
+        items = iter_inputs(
+            input_dir, manifest=manifest, ordered=not fs_order, table=input_table
+        )
+        if done_ids:
+            items = (item for item in items if item.structure_id not in done_ids)
+
+        # Per-structure стадии (read → sanity → geometry → charge →
+        # spacegroup + descriptors → novelty → magnetism) считаются в iter_outcomes:
+        # последовательно или в пуле процессов (jobs > 1).
+        return iter_outcomes(items, ctx, jobs=resolve_jobs(jobs), pool=pool)
+
+    return _run_outcomes(
+        outcomes_for=_outcomes,
+        out_dir=out_dir,
+        cfg=cfg,
+        model_name=model_name
+        or (input_table.name if input_table else input_name(input_dir)),
+        jobs=resolve_jobs(jobs),
+        cache=cache,
+        dedup_jobs=dedup_jobs,
+        dedup_index=dedup_index,
+        resume=resume,
+        output_mode=output_mode,
+        rejection_log=rejection_log,
+        records_format=records_format,
+        structure_store=structure_store,
+        profiler=Profiler(enabled=ctx.profile, trace_path=trace),
+    )
 
-    # загружаем train_reference.csv
-    reference = load_train_reference(train_reference)
 
-    # создаем объект статистики
-    stats = RunStats(total=len(items))
+def merge_shards(
+    shard_dirs: Sequence[Path],
+    *,
+    out_dir: Path,
+    model_name: Optional[str] = None,
+    dedup_jobs: int = 1,
+    dedup_index: Optional[Path] = None,
+    resume: bool = False,
+    output_mode: OutputMode = OutputMode.COPY,
+    rejection_log: RejectionLogFormat = RejectionLogFormat.FILES,
+    records_format: RecordsFormat = RecordsFormat.CSV,
+    structure_store: bool = False,
+    profile: bool = False,
+    trace: Optional[Path] = None,
+) -> dict[str, Any]:
+    """
+    Собирает результаты шардов (run_validation(shard=...)) в один запуск.
 
-    # создаем checker дубликатов
-    sim_checker = SimilarityChecker()
+    Результаты per-structure стадий всех шардов сливаются в общем порядке
+    обхода и проходят тот же путь, что и в run_validation: дедупликация
+    (в том числе между шардами), запись validated/rejected, журнал прогресса,
+    all_structures и validation_report.json — совпадающие с запуском
+    на одном узле.
 
-    # =========================================================================
-    # Главный цикл — обрабатываем каждый CIF
-    # =========================================================================
-    try:
-        for item in tqdm(items, desc="Валидация CIF", unit="cif"):
+    Конфигурация и имя модели берутся из шардов (все шарды обязаны
+    совпадать, см. sharding.load_shards). Остальные параметры — как
+    у run_validation; resume продолжает прерванное слияние.
+    """
+    metas = load_shards(shard_dirs)
+
+    def _outcomes(done_ids: Set[str]) -> Iterator[StructureOutcome]:
+        outcomes = iter_shard_outcomes(metas)
+        if done_ids:
+            outcomes = (o for o in outcomes if o.item.structure_id not in done_ids)
+        return outcomes
+
+    return _run_outcomes(
+        outcomes_for=_outcomes,
+        out_dir=out_dir,
+        cfg=shard_config(metas),
+        model_name=model_name or metas[0]["model_name"],
+        jobs=1,
+        cache=None,
+        dedup_jobs=dedup_jobs,
+        dedup_index=dedup_index,
+        resume=resume,
+        output_mode=output_mode,
+        rejection_log=rejection_log,
+        records_format=records_format,
+        structure_store=structure_store,
+        profiler=Profiler(enabled=profile, trace_path=trace),
+    )
 
-            # ------------------------------------------------------------
-            # 1. Читаем CIF
-            # ------------------------------------------------------------
 
-            try:
-                struct: Structure = read_structure(item.path)
+def _run_outcomes(
+    *,
+    outcomes_for: Callable[[Set[str]], Iterable[StructureOutcome]],
+    out_dir: Path,
+    cfg: PipelineConfig,
+    model_name: str,
+    jobs: int,
+    cache: Optional[ResultCache],
+    dedup_jobs: int,
+    dedup_index: Optional[Path],
+    resume: bool,
+    output_mode: OutputMode,
+    rejection_log: RejectionLogFormat,
+    records_format: RecordsFormat,
+    structure_store: bool,
+    profiler: Profiler,
+) -> dict[str, Any]:
+    """
+    Общая часть run_validation и merge_shards: всё после per-structure стадий.
 
-            except Exception as e:
-                # если CIF не читается — отклоняем
+    outcomes_for(done_ids)
+        Поток StructureOutcome в порядке discovery без уже обработанных
+        структур (done_ids — из журнала при resume, иначе пустое множество).
+    """
 
-                result = ValidationResult(
-                    status=ValidationStatus.REJECTED,
-                    rejection=Rejection(
-                        reason=RejectionReason.CIF_PARSE_ERROR,
-                        details={"error": str(e)},
-                    ),
-                )
+    # создаем папку результатов
+    out_dir.mkdir(parents=True, exist_ok=True)
 
-                _emit_record(writer=records_writer, item=item, result=result)
-                write_rejected(item, out_dir, result)
+    records_format = RecordsFormat(records_format)
+    if records_format == RecordsFormat.PARQUET:
+        # без pyarrow — ошибка до начала работы, а не на первом сбросе
+        records_schema()
+        records_path = out_dir / DEFAULT_PARQUET_DIRNAME
+    else:
+        records_path = out_dir / "all_structures.csv"
 
-                stats.rejected += 1
-                stats.add_rejection_reason(RejectionReason.CIF_PARSE_ERROR)
+    journal_path = out_dir / JOURNAL_FILENAME
 
-                continue
+    # создаем объект статистики
+    stats = RunStats(min_distance_cutoff=distance_cutoff(cfg))
 
-            # ------------------------------------------------------------
-            # 2. sanity проверка
-            # ------------------------------------------------------------
+    # создаем checker дубликатов
+    index: Optional[DedupIndex] = None
+    if dedup_index is not None:
+        index = DedupIndex(
+            dedup_index,
+            source=str(out_dir.resolve()),
+            model=model_name,
+        )
+        # записи этого out_dir от прошлых запусков заменяются текущими
+        # (при resume восстановленные структуры добавятся заново в _restore_state)
+        index.forget_source()
 
-            if not sanity_ok(struct):
+    sim_checker = SimilarityChecker(
+        cfg.dedup, jobs=resolve_jobs(dedup_jobs), index=index
+    )
 
-                result = ValidationResult(
-                    status=ValidationStatus.REJECTED,
-                    rejection=Rejection(
-                        reason=RejectionReason.CIF_SANITY_ERROR,
-                        details={"error": "sanity_failed"},
-                    ),
-                )
+    # ------------------------------------------------------------
+    # resume: восстанавливаем состояние из журнала прогресса
+    # ------------------------------------------------------------
+
+    restored: Optional[JournalState] = None
+    if resume:
+        restored = load_journal(journal_path)
 
-                _emit_record(writer=records_writer, item=item, result=result)
-                write_rejected(item, out_dir, result)
+    structure_writer = StructureWriter(
+        out_dir,
+        output_mode,
+        rejection_log=rejection_log,
+        append=restored is not None,
+    )
 
-                stats.rejected += 1
-                stats.add_rejection_reason(RejectionReason.CIF_SANITY_ERROR)
+    if restored is not None:
+        _restore_state(restored, stats, sim_checker)
 
-                continue
+        # отбрасываем строки CSV (part-файлы Parquet),
+        # записанные после последнего checkpoint
+        if records_format == RecordsFormat.PARQUET:
+            truncate_parts(records_path, restored.csv_bytes)
+        elif records_path.exists():
+            with records_path.open("r+b") as f:
+                f.truncate(restored.csv_bytes)
 
-            # ------------------------------------------------------------
-            # 3. определяем spacegroup
-            # ------------------------------------------------------------
+        done_ids = restored.done_ids
 
-            sg = get_spacegroup_number(struct, cfg.symprec)
+        # то же для output_manifest.csv (--output-mode manifest)
+        structure_writer.prune(done_ids)
+    else:
+        done_ids = set()
 
-            # ------------------------------------------------------------
-            # 4. считаем дескрипторы
-            # ------------------------------------------------------------
+    store_writer: Optional[StructureStoreWriter] = None
+    if structure_store:
+        store_writer = StructureStoreWriter(
+            out_dir / DEFAULT_STORE_DIRNAME, append=restored is not None
+        )
+        if restored is not None:
+            store_writer.prune(done_ids)
 
-            desc = compute_basic_descriptors(struct, sg)
+    n_done = len(restored.entries) if restored is not None else 0
 
-            # ------------------------------------------------------------
-            # 5. проверяем геометрию
-            # ------------------------------------------------------------
+    journal = ProgressJournal(
+        journal_path,
+        n_done=n_done,
+        append=restored is not None,
+    )
 
-            geo = geometry_validate(struct, cfg)
+    def _checkpoint(csv_bytes: int) -> None:
+        # журнал причин отклонения (и хранилище структур) должны лечь
+        # на диск раньше checkpoint
+        structure_writer.flush()
+        if store_writer is not None:
+            store_writer.flush()
+        journal.checkpoint(csv_bytes)
+
+    records_writer: Any
+    if records_format == RecordsFormat.PARQUET:
+        if restored is None:
+            # part-файлы прошлого запуска в этом out_dir
+            truncate_parts(records_path, 0)
+
+        records_writer = ParquetRecordsWriter(
+            path=records_path,
+            start_part=restored.csv_bytes if restored is not None else 0,
+            on_flush=_checkpoint,
+        )
+    else:
+        if restored is None:
+            # CSV прошлого запуска в этом out_dir (writer дописывает в конец);
+            # в том числе --resume уже завершённого запуска — журнала нет
+            records_path.unlink(missing_ok=True)
+
+        records_writer = BufferedCSVWriter(
+            path=records_path,
+            fieldnames=RECORDS_FIELDS,
+            flush_every=500,
+            write_header=restored is None or restored.csv_bytes == 0,
+            on_flush=_checkpoint,
+        )
 
-            if geo.status == ValidationStatus.REJECTED:
+    # =========================================================================
+    # Главный цикл — обрабатываем каждый CIF
+    #
+    # Per-structure стадии уже посчитаны (outcomes_for: iter_outcomes
+    # или результаты шардов).
+    #
+    # Дедупликация, запись файлов и статистика — здесь, в главном процессе,
+    # строго в порядке discovery: так результат не зависит от jobs.
+    #
+    # Для каждой структуры порядок такой: файл → журнал → строка CSV.
+    # Checkpoint журнала пишется при сбросе CSV, поэтому всё, что попало
+    # в checkpoint, уже лежит на диске.
+    # =========================================================================
 
-                result = ValidationResult(
-                    status=ValidationStatus.REJECTED,
-                    descriptors=desc,
-                    rejection=Rejection(geo.reason, geo.details),
-                )
+    try:
+        outcomes = outcomes_for(done_ids)
 
-                _emit_record(
-                    writer=records_writer,
-                    item=item,
-                    result=result,
-                    geo_details=geo.details,
-                )
-                write_rejected(item, out_dir, result)
+        for outcome in tqdm(
+            outcomes,
+            initial=n_done,
+            desc="Валидация CIF",
+            unit="cif",
+        ):
 
-                stats.rejected += 1
-                stats.add_rejection_reason(geo.reason)
+            item = outcome.item
 
-                continue
+            profiler.add(item.structure_id, outcome.timings, outcome.pid)
+
+            # новые результаты стадий → в кэш, найденные → обновляем LRU
+            if cache is not None:
+                cache.put_many(outcome.cache_puts)
+                cache.touch_many(outcome.cache_hits)
 
             # ------------------------------------------------------------
-            # 6. проверяем заряд
+            # 1–6. структура отклонена одной из per-structure стадий
+            #      (parse / sanity / geometry / charge / timeout)
             # ------------------------------------------------------------
 
-            charge = check_charge_neutrality(struct, cfg)
-
-            if not charge.ok:
+            if not outcome.is_candidate:
 
                 result = ValidationResult(
                     status=ValidationStatus.REJECTED,
-                    descriptors=desc,
-                    rejection=Rejection(charge.reason, charge.details),
-                )
-
-                _emit_record(
-                    writer=records_writer,
-                    item=item,
-                    result=result,
-                    geo_details=geo.details,
+                    descriptors=outcome.descriptors,
+                    rejection=outcome.rejection,
                 )
-                write_rejected(item, out_dir, result)
-
-                stats.rejected += 1
-                stats.add_rejection_reason(charge.reason)
+                timeout_stage = _timeout_stage(outcome.rejection)
+
+                with profiler.stage("write", item.structure_id):
+                    structure_writer.rejected(item, result)
+                    journal.record(
+                        _rejected_entry(
+                            item, outcome.rejection.reason, stage=timeout_stage
+                        )
+                    )
+                    _emit_record(
+                        writer=records_writer,
+                        item=item,
+                        result=result,
+                        geo_details=outcome.geo_details,
+                        not_computed=outcome.not_computed,
+                    )
+
+                stats.add_rejected(outcome.rejection.reason, stage=timeout_stage)
 
                 continue
 
-            # ------------------------------------------------------------
-            # 7. проверяем новизну
-            # ------------------------------------------------------------
-
-            novel = is_novel(
-                struct,
-                reference,
-                reduced_formula=desc.reduced_formula,
-                spacegroup=desc.spacegroup,
-            )
+            desc = outcome.descriptors
+            struct = outcome.structure
 
             # ------------------------------------------------------------
-            # 8. проверяем дубликаты
+            # 7. проверяем дубликаты
             # ------------------------------------------------------------
 
             formula = desc.reduced_formula
             sg_key = desc.spacegroup or -1
 
-            if sim_checker.is_duplicate(struct, formula, sg_key):
+            rejection: Optional[Rejection] = None
+
+            try:
+                with profiler.stage("dedup", item.structure_id), time_limit(
+                    "dedup", cfg.timeouts.dedup
+                ):
+                    is_duplicate = sim_checker.is_duplicate(struct, formula, sg_key)
+
+            except StageTimeout as e:
+                # сравнение не уложилось в лимит — структуру не принимаем
+                rejection = Rejection(RejectionReason.TIMEOUT, e.details)
+
+            else:
+                if is_duplicate:
+                    # совпадение со структурой из другого запуска (--dedup-index)
+                    # → записываем, с чем именно
+                    dup_details = (
+                        {"duplicate_of": sim_checker.last_match}
+                        if sim_checker.last_match
+                        else {}
+                    )
+                    rejection = Rejection(RejectionReason.DUPLICATE, dup_details)
+
+            if rejection is not None:
 
                 result = ValidationResult(
                     status=ValidationStatus.REJECTED,
                     descriptors=desc,
-                    rejection=Rejection(RejectionReason.DUPLICATE),
-                )
-
-                _emit_record(
-                    writer=records_writer,
-                    item=item,
-                    result=result,
-                    geo_details=geo.details,
-                    charge_solution=charge.solution,
+                    rejection=rejection,
                 )
-                write_rejected(item, out_dir, result)
-
-                stats.rejected += 1
-                stats.add_rejection_reason(RejectionReason.DUPLICATE)
+                timeout_stage = _timeout_stage(rejection)
+
+                with profiler.stage("write", item.structure_id):
+                    structure_writer.rejected(item, result)
+                    if store_writer is not None:
+                        store_writer.add(
+                            item.structure_id, ValidationStatus.REJECTED, struct
+                        )
+                    journal.record(
+                        _rejected_entry(item, rejection.reason, stage=timeout_stage)
+                    )
+                    _emit_record(
+                        writer=records_writer,
+                        item=item,
+                        result=result,
+                        geo_details=outcome.geo_details,
+                        charge_solution=outcome.charge_solution,
+                    )
+
+                stats.add_rejected(rejection.reason, stage=timeout_stage)
 
                 continue
 
-            sim_checker.add_to_accepted(struct, formula, sg_key)
-
-            # ------------------------------------------------------------
-            # 9. проверяем магнитность
-            # ------------------------------------------------------------
-
-            magnetic = has_magnetic_elements(struct, cfg)
+            with profiler.stage("dedup", item.structure_id):
+                sim_checker.add_to_accepted(
+                    struct, formula, sg_key, structure_id=item.structure_id
+                )
 
             # ------------------------------------------------------------
-            # 10. структура валидна — сохраняем
+            # 8. структура валидна — сохраняем
             # ------------------------------------------------------------
 
             result = ValidationResult(
                 status=ValidationStatus.VALIDATED,
                 descriptors=desc,
-                is_magnetic=magnetic,
-                is_novel=novel,
-            )
-
-            _emit_record(
-                writer=records_writer,
-                item=item,
-                result=result,
-                geo_details=geo.details,
-                charge_solution=charge.solution,
+                is_magnetic=outcome.is_magnetic,
+                is_novel=outcome.is_novel,
             )
 
-            write_validated(item, out_dir)
-
-            stats.validated += 1
-
-            if magnetic:
-                stats.magnetic_count += 1
-
-            if novel:
-                stats.novel_count += 1
+            min_distance = (outcome.geo_details or {}).get("min_distance")
+
+            with profiler.stage("write", item.structure_id):
+                structure_writer.validated(item)
+                if store_writer is not None:
+                    store_writer.add(
+                        item.structure_id, ValidationStatus.VALIDATED, struct
+                    )
+                journal.record(
+                    {
+                        "structure_id": item.structure_id,
+                        "status": ValidationStatus.VALIDATED.value,
+                        "density": desc.density,
+                        "volume_per_atom": desc.volume_per_atom,
+                        "min_distance": min_distance,
+                        "n_atoms": desc.n_atoms,
+                        "is_magnetic": outcome.is_magnetic,
+                        "is_novel": outcome.is_novel,
+                        "dedup": {
+                            "formula": formula,
+                            "spacegroup": sg_key,
+                            "structure": json.loads(struct.to_json()),
+                        },
+                    }
+                )
+                _emit_record(
+                    writer=records_writer,
+                    item=item,
+                    result=result,
+                    geo_details=outcome.geo_details,
+                    charge_solution=outcome.charge_solution,
+                )
 
-            stats.densities.append(desc.density)
-            stats.vpas.append(desc.volume_per_atom)
+            stats.add_validated(
+                density=desc.density,
+                volume_per_atom=desc.volume_per_atom,
+                is_magnetic=outcome.is_magnetic,
+                is_novel=outcome.is_novel,
+                min_distance=min_distance,
+                n_atoms=desc.n_atoms,
+            )
 
     finally:
+        # close() сбрасывает остаток CSV → журнал получает финальный checkpoint
         records_writer.close()
+        journal.close()
+        structure_writer.close()
+        if store_writer is not None:
+            store_writer.close()
+        sim_checker.close()
+        profiler.close()
+
+        if cache is not None:
+            cache.close()
 
     # =========================================================================
     # Формируем итоговый отчет
     # =========================================================================
 
     report = {
-        "model_name": model_name or input_dir.name,
+        "model_name": model_name,
         "n_total": stats.total,
         "n_validated": stats.validated,
         "n_rejected": stats.rejected,
@@ -543,14 +1045,28 @@ def run_validation(
             if stats.total
             else 0
         ),
-        "avg_density": _avg(stats.densities),
-        "avg_volume_per_atom": _avg(stats.vpas),
+        "avg_density": stats.density.avg,
+        "avg_volume_per_atom": stats.volume_per_atom.avg,
+        "distributions": stats.distributions(),
         "rejection_reasons": stats.rejection_reasons,
-        "all_structures_csv": str(records_path),
+        "timeouts": stats.timeouts,
+        f"all_structures_{records_format.value}": str(records_path),
+        "output_mode": OutputMode(output_mode).value,
     }
 
+    if store_writer is not None:
+        report["structure_store"] = str(store_writer.path)
+
+    # замеры текущего сеанса (при resume — без уже обработанных структур)
+    if profiler.enabled:
+        report["performance"] = profiler.summary(jobs=jobs)
+
     report_path = out_dir / "validation_report.json"
 
     report_path.write_text(json.dumps(report, indent=2))
 
+    # запуск завершён: журнал нужен только для --resume прерванного запуска,
+    # а с полными структурами validated он больше all_structures.csv
+    journal_path.unlink(missing_ok=True)
+
     return report
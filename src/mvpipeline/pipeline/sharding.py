@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+"""
+sharding.py — выполнение на нескольких узлах: mvp --shard i/N + mvp merge.
+
+Разбиение:
+    все узлы обходят input_dir (читают один --manifest или одну --input-table) в одном
+    и том же детерминированном порядке; структура с порядковым номером k достаётся
+    шарду k % N. Списки файлов между узлами передавать не нужно.
+
+Шард (run_shard):
+    выполняет все per-structure стадии (parse → ... → magnetism) для своих
+    структур и пишет в свой out_dir частичные артефакты:
+
+        shard.json       — номер шарда, конфигурация, число структур,
+                           частичная статистика (причины отклонения)
+        outcomes.jsonl   — по строке на структуру, по возрастанию k:
+                           отклонённые — причина и дескрипторы,
+                           кандидаты — всё нужное для дедупликации
+                           (структура, формула, spacegroup, novelty, ...)
+
+    Дедупликация в шарде не выполняется: она зависит от всех структур,
+    принятых раньше в глобальном порядке, в том числе из других шардов.
+
+Слияние (iter_shard_outcomes + runner.merge_shards):
+    outcomes.jsonl всех шардов сливаются по k (heapq.merge, потоково) —
+    получается тот же поток StructureOutcome, что и при запуске на одном
+    узле. Дальше он идёт в тот же цикл runner (дедупликация, запись файлов,
+    журнал, статистика), поэтому validation_report.json и all_structures.csv
+    совпадают с запуском на одном узле.
+"""
+
+import heapq
+import json
+import os
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pymatgen.core import Structure
+
+from ..io import InputTable, input_name, iter_inputs
+from ..utils import (
+    Descriptors,
+    PipelineConfig,
+    Rejection,
+    RejectionReason,
+    StructureItem,
+)
+from ..utils.config import config_from_dict, config_to_dict
+from .cache import (
+    DEFAULT_CACHE_FILENAME,
+    DEFAULT_CACHE_MAX_BYTES,
+    ResultCache,
+    config_digests,
+)
+from .parallel import iter_outcomes, resolve_jobs
+from .stages import StageContext, StructureOutcome
+
+SHARD_META_FILENAME = "shard.json"
+SHARD_OUTCOMES_FILENAME = "outcomes.jsonl"
+
+# формат артефактов шарда (merge отказывается смешивать разные версии)
+SHARD_FORMAT_VERSION = 1
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    "i/N" → (i, N), 0 <= i < N.
+
+    Raises
+    ------
+    ValueError
+        Если spec не в формате i/N или i вне диапазона.
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Шард задаётся как i/N (например 0/4), получено: {spec!r}")
+
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Номер шарда должен быть в диапазоне 0..N-1: {spec!r}")
+
+    return index, count
+
+
+# =============================================================================
+# Сериализация StructureOutcome
+# =============================================================================
+
+
+def outcome_to_dict(k: int, outcome: StructureOutcome) -> Dict[str, Any]:
+    """
+    Строка outcomes.jsonl: всё, что runner использует после per-structure стадий.
+
+    Кэш и замеры (cache_hits / cache_puts / timings) не сохраняются —
+    они относятся к узлу шарда.
+    """
+    item = outcome.item
+    rejection = outcome.rejection
+
+    return {
+        "k": k,
+        "structure_id": item.structure_id,
+        "path": str(item.path),
+        "rel_path": item.rel_path.as_posix(),
+        # CIF из таблицы: merge запишет его в validated/rejected
+        "cif_text": item.cif_text,
+        "rejection": (
+            {"reason": rejection.reason.value, "details": rejection.details}
+            if rejection is not None
+            else None
+        ),
+        "descriptors": (
+            asdict(outcome.descriptors) if outcome.descriptors is not None else None
+        ),
+        "geo_details": outcome.geo_details,
+        "charge_solution": outcome.charge_solution,
+        "is_novel": outcome.is_novel,
+        "is_magnetic": outcome.is_magnetic,
+        "structure": (
+            json.loads(outcome.structure.to_json())
+            if outcome.structure is not None
+            else None
+        ),
+        "not_computed": outcome.not_computed,
+    }
+
+
+def outcome_from_dict(data: Dict[str, Any]) -> StructureOutcome:
+    """Обратное к outcome_to_dict."""
+    rejection = data["rejection"]
+    descriptors = data["descriptors"]
+    structure = data["structure"]
+
+    return StructureOutcome(
+        item=StructureItem(
+            structure_id=data["structure_id"],
+            path=Path(data["path"]),
+            rel_path=Path(data["rel_path"]),
+            cif_text=data.get("cif_text"),
+        ),
+        rejection=(
+            Rejection(RejectionReason(rejection["reason"]), rejection["details"])
+            if rejection is not None
+            else None
+        ),
+        descriptors=Descriptors(**descriptors) if descriptors is not None else None,
+        geo_details=data["geo_details"],
+        charge_solution=data["charge_solution"],
+        is_novel=data["is_novel"],
+        is_magnetic=data["is_magnetic"],
+        structure=Structure.from_dict(structure) if structure is not None else None,
+        not_computed=data["not_computed"],
+    )
+
+
+# =============================================================================
+# Шард
+# =============================================================================
+
+
+def run_shard(
+    *,
+    input_dir: Optional[Path],
+    out_dir: Path,
+    cfg: PipelineConfig,
+    shard: Tuple[int, int],
+    input_table: Optional[InputTable] = None,
+    train_reference: Optional[Path] = None,
+    model_name: Optional[str] = None,
+    jobs: Optional[int] = 1,
+    cache_dir: Optional[Path] = None,
+    cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+    manifest: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """
+    Выполняет per-structure стадии для шарда shard = (i, N).
+
+    Пишет out_dir/outcomes.jsonl и out_dir/shard.json (последним:
+    шард без shard.json считается незавершённым). Возвращает содержимое
+    shard.json.
+    """
+    index, count = shard
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = out_dir / SHARD_META_FILENAME
+    outcomes_path = out_dir / SHARD_OUTCOMES_FILENAME
+
+    # артефакты прошлого запуска этого шарда больше не действительны
+    meta_path.unlink(missing_ok=True)
+
+    n_discovered = 0
+
+    def _select(items: Iterator[StructureItem]) -> Iterator[StructureItem]:
+        nonlocal n_discovered
+        for item in items:
+            if n_discovered % count == index:
+                yield item
+            n_discovered += 1
+
+    items = _select(iter_inputs(input_dir, manifest=manifest, table=input_table))
+
+    cache: Optional[ResultCache] = None
+    if cache_dir is not None:
+        cache = ResultCache(
+            cache_dir / DEFAULT_CACHE_FILENAME, max_bytes=cache_max_bytes
+        )
+
+    ctx = StageContext(
+        cfg=cfg,
+        train_reference=train_reference,
+        cache_path=cache.path if cache else None,
+        cache_digests=config_digests(cfg) if cache else None,
+    )
+
+    n_structures = 0
+    n_candidates = 0
+    rejection_reasons: Dict[str, int] = {}
+
+    tmp = outcomes_path.with_name(outcomes_path.name + ".tmp")
+
+    try:
+        with tmp.open("w", encoding="utf-8") as f:
+            for outcome in iter_outcomes(items, ctx, jobs=resolve_jobs(jobs)):
+                if cache is not None:
+                    cache.put_many(outcome.cache_puts)
+                    cache.touch_many(outcome.cache_hits)
+
+                # k — номер структуры в общем порядке обхода
+                k = index + n_structures * count
+                f.write(json.dumps(outcome_to_dict(k, outcome), ensure_ascii=False))
+                f.write("\n")
+
+                n_structures += 1
+                if outcome.is_candidate:
+                    n_candidates += 1
+                else:
+                    key = outcome.rejection.reason.value
+                    rejection_reasons[key] = rejection_reasons.get(key, 0) + 1
+    finally:
+        if cache is not None:
+            cache.close()
+
+    os.replace(tmp, outcomes_path)
+
+    source = input_table.path if input_table is not None else input_dir
+
+    meta = {
+        "version": SHARD_FORMAT_VERSION,
+        "shard": [index, count],
+        "model_name": model_name
+        or (input_table.name if input_table else input_name(input_dir)),
+        # папка или таблица — у всех шардов один и тот же вход
+        "input_dir": str(source.resolve()),
+        "n_discovered": n_discovered,
+        "n_structures": n_structures,
+        "n_candidates": n_candidates,
+        "rejection_reasons": rejection_reasons,
+        "config": config_to_dict(cfg),
+    }
+
+    meta_path.write_text(json.dumps(meta, indent=2))
+
+    return meta
+
+
+# =============================================================================
+# Слияние
+# =============================================================================
+
+
+def load_shards(shard_dirs: Sequence[Path]) -> List[Dict[str, Any]]:
+    """
+    Читает shard.json всех шардов и проверяет, что они составляют
+    один полный запуск: одна версия формата, одно N, каждый номер
+    0..N-1 ровно один раз, одинаковые конфигурация, модель и вход.
+
+    Returns
+    -------
+    List[dict]
+        Метаданные шардов по возрастанию номера (с ключом "dir").
+
+    Raises
+    ------
+    ValueError
+        Если шарды неполные, незавершённые или несовместимые.
+    """
+    metas = []
+    for shard_dir in shard_dirs:
+        meta_path = shard_dir / SHARD_META_FILENAME
+        if not meta_path.exists():
+            raise ValueError(f"Шард не завершён (нет {SHARD_META_FILENAME}): {shard_dir}")
+
+        meta = json.loads(meta_path.read_text())
+        if meta.get("version") != SHARD_FORMAT_VERSION:
+            raise ValueError(f"Несовместимая версия артефактов шарда: {shard_dir}")
+
+        meta["dir"] = shard_dir
+        metas.append(meta)
+
+    if not metas:
+        raise ValueError("Не задано ни одного шарда")
+
+    metas.sort(key=lambda m: m["shard"][0])
+
+    count = metas[0]["shard"][1]
+    indices = [m["shard"][0] for m in metas]
+    if any(m["shard"][1] != count for m in metas) or indices != list(range(count)):
+        found = ", ".join(f"{i}/{m['shard'][1]}" for i, m in zip(indices, metas))
+        raise ValueError(f"Нужны все шарды 0..{count - 1}/{count}, найдены: {found}")
+
+    first = metas[0]
+    for meta in metas[1:]:
+        for key in ("config", "model_name", "input_dir", "n_discovered"):
+            if meta[key] != first[key]:
+                raise ValueError(
+                    f"Шарды {first['dir']} и {meta['dir']} различаются: {key}"
+                )
+
+    if sum(m["n_structures"] for m in metas) != first["n_discovered"]:
+        raise ValueError("Сумма структур по шардам не совпадает с числом входных CIF")
+
+    return metas
+
+
+def shard_config(metas: Sequence[Dict[str, Any]]) -> PipelineConfig:
+    """Конфигурация, с которой считались шарды."""
+    return config_from_dict(metas[0]["config"])
+
+
+def _read_outcomes(path: Path) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            data = json.loads(line)
+            yield data["k"], data
+
+
+def iter_shard_outcomes(
+    metas: Sequence[Dict[str, Any]],
+) -> Iterator[StructureOutcome]:
+    """
+    StructureOutcome всех шардов в общем порядке обхода (по k).
+
+    Каждый outcomes.jsonl уже упорядочен по k, поэтому слияние потоковое:
+    в памяти по одной строке на шард.
+    """
+    streams = [_read_outcomes(meta["dir"] / SHARD_OUTCOMES_FILENAME) for meta in metas]
+
+    for _, data in heapq.merge(*streams, key=lambda pair: pair[0]):
+        yield outcome_from_dict(data)
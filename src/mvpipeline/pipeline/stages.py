@@ -0,0 +1,538 @@
+from __future__ import annotations
+
+"""
+stages.py — обработка одной структуры (per-structure стадии pipeline).
+
+Здесь собраны все стадии, которые зависят только от самой структуры
+и конфигурации, но НЕ от других структур:
+
+    prescan → read → sanity → geometry → charge → spacegroup + descriptors
+         → novelty → magnetism
+
+Порядок стадий — по стоимости (замерено на samples/*_cifs, мс на структуру):
+
+    prescan     ~0.2   (текст CIF без pymatgen, см. validation.cif_prescan)
+    read        ~3.4   (нужен всем стадиям)
+    descriptors ~0.2   (density, формула — один раз для всех стадий,
+                        см. analysis.batch_descriptors)
+    geometry    ~1.1   (поиск соседей, density)
+    charge      ~0.06  (перебор степеней окисления)
+    spacegroup  ~1.0   (spglib напрямую, см. analysis.spacegroup)
+
+prescan отклоняет пустые, оборванные и заведомо слишком большие (P1)
+файлы до pymatgen — с той же причиной, что дал бы разбор
+(cif_parse_error / too_many_atoms); остальные разбираются как раньше.
+
+Дешёвые отсекающие проверки (geometry, charge) идут раньше spacegroup,
+и симметрию считаем только для структур, которые их прошли.
+geometry остаётся перед charge, хотя charge дешевле: так сохраняется
+приоритет причин отклонения (physically_impossible_distance важнее
+charge_imbalance).
+
+Для отклонённых по geometry/charge структур spacegroup не вычисляется:
+Descriptors.spacegroup = None, а в StructureOutcome.not_computed
+записано ["spacegroup"] (попадает в details_json).
+
+Дедупликация сюда намеренно не входит: она зависит от порядка обработки
+(какие структуры уже приняты), поэтому выполняется в runner.py, в главном
+процессе, строго в порядке discovery.
+
+Каждая стадия (кроме дешёвых sanity / magnetism) выполняется под лимитом
+времени cfg.timeouts (см. timeouts.py): превышение → rejection timeout.
+
+Благодаря этому process_structure можно выполнять в пуле процессов:
+результат (StructureOutcome) сериализуется через pickle и возвращается
+в главный процесс.
+"""
+
+import os
+import pickle
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymatgen.core import Structure
+
+from ..analysis import (
+    compute_basic_descriptors,
+    get_spacegroup_number,
+    symmetry_cell,
+)
+from ..io import parse_cif, read_structure
+from ..novelty import TrainReferenceIndex, is_novel, load_train_reference
+from ..utils import (
+    Descriptors,
+    PipelineConfig,
+    Rejection,
+    RejectionReason,
+    StructureItem,
+    ValidationStatus,
+)
+from ..validation import (
+    check_charge_neutrality,
+    geometry_validate,
+    has_magnetic_elements,
+    prescan_validate,
+    sanity_ok,
+)
+from .cache import ResultCache, content_hash, get_reader, make_key
+from .profiling import NULL_TIMER, StageTimer, Timing
+from .timeouts import StageTimeout, time_limit, watch_item
+
+# =============================================================================
+# Контекст стадий (то, что нужно воркеру помимо самой структуры)
+# =============================================================================
+
+
+@dataclass(frozen=True)
+class StageContext:
+    """
+    Всё, что нужно для обработки одной структуры.
+
+    Объект маленький и picklable: в параллельном режиме он передаётся
+    в воркеры вместе с каждой пачкой структур.
+
+    cfg
+        Конфигурация pipeline.
+
+    train_reference
+        Путь к train_reference.csv (или None).
+        Передаём именно путь, а не загруженный индекс: индекс загружается
+        в каждом процессе один раз (см. _get_reference).
+
+    cache_path
+        Путь к SQLite-кэшу результатов (или None — кэш выключен).
+        Воркеры только читают кэш, новые записи возвращаются
+        в StructureOutcome.cache_puts и пишутся главным процессом.
+
+    cache_digests
+        Хэши полей конфига для каждой стадии (см. cache.config_digests).
+
+    profile
+        Замерять время стадий (StructureOutcome.timings, см. profiling.py).
+    """
+
+    cfg: PipelineConfig
+    train_reference: Optional[Path] = None
+    cache_path: Optional[Path] = None
+    cache_digests: Optional[Dict[str, str]] = None
+    profile: bool = False
+
+
+# кэш загруженных train_reference в текущем процессе: path -> index
+_REFERENCES: Dict[Optional[Path], Optional[TrainReferenceIndex]] = {}
+
+
+def _get_reference(path: Optional[Path]) -> Optional[TrainReferenceIndex]:
+    """
+    Возвращает индекс train_reference, загружая его один раз на процесс.
+    """
+    if path not in _REFERENCES:
+        _REFERENCES[path] = load_train_reference(path)
+    return _REFERENCES[path]
+
+
+# =============================================================================
+# Результат per-structure стадий
+# =============================================================================
+
+
+@dataclass
+class StructureOutcome:
+    """
+    Результат обработки одной структуры до дедупликации.
+
+    item
+        Входной файл.
+
+    rejection
+        Причина отклонения, если структура отклонена одной из стадий.
+        None → структура прошла все per-structure проверки и является
+        кандидатом на дедупликацию.
+
+    descriptors
+        Дескрипторы (если дошли до их вычисления).
+
+    geo_details
+        Детали геометрической проверки (если она выполнялась).
+
+    charge_solution
+        Найденные степени окисления (только для кандидатов).
+
+    is_novel / is_magnetic
+        Метрики (только для кандидатов).
+
+    structure
+        Сама структура — нужна только кандидатам (для StructureMatcher).
+        Для отклонённых не передаём, чтобы не гонять её через pickle.
+
+    not_computed
+        Стадии, которые для этой структуры намеренно не выполнялись
+        (например, "spacegroup" у отклонённых по geometry/charge).
+        Соответствующие поля остаются None — это "не считали",
+        а не "не удалось определить".
+
+    cache_hits / cache_puts
+        Ключи найденных в кэше записей (для LRU) и новые записи
+        (key, pickle bytes), которые главный процесс запишет в кэш.
+
+    timings / pid
+        Замеры стадий (stage, start, wall ns, cpu ns) и процесс, в котором
+        они сделаны — только при StageContext.profile.
+    """
+
+    item: StructureItem
+    rejection: Optional[Rejection] = None
+    descriptors: Optional[Descriptors] = None
+    geo_details: Optional[Dict[str, Any]] = None
+    charge_solution: Optional[Dict[str, int]] = None
+    is_novel: Optional[bool] = None
+    is_magnetic: bool = False
+    structure: Optional[Structure] = None
+    not_computed: List[str] = field(default_factory=list)
+    cache_hits: List[str] = field(default_factory=list)
+    cache_puts: List[Tuple[str, bytes]] = field(default_factory=list)
+    timings: List[Timing] = field(default_factory=list)
+    pid: Optional[int] = None
+
+    @property
+    def is_candidate(self) -> bool:
+        """True, если структура прошла все per-structure проверки."""
+        return self.rejection is None
+
+
+# =============================================================================
+# Кэш стадий одной структуры
+# =============================================================================
+
+
+class _StageCache:
+    """
+    Доступ к кэшу результатов в рамках одной структуры.
+
+    get_or_compute(stage, compute, data_hash=None):
+        - если кэш выключен — просто вызывает compute()
+        - если запись есть — возвращает её (и запоминает ключ в hits)
+        - иначе считает, возвращает и запоминает запись в puts
+
+    data_hash — ключ записи вместо sha256 CIF (spacegroup кэшируется
+    по каноническому хэшу структуры: разные тексты одной структуры —
+    одна запись).
+    """
+
+    def __init__(
+        self,
+        cache: Optional[ResultCache],
+        data_hash: Optional[str],
+        digests: Optional[Dict[str, str]],
+    ) -> None:
+        self.cache = cache
+        self.data_hash = data_hash
+        self.digests = digests or {}
+        self.hits: List[str] = []
+        self.puts: List[Tuple[str, bytes]] = []
+
+    def get_or_compute(
+        self,
+        stage: str,
+        compute: Callable[[], Any],
+        data_hash: Optional[str] = None,
+    ) -> Any:
+        if self.cache is None or self.data_hash is None:
+            return compute()
+
+        key = make_key(
+            stage, data_hash or self.data_hash, self.digests.get(stage, "")
+        )
+
+        value = self.cache.get(key)
+        if value is not None:
+            self.hits.append(key)
+            return value
+
+        value = compute()
+        self.puts.append((key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        return value
+
+
+def _open_stage_cache(item: StructureItem, ctx: StageContext) -> _StageCache:
+    """Считает хэш содержимого CIF и открывает кэш (если он включён)."""
+    if ctx.cache_path is None:
+        return _StageCache(None, None, None)
+
+    try:
+        if item.cif_text is not None:
+            data_hash = content_hash(item.cif_text.encode("utf-8"))
+        else:
+            data_hash = content_hash(item.path.read_bytes())
+    except OSError:
+        # файл не читается — пусть ошибку покажет стадия parse
+        return _StageCache(None, None, None)
+
+    return _StageCache(get_reader(ctx.cache_path), data_hash, ctx.cache_digests)
+
+
+def _input_error(item: StructureItem) -> Optional[str]:
+    """Почему входной файл не открыть (None — открывается или CIF в памяти)."""
+    if item.cif_text is not None:
+        return None
+    try:
+        with item.path.open("rb"):
+            return None
+    except OSError as e:
+        return str(e)
+
+
+def _read_text(item: StructureItem) -> Optional[str]:
+    """
+    Текст CIF для prescan: cif_text или содержимое *.cif-файла
+    (как его читает pymatgen — utf-8 с заменой ошибок, любые переводы строк).
+
+    None — prescan не выполняется: файл не читается (ошибку покажет parse)
+    или это не *.cif (path_column может указывать на другой формат).
+    """
+    if item.cif_text is not None:
+        return item.cif_text
+    if item.path.suffix.lower() != ".cif":
+        return None
+
+    try:
+        data = item.path.read_bytes()
+    except OSError:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _parse(item: StructureItem) -> Tuple[Optional[Structure], Optional[str]]:
+    """
+    Читает CIF. Возвращает (structure, None) или (None, текст ошибки).
+
+    Ошибка возвращается значением, а не исключением, чтобы её тоже можно
+    было положить в кэш и не парсить битый файл повторно.
+    """
+    try:
+        if item.cif_text is not None:
+            return parse_cif(item.cif_text), None
+        return read_structure(item.path), None
+    except Exception as e:
+        return None, str(e)
+
+
+# =============================================================================
+# Обработка одной структуры
+# =============================================================================
+
+
+def process_structure(item: StructureItem, ctx: StageContext) -> StructureOutcome:
+    """
+    Прогоняет одну структуру через все per-structure стадии.
+
+    Порядок стадий и причины отклонения совпадают с последовательным
+    pipeline, поэтому результат не зависит от того, где он посчитан
+    (в главном процессе или в воркере) и взят ли он из кэша.
+
+    Стадия, не уложившаяся в лимит (cfg.timeouts), отклоняет структуру
+    с причиной timeout; уже посчитанные стадии всё равно идут в кэш.
+    """
+    timer = StageTimer() if ctx.profile else NULL_TIMER
+
+    if ctx.cache_path is not None:
+        with timer.stage("hash"):
+            cache = _open_stage_cache(item, ctx)
+    else:
+        cache = _open_stage_cache(item, ctx)
+
+    try:
+        outcome = _run_stages(item, ctx, cache, timer)
+    except StageTimeout as e:
+        outcome = StructureOutcome(
+            item=item,
+            rejection=Rejection(RejectionReason.TIMEOUT, e.details),
+        )
+    outcome.cache_hits = cache.hits
+    outcome.cache_puts = cache.puts
+
+    if ctx.profile:
+        outcome.timings = timer.records
+        outcome.pid = os.getpid()
+
+    return outcome
+
+
+def _run_stages(
+    item: StructureItem,
+    ctx: StageContext,
+    cache: _StageCache,
+    timer: Any = NULL_TIMER,
+) -> StructureOutcome:
+    cfg = ctx.cfg
+    limits = cfg.timeouts
+
+    # входной файл пропал или не читается: отклоняем без разбора
+    # (и без копии — StructureWriter источник не трогает)
+    error = _input_error(item)
+    if error is not None:
+        return StructureOutcome(
+            item=item,
+            rejection=Rejection(
+                reason=RejectionReason.INPUT_UNREADABLE,
+                details={"path": str(item.path), "error": error},
+            ),
+        )
+
+    # ------------------------------------------------------------
+    # 0. prescan: заведомо битый или слишком большой CIF — без разбора
+    # 1. Читаем CIF
+    #    (prescan — часть разбора: один лимит parse на обе стадии)
+    # ------------------------------------------------------------
+
+    with time_limit("parse", limits.parse):
+        with timer.stage("prescan"):
+            text = _read_text(item)
+            prescan = prescan_validate(text, cfg) if text is not None else None
+
+        if prescan is not None and not prescan.ok:
+            return StructureOutcome(
+                item=item,
+                rejection=Rejection(reason=prescan.reason, details=prescan.details),
+            )
+
+        with timer.stage("parse"):
+            struct, error = cache.get_or_compute("parse", lambda: _parse(item))
+
+    if struct is None:
+        # если CIF не читается — отклоняем
+        return StructureOutcome(
+            item=item,
+            rejection=Rejection(
+                reason=RejectionReason.CIF_PARSE_ERROR,
+                details={"error": error},
+            ),
+        )
+
+    # ------------------------------------------------------------
+    # 2. sanity проверка
+    # ------------------------------------------------------------
+
+    with timer.stage("sanity"):
+        sane = sanity_ok(struct)
+
+    if not sane:
+        return StructureOutcome(
+            item=item,
+            rejection=Rejection(
+                reason=RejectionReason.CIF_SANITY_ERROR,
+                details={"error": "sanity_failed"},
+            ),
+        )
+
+    # ------------------------------------------------------------
+    # 3. проверяем геометрию
+    #    базовые дескрипторы (n_atoms, density, volume_per_atom, формула)
+    #    считаются один раз: их берут geometry, отклонённые структуры
+    #    и spacegroup (Descriptors с номером группы)
+    # ------------------------------------------------------------
+
+    with timer.stage("descriptors"):
+        basic = compute_basic_descriptors(struct, None)
+
+    with timer.stage("geometry"), time_limit("geometry", limits.geometry):
+        geo = cache.get_or_compute(
+            "geometry", lambda: geometry_validate(struct, cfg, basic)
+        )
+
+    if geo.status == ValidationStatus.REJECTED:
+        return StructureOutcome(
+            item=item,
+            rejection=Rejection(geo.reason, geo.details),
+            descriptors=basic,
+            geo_details=geo.details,
+            not_computed=["spacegroup"],
+        )
+
+    # ------------------------------------------------------------
+    # 4. проверяем заряд
+    # ------------------------------------------------------------
+
+    with timer.stage("charge"), time_limit("charge", limits.charge):
+        charge = cache.get_or_compute(
+            "charge", lambda: check_charge_neutrality(struct, cfg)
+        )
+
+    if not charge.ok:
+        return StructureOutcome(
+            item=item,
+            rejection=Rejection(charge.reason, charge.details),
+            descriptors=basic,
+            geo_details=geo.details,
+            not_computed=["spacegroup"],
+        )
+
+    # ------------------------------------------------------------
+    # 5–6. определяем spacegroup и считаем дескрипторы
+    #      (только для прошедших geometry/charge;
+    #       кэшируются вместе: Descriptors содержит spacegroup;
+    #       ключ — канонический хэш структуры, а не текста CIF)
+    # ------------------------------------------------------------
+
+    with timer.stage("spacegroup"), time_limit("spacegroup", limits.spacegroup):
+        cell = symmetry_cell(struct)
+        desc = cache.get_or_compute(
+            "spacegroup",
+            lambda: replace(
+                basic, spacegroup=get_spacegroup_number(cell, cfg.symprec)
+            ),
+            data_hash=cell.key,
+        )
+
+    # ------------------------------------------------------------
+    # 7. проверяем новизну
+    # ------------------------------------------------------------
+
+    # train_reference загружается вне лимита: загрузка — разовая на процесс,
+    # и её превышение не должно отклонять каждую следующую структуру
+    with timer.stage("novelty"):
+        reference = _get_reference(ctx.train_reference)
+        with time_limit("novelty", limits.novelty):
+            novel = is_novel(
+                struct,
+                reference,
+                reduced_formula=desc.reduced_formula,
+                spacegroup=desc.spacegroup,
+            )
+
+    # ------------------------------------------------------------
+    # 8. проверяем магнитность
+    #    (нужна только если структура не окажется дубликатом,
+    #     но считать её дёшево, а в воркере — бесплатно для главного процесса)
+    # ------------------------------------------------------------
+
+    with timer.stage("magnetism"):
+        magnetic = has_magnetic_elements(struct, cfg)
+
+    return StructureOutcome(
+        item=item,
+        descriptors=desc,
+        geo_details=geo.details,
+        charge_solution=charge.solution,
+        is_novel=novel,
+        is_magnetic=magnetic,
+        structure=struct,
+    )
+
+
+def process_chunk(
+    items: List[StructureItem], ctx: StageContext, chunk_id: int = 0
+) -> List[StructureOutcome]:
+    """
+    Обрабатывает пачку структур (единица работы для пула процессов).
+
+    Пачки уменьшают overhead на pickle/IPC по сравнению с отправкой
+    каждой структуры отдельной задачей. chunk_id и номер текущей
+    структуры видит сторож пула (timeouts.watch_item).
+    """
+    outcomes = []
+    for k, item in enumerate(items):
+        watch_item(chunk_id, k)
+        outcomes.append(process_structure(item, ctx))
+    return outcomes
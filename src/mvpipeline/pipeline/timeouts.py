@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+"""
+timeouts.py — лимиты времени на стадии одной структуры.
+
+Редкий "патологический" CIF может заставить SpacegroupAnalyzer или
+StructureMatcher.fit работать минутами, и весь запуск стоит за ним.
+Лимиты задаются в thresholds.yaml (секция timeouts, секунды на стадию):
+
+    timeouts:
+      spacegroup: 60
+      dedup: 120
+
+Превышение лимита → структура отклоняется с причиной timeout,
+в details — стадия и лимит; счётчик по стадиям попадает в отчёт.
+
+Как устроено:
+    time_limit(stage, seconds) взводит таймер ITIMER_REAL, по SIGALRM
+    в стадии поднимается StageTimeout. Per-structure стадии считаются
+    в воркерах (или в главном процессе при --jobs 1), dedup — всегда
+    в главном процессе; в каждом случае это главный поток процесса,
+    где обработчики сигналов и работают.
+
+Сторож (watchdog) для вызовов C-кода:
+    обработчик сигнала срабатывает между байткодами Python, поэтому
+    зависший вызов C-кода (один вызов spglib) SIGALRM не прерывает.
+    В воркерах пула (parallel.WorkerPool) time_limit дополнительно
+    публикует в общую память текущую структуру, стадию и срок (слот
+    воркера, attach_watchdog). Главный процесс проверяет сроки; если
+    воркер не вышел из стадии через _WATCHDOG_GRACE_S после срока, он
+    убивается, пул пересоздаётся, а структура отклоняется с timeout
+    (в details — та же стадия и лимит, плюс "watchdog": true).
+    SIGALRM остаётся дешёвым путём для кода на Python.
+
+Ограничения:
+    - SIGALRM — только POSIX; сторож работает везде, но только в пуле
+      (--jobs > 1): при --jobs 1 зависший C-вызов останавливает запуск;
+    - результат зависит от скорости машины: на медленной машине
+      структура может не уложиться в лимит, на быстрой — уложиться.
+"""
+
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+# стадии с лимитом (номер стадии хранится в слоте сторожа)
+STAGES = ("parse", "geometry", "charge", "spacegroup", "novelty", "dedup")
+
+# сколько сторож ждёт после срока стадии, прежде чем убить воркер:
+# обычный выход по SIGALRM должен успеть раньше
+_WATCHDOG_GRACE_S = 2.0
+
+# слот воркера в общей памяти: [chunk, номер в пачке, стадия, срок, лимит, pid]
+SLOT_SIZE = 6
+_CHUNK, _INDEX, _STAGE, _DEADLINE, _LIMIT, _PID = range(SLOT_SIZE)
+
+# слот текущего процесса: (общий массив, смещение) или None (не воркер пула)
+_SLOT: Optional[Tuple[Any, int]] = None
+
+
+class StageTimeout(BaseException):
+    """
+    Стадия не уложилась в лимит времени.
+
+    Наследуется от BaseException (как KeyboardInterrupt): стадии и pymatgen
+    местами перехватывают Exception целиком (например, _parse превращает
+    любую ошибку в cif_parse_error), а таймаут должен дойти до
+    process_structure / runner, а не стать "ошибкой парсинга".
+    """
+
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(stage, seconds)
+        self.stage = stage
+        self.seconds = seconds
+
+    @property
+    def details(self) -> Dict[str, Any]:
+        """details для Rejection(RejectionReason.TIMEOUT, ...)."""
+        return {"stage": self.stage, "limit_s": self.seconds}
+
+
+def timeouts_supported() -> bool:
+    """Можно ли прервать стадию по таймеру в текущем потоке."""
+    return (
+        hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+
+
+# =============================================================================
+# Сторож
+# =============================================================================
+
+
+def attach_watchdog(slots: Any, index: int, pid: int) -> None:
+    """Воркер пула: слот index общего массива slots (RawArray "d")."""
+    global _SLOT
+    _SLOT = (slots, index * SLOT_SIZE)
+    slots[_SLOT[1] + _DEADLINE] = 0.0
+    slots[_SLOT[1] + _PID] = float(pid)
+
+
+def watch_item(chunk_id: int, index: int) -> None:
+    """Воркер начинает index-ю структуру пачки chunk_id."""
+    if _SLOT is not None:
+        slots, base = _SLOT
+        slots[base + _CHUNK] = float(chunk_id)
+        slots[base + _INDEX] = float(index)
+
+
+def overdue(slots: Any, n_slots: int) -> Optional[Dict[str, Any]]:
+    """
+    Главный процесс: первый воркер, который не вышел из стадии вовремя.
+
+    Returns
+    -------
+    dict или None
+        {"chunk", "index", "stage", "limit_s", "pid"}.
+    """
+    now = time.monotonic()
+    for k in range(n_slots):
+        base = k * SLOT_SIZE
+        deadline = slots[base + _DEADLINE]
+        if not deadline or now <= deadline + _WATCHDOG_GRACE_S:
+            continue
+
+        info = {
+            "chunk": int(slots[base + _CHUNK]),
+            "index": int(slots[base + _INDEX]),
+            "stage": STAGES[int(slots[base + _STAGE])],
+            "limit_s": slots[base + _LIMIT],
+            "pid": int(slots[base + _PID]),
+        }
+        # срок мог смениться, пока читали слот (воркер перешёл к стадии дальше)
+        if slots[base + _DEADLINE] == deadline:
+            return info
+    return None
+
+
+def watchdog_pids(slots: Any, n_slots: int) -> Sequence[int]:
+    """pid воркеров, занявших слоты."""
+    pids = (int(slots[k * SLOT_SIZE + _PID]) for k in range(n_slots))
+    return [pid for pid in pids if pid > 0]
+
+
+@contextmanager
+def _watched(stage: str, seconds: float) -> Iterator[None]:
+    """Публикует стадию и срок в слот сторожа (если это воркер пула)."""
+    if _SLOT is None or stage not in STAGES:
+        yield
+        return
+
+    slots, base = _SLOT
+    slots[base + _STAGE] = float(STAGES.index(stage))
+    slots[base + _LIMIT] = float(seconds)
+    # срок пишется последним: по нему главный процесс читает слот
+    slots[base + _DEADLINE] = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        slots[base + _DEADLINE] = 0.0
+
+
+# =============================================================================
+# Лимит времени
+# =============================================================================
+
+
+@contextmanager
+def time_limit(stage: str, seconds: Optional[float]) -> Iterator[None]:
+    """
+    Ограничивает время блока: по истечении seconds поднимает StageTimeout.
+
+    seconds = None / 0 — без ограничения. На платформе без setitimer
+    (или не в главном потоке) работает только сторож пула.
+    """
+    if not seconds:
+        yield
+        return
+
+    with _watched(stage, seconds):
+        if not timeouts_supported():
+            yield
+            return
+
+        with _alarm(stage, seconds):
+            yield
+
+
+@contextmanager
+def _alarm(stage: str, seconds: float) -> Iterator[None]:
+    """SIGALRM через seconds → StageTimeout."""
+
+    def _on_alarm(signum, frame):
+        raise StageTimeout(stage, seconds)
+
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
@@ -3,12 +3,16 @@ Report module: формирование артефактов анализа.
 
 Отвечает за:
     - запись общего CSV со всеми структурами (all_structures.csv)
+    - то же в Parquet (all_structures.parquet/, опционально — нужен pyarrow)
     - (при желании) будущие графики/агрегации/таблицы
 
 Публичный API:
     BufferedCSVWriter
+    ParquetRecordsWriter
+    records_schema
 """
 
 from .records import BufferedCSVWriter
+from .columnar import ParquetRecordsWriter, records_schema
 
-__all__ = ["BufferedCSVWriter"]
+__all__ = ["BufferedCSVWriter", "ParquetRecordsWriter", "records_schema"]
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+"""
+report/columnar.py — all_structures в колоночном формате (Parquet).
+
+mvp --records-format parquet пишет вместо all_structures.csv директорию
+
+    all_structures.parquet/
+        part-00000.parquet
+        part-00001.parquet
+        ...
+
+Каждый сброс буфера (flush_every строк) — отдельный part-файл с одной
+row group. Так данные появляются на диске по ходу запуска, а после
+прерывания (resume) достаточно удалить part-файлы после последнего
+checkpoint — дописывать в закрытый Parquet-файл нельзя.
+
+Директория читается целиком как один датасет:
+
+    pd.read_parquet("outputs/my_model/all_structures.parquet")
+    pyarrow.dataset.dataset("outputs/my_model/all_structures.parquet")
+
+Отличия от CSV:
+    - типизированная схема (RECORDS_SCHEMA): bool/int/float/null вместо строк,
+      повторно приводить типы при чтении не нужно;
+    - часть details_json развёрнута в колонки: min_distance_gt,
+      suspicious_reason, not_computed, duplicate_of_*;
+    - charge_solution — map<элемент, степень окисления>;
+    - details_json сохраняется целиком (без потерь относительно CSV).
+
+pyarrow — опциональная зависимость: нужен только для этого формата.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_PARQUET_DIRNAME = "all_structures.parquet"
+
+_PART_PATTERN = "part-{:05d}.parquet"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "Для --records-format parquet нужен pyarrow: pip install pyarrow"
+        ) from e
+
+    return pyarrow
+
+
+def records_schema():
+    """Схема all_structures.parquet (pyarrow.Schema)."""
+    pa = _require_pyarrow()
+
+    return pa.schema(
+        [
+            ("structure_id", pa.string()),
+            ("input_path", pa.string()),
+            ("status", pa.dictionary(pa.int8(), pa.string())),
+            ("rejection_reason", pa.dictionary(pa.int8(), pa.string())),
+            ("is_suspicious", pa.bool_()),
+            ("is_duplicate", pa.bool_()),
+            ("is_novel", pa.bool_()),
+            ("is_magnetic", pa.bool_()),
+            ("n_atoms", pa.int32()),
+            ("density", pa.float64()),
+            ("volume_per_atom", pa.float64()),
+            ("reduced_formula", pa.string()),
+            ("spacegroup", pa.int16()),
+            ("min_distance", pa.float64()),
+            ("min_distance_gt", pa.float64()),
+            ("suspicious_reason", pa.string()),
+            ("not_computed", pa.list_(pa.string())),
+            ("duplicate_of_source", pa.string()),
+            ("duplicate_of_structure_id", pa.string()),
+            ("charge_solution", pa.map_(pa.string(), pa.int8())),
+            ("details_json", pa.string()),
+        ]
+    )
+
+
+def _or_none(value: Any) -> Any:
+    """"" (пустая ячейка CSV) → None."""
+    return None if value == "" else value
+
+
+def record_to_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Строка all_structures.csv (см. runner._make_record) → строка RECORDS_SCHEMA.
+    """
+    details = json.loads(record["details_json"]) if record["details_json"] else {}
+    geometry = details.get("geometry") or {}
+    duplicate_of = (details.get("rejection_details") or {}).get("duplicate_of") or {}
+
+    charge = record["charge_solution_json"]
+    charge_solution = list(json.loads(charge).items()) if charge else None
+
+    return {
+        "structure_id": record["structure_id"],
+        "input_path": record["input_path"],
+        "status": record["status"],
+        "rejection_reason": _or_none(record["rejection_reason"]),
+        "is_suspicious": record["is_suspicious"],
+        "is_duplicate": record["is_duplicate"],
+        "is_novel": _or_none(record["is_novel"]),
+        "is_magnetic": record["is_magnetic"],
+        "n_atoms": _or_none(record["n_atoms"]),
+        "density": _or_none(record["density"]),
+        "volume_per_atom": _or_none(record["volume_per_atom"]),
+        "reduced_formula": _or_none(record["reduced_formula"]),
+        "spacegroup": _or_none(record["spacegroup"]),
+        "min_distance": _or_none(record["min_distance"]),
+        "min_distance_gt": geometry.get("min_distance_gt"),
+        "suspicious_reason": geometry.get("suspicious_reason"),
+        "not_computed": details.get("not_computed"),
+        "duplicate_of_source": duplicate_of.get("source"),
+        "duplicate_of_structure_id": duplicate_of.get("structure_id"),
+        "charge_solution": charge_solution,
+        "details_json": record["details_json"],
+    }
+
+
+def truncate_parts(path: Path, n_parts: int) -> None:
+    """
+    Удаляет part-файлы с номером >= n_parts (и недописанные .tmp).
+
+    Resume: n_parts берётся из последнего checkpoint журнала прогресса.
+    """
+    if not path.is_dir():
+        return
+
+    for part in path.iterdir():
+        name = part.name
+        if name.endswith(".tmp"):
+            part.unlink()
+        elif name.startswith("part-") and name.endswith(".parquet"):
+            if int(name[len("part-") : -len(".parquet")]) >= n_parts:
+                part.unlink()
+
+
+@dataclass
+class ParquetRecordsWriter:
+    """
+    Буферизированный writer all_structures.parquet (интерфейс как у BufferedCSVWriter).
+
+    add(record)
+        Добавляет строку (в формате CSV-записи) в буфер.
+
+    flush()
+        Пишет буфер новым part-файлом (атомарно: .tmp → rename).
+
+    start_part
+        С какого номера part-файла продолжать (resume).
+
+    on_flush
+        Вызывается после каждого сброса с числом part-файлов на диске
+        (это значение журнал прогресса хранит как размер записей).
+    """
+
+    path: Path
+    flush_every: int = 5000
+    start_part: int = 0
+    on_flush: Optional[Callable[[int], None]] = None
+    compression: str = "zstd"
+
+    _buffer: List[Dict[str, Any]] = field(default_factory=list)
+    _schema: Any = None
+
+    def __post_init__(self) -> None:
+        # проверяем pyarrow сразу, а не на первом сбросе посреди запуска
+        self._schema = records_schema()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._n_parts = self.start_part
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self._buffer.append(record_to_row(record))
+
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(self._buffer, schema=self._schema)
+
+        dst = self.path / _PART_PATTERN.format(self._n_parts)
+        tmp = dst.with_name(dst.name + ".tmp")
+        pq.write_table(table, tmp, compression=self.compression)
+        os.replace(tmp, dst)
+
+        self._buffer.clear()
+        self._n_parts += 1
+
+        if self.on_flush is not None:
+            self.on_flush(self._n_parts)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> ParquetRecordsWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -12,9 +12,10 @@ report/records.py — запись общего CSV со всеми структ
 """
 
 import csv
+import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 
 DEFAULT_RECORDS_FILENAME = "all_structures.csv"
@@ -37,11 +38,21 @@ class BufferedCSVWriter:
     Почему так:
         - запись на диск по одной строке часто даёт ощутимый overhead
         - буфер помогает уменьшить число IO операций
+
+    write_header
+        Писать ли заголовок при открытии. False — при продолжении
+        прерванного запуска (resume), когда заголовок уже есть в файле.
+
+    on_flush
+        Вызывается после каждого сброса буфера на диск с текущим размером
+        файла в байтах. Используется журналом прогресса для checkpoint.
     """
 
     path: Path
     fieldnames: List[str]
     flush_every: int = 500
+    write_header: bool = True
+    on_flush: Optional[Callable[[int], None]] = None
 
     _buffer: List[Dict[str, Any]] = field(default_factory=list)
     _file: Optional[Any] = None
@@ -55,8 +66,9 @@ class BufferedCSVWriter:
         # newline="" важно для csv в Windows/macOS, чтобы не было пустых строк
         self._file = self.path.open("a", encoding="utf-8", newline="")
         self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
-        self._writer.writeheader()
-        self._wrote_header = True
+        if self.write_header:
+            self._writer.writeheader()
+            self._wrote_header = True
 
     def add(self, record: Dict[str, Any]) -> None:
         """
@@ -89,6 +101,9 @@ class BufferedCSVWriter:
         assert self._file is not None
         self._file.flush()
 
+        if self.on_flush is not None:
+            self.on_flush(os.fstat(self._file.fileno()).st_size)
+
     def close(self) -> None:
         """Сбрасывает остаток и закрывает файл."""
         try:
@@ -17,10 +17,14 @@ Utils module: базовые типы, конфигурация и конста
     ValidationResult
     PipelineConfig
     DedupConfig
+    TimeoutConfig
     load_config
     ValidationStatus
     GeometryQuality
     RejectionReason
+    OutputMode
+    RejectionLogFormat
+    RecordsFormat
     MAGNETIC_ELEMENTS_DEFAULT
 """
 
@@ -34,6 +38,7 @@ from .types import (
 from .config import (
     PipelineConfig,
     DedupConfig,
+    TimeoutConfig,
     load_config,
 )
 
@@ -41,6 +46,9 @@ from .constants import (
     ValidationStatus,
     GeometryQuality,
     RejectionReason,
+    OutputMode,
+    RejectionLogFormat,
+    RecordsFormat,
     MAGNETIC_ELEMENTS_DEFAULT,
 )
 
@@ -51,9 +59,13 @@ __all__ = [
     "ValidationResult",
     "PipelineConfig",
     "DedupConfig",
+    "TimeoutConfig",
     "load_config",
     "ValidationStatus",
     "GeometryQuality",
     "RejectionReason",
+    "OutputMode",
+    "RejectionLogFormat",
+    "RecordsFormat",
     "MAGNETIC_ELEMENTS_DEFAULT",
 ]
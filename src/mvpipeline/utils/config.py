@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Dict, List, Set, Union
+from typing import Any, Dict, List, Optional, Set, Union
 
 import yaml
 
@@ -34,6 +34,30 @@ class DedupConfig:
     angle_tol: float = 5.0
 
 
+@dataclass(frozen=True)
+class TimeoutConfig:
+    """
+    Лимиты времени на стадии одной структуры (секунды).
+
+    None → без ограничения. Превышение → структура отклоняется
+    с причиной timeout (см. pipeline/timeouts.py).
+
+    parse, geometry, charge, spacegroup, novelty
+        per-structure стадии (считаются в воркерах).
+
+    dedup
+        сравнение с уже принятыми структурами (StructureMatcher.fit,
+        главный процесс).
+    """
+
+    parse: Optional[float] = None
+    geometry: Optional[float] = None
+    charge: Optional[float] = None
+    spacegroup: Optional[float] = None
+    novelty: Optional[float] = None
+    dedup: Optional[float] = None
+
+
 @dataclass(frozen=True)
 class PipelineConfig:
     """
@@ -118,6 +142,12 @@ class PipelineConfig:
 
     dedup: DedupConfig = DedupConfig()
 
+    # -----------------------
+    # Time limits
+    # -----------------------
+
+    timeouts: TimeoutConfig = TimeoutConfig()
+
 
 # тип пути (для удобства typing)
 PathLike = Union[str, Path]
@@ -145,6 +175,12 @@ def load_config(path: PathLike) -> PipelineConfig:
             - Fe
             - Co
 
+        dedup:
+            ltol: 0.2
+
+        timeouts:
+            spacegroup: 60
+
     Parameters
     ----------
     path : PathLike
@@ -203,6 +239,31 @@ def load_config(path: PathLike) -> PipelineConfig:
 
     symprec = float(cfg.get("symprec", 0.01))
 
+    # -----------------------
+    # deduplication (StructureMatcher)
+    # -----------------------
+
+    dd = cfg.get("dedup", {}) or {}
+
+    dedup = DedupConfig(
+        ltol=float(dd.get("ltol", 0.2)),
+        stol=float(dd.get("stol", 0.3)),
+        angle_tol=float(dd.get("angle_tol", 5.0)),
+    )
+
+    # -----------------------
+    # time limits (0 / null → без ограничения)
+    # -----------------------
+
+    to = cfg.get("timeouts", {}) or {}
+
+    timeouts = TimeoutConfig(
+        **{
+            stage: float(to[stage]) if to.get(stage) else None
+            for stage in TimeoutConfig.__dataclass_fields__
+        }
+    )
+
     # -----------------------
     # build config object
     # -----------------------
@@ -225,4 +286,37 @@ def load_config(path: PathLike) -> PipelineConfig:
         reject_suspicious=reject_suspicious,
         # symmetry
         symprec=symprec,
+        # dedup
+        dedup=dedup,
+        # time limits
+        timeouts=timeouts,
+    )
+
+
+def config_to_dict(cfg: PipelineConfig) -> Dict[str, Any]:
+    """
+    PipelineConfig → JSON-совместимый словарь (для артефактов, которые
+    должны нести с собой конфигурацию, например частичных результатов --shard).
+    """
+    data = asdict(cfg)
+    data["oxidation_states"] = {
+        el: list(states) for el, states in sorted((cfg.oxidation_states or {}).items())
+    }
+    data["magnetic_elements"] = sorted(cfg.magnetic_elements or ())
+    return data
+
+
+def config_from_dict(data: Dict[str, Any]) -> PipelineConfig:
+    """Обратное к config_to_dict."""
+    return PipelineConfig(
+        **{
+            **data,
+            "oxidation_states": {
+                str(el): [int(x) for x in states]
+                for el, states in (data.get("oxidation_states") or {}).items()
+            },
+            "magnetic_elements": set(data.get("magnetic_elements") or ()),
+            "dedup": DedupConfig(**data.get("dedup", {})),
+            "timeouts": TimeoutConfig(**data.get("timeouts", {})),
+        }
     )
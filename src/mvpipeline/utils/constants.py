@@ -26,6 +26,11 @@ from enum import Enum
 # Default values
 # =============================================================================
 
+# Версия pipeline.
+# Входит в ключ кэша результатов: после смены версии старые записи
+# кэша автоматически перестают использоваться.
+PIPELINE_VERSION = "0.1.0"
+
 # Дефолтный список магнитных элементов.
 # Используется если magnetic_elements не задан в thresholds.yaml.
 MAGNETIC_ELEMENTS_DEFAULT = {
@@ -84,6 +89,88 @@ class GeometryQuality(str, Enum):
     SUSPICIOUS = "suspicious"
 
 
+# =============================================================================
+# Output mode (как раскладывать CIF по validated/rejected)
+# =============================================================================
+
+
+class OutputMode(str, Enum):
+    """
+    Способ сохранения CIF в validated_structures/ и rejected_structures/.
+
+    COPY
+        Полная копия файла (по умолчанию).
+
+    HARDLINK
+        Жёсткая ссылка на входной файл: места не занимает, но работает
+        только в пределах одной файловой системы (иначе — копия).
+
+    REFLINK
+        Copy-on-write клон (Btrfs, XFS, APFS...): независимый файл без
+        копирования данных. Если ФС не поддерживает — копия.
+
+    SYMLINK
+        Символическая ссылка на входной файл (абсолютный путь).
+        Ломается, если входную директорию переместить или удалить.
+
+    MANIFEST
+        Файлы не создаются вообще: пишется только индекс путей
+        output_manifest.csv (structure_id, status, input_path).
+        Причины отклонения — в all_structures.csv (details_json).
+
+    TAR / TAR_GZ / TAR_ZST
+        Вместо директорий — два архива validated_structures.tar[.gz|.zst]
+        и rejected_structures.tar[.gz|.zst] с теми же путями внутри
+        (миллионы мелких файлов не создаются). tar.zst — нужен zstandard.
+    """
+
+    COPY = "copy"
+    HARDLINK = "hardlink"
+    REFLINK = "reflink"
+    SYMLINK = "symlink"
+    MANIFEST = "manifest"
+    TAR = "tar"
+    TAR_GZ = "tar.gz"
+    TAR_ZST = "tar.zst"
+
+
+class RejectionLogFormat(str, Enum):
+    """
+    Куда писать причины отклонения (содержимое reason.json).
+
+    FILES
+        Отдельный rejected_structures/<path>.reason.json на каждую
+        отклонённую структуру (по умолчанию).
+
+    JSONL
+        Одна строка на структуру в out_dir/rejections.jsonl
+        + индекс смещений rejections.idx (см. io/rejection_log.py).
+
+    JSONL_GZ
+        То же, сжатое: out_dir/rejections.jsonl.gz.
+    """
+
+    FILES = "files"
+    JSONL = "jsonl"
+    JSONL_GZ = "jsonl.gz"
+
+
+class RecordsFormat(str, Enum):
+    """
+    Формат общей таблицы по всем структурам.
+
+    CSV
+        out_dir/all_structures.csv (по умолчанию).
+
+    PARQUET
+        out_dir/all_structures.parquet/ — директория part-файлов
+        с типизированной схемой (см. report/columnar.py, нужен pyarrow).
+    """
+
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
 # =============================================================================
 # Rejection reasons
 # =============================================================================
@@ -105,6 +192,10 @@ class RejectionReason(str, Enum):
     # I/O errors
     # -----------------------
 
+    INPUT_UNREADABLE = "input_unreadable"
+    # входного файла нет или он не читается (путь из --input-table,
+    # файл удалён во время запуска); копия в rejected_structures не создаётся
+
     CIF_PARSE_ERROR = "cif_parse_error"
     # CIF невозможно прочитать (повреждён файл)
 
@@ -143,6 +234,14 @@ class RejectionReason(str, Enum):
     DUPLICATE = "duplicate"
     # структура уже была сгенерирована ранее
 
+    # -----------------------
+    # Time limits
+    # -----------------------
+
+    TIMEOUT = "timeout"
+    # стадия не уложилась в лимит времени (timeouts в thresholds.yaml);
+    # какая именно — в details ("stage")
+
     # -----------------------
     # Internal errors
     # -----------------------
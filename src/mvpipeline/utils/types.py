@@ -40,11 +40,16 @@ class StructureItem:
     rel_path
         Относительный путь относительно input_dir.
         Используется для сохранения структуры в validated/rejected папках.
+
+    cif_text
+        Текст CIF, если структура пришла из таблицы (--input-table),
+        а не из отдельного файла; path тогда указывает на таблицу.
     """
 
     structure_id: str
     path: Path
     rel_path: Path
+    cif_text: Optional[str] = field(default=None, repr=False)
 
 
 # =============================================================================
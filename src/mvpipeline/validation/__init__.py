@@ -4,7 +4,11 @@ Validation module: проверки корректности кристалли
 Этот пакет содержит все проверки, которые могут отклонить структуру
 или пометить её как suspicious.
 
-Проверки выполняются последовательно в pipeline.runner:
+Проверки выполняются последовательно в pipeline.stages:
+
+    0. prescan_validate
+        Просмотр текста CIF до разбора pymatgen: пустые, оборванные
+        и заведомо слишком большие файлы отклоняются сразу.
 
     1. sanity_ok
         Быстрая базовая проверка корректности структуры.
@@ -24,25 +28,37 @@ Validation module: проверки корректности кристалли
         не для отклонения структуры).
 
 Публичный API:
+    prescan_cif
+    prescan_validate
+    CifPrescan
+    PrescanResult
     sanity_ok
     geometry_validate
     GeometryOutcome
+    distance_cutoff
     check_charge_neutrality
     ChargeCheckResult
     has_magnetic_elements
 """
 
+from .cif_prescan import CifPrescan, PrescanResult, prescan_cif, prescan_validate
 from .cif_sanity import sanity_ok
-from .geometry import geometry_validate, GeometryOutcome
+from .geometry import distance_cutoff, geometry_validate, GeometryOutcome
 from .chemistry import check_charge_neutrality, ChargeCheckResult
 from .magnetism import has_magnetic_elements
 
 __all__ = [
+    # prescan
+    "prescan_cif",
+    "prescan_validate",
+    "CifPrescan",
+    "PrescanResult",
     # sanity
     "sanity_ok",
     # geometry
     "geometry_validate",
     "GeometryOutcome",
+    "distance_cutoff",
     # chemistry
     "check_charge_neutrality",
     "ChargeCheckResult",
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache, reduce
+from math import gcd
 from typing import Any, Dict, List, Optional, Tuple
 
 from pymatgen.core import Structure
@@ -8,6 +10,13 @@ from pymatgen.core import Structure
 from ..utils.config import PipelineConfig
 from ..utils.constants import RejectionReason
 
+# Guard от мусорных составов (слишком много различных элементов).
+# Решатель линеен по числу элементов, поэтому порог может быть большим.
+MAX_ELEMENTS = 32
+
+# сколько решённых составов помнить (LRU, на процесс)
+_SOLVER_CACHE_SIZE = 8192
+
 
 @dataclass(frozen=True)
 class ChargeCheckResult:
@@ -53,11 +62,13 @@ def check_charge_neutrality(
         sum(count[element] * ox_state[element]) == 0
 
     Реализация:
-    - Собираем counts (кол-во атомов каждого элемента).
+    - Собираем counts (кол-во атомов каждого элемента) и делим их на общий НОД
+      (Fe4O6 и Fe2O3 — одна и та же задача).
     - Проверяем, что для всех элементов есть oxidation_states.
-    - Перебираем комбинации степеней окисления через DFS (поиск в глубину),
-      используя pruning (отсечение веток), чтобы ускорить поиск:
-      если с оставшимися элементами уже невозможно прийти к сумме 0, ветка отбрасывается.
+    - Решаем задачу динамикой по достижимым суммам (см. _solve): без
+      экспоненциального перебора, поэтому guard по числу элементов большой.
+    - Решения запоминаются в LRU-кэше по (приведённый состав, степени окисления
+      его элементов): генераторы выдают одни и те же составы много раз.
 
     Если нейтральную комбинацию найти не удалось — структура отклоняется с reason=CHARGE_IMBALANCE.
 
@@ -106,78 +117,34 @@ def check_charge_neutrality(
             solution=None,
         )
 
-    # Сортируем элементы по количеству атомов (больше атомов → раньше),
-    # чтобы быстрее отсеивать невозможные ветки (ускорение DFS).
-    items: List[Tuple[str, int]] = sorted(counts.items(), key=lambda kv: -kv[1])
-    elems: List[str] = [el for el, _ in items]
-    nums: List[int] = [n for _, n in items]
-    states: List[List[int]] = [ox[el] for el in elems]
-
-    # Guard от комбинаторного взрыва (если слишком много различных элементов)
-    if len(elems) > 10:
+    # Guard от мусорных составов (если слишком много различных элементов)
+    if len(counts) > MAX_ELEMENTS:
         return ChargeCheckResult(
             ok=False,
             reason=RejectionReason.CHARGE_IMBALANCE,
-            details={"error": "too_many_elements", "n_elements": len(elems)},
+            details={"error": "too_many_elements", "n_elements": len(counts)},
             solution=None,
         )
 
-    # Precompute диапазон возможных зарядов от "хвоста" списка элементов:
-    # min_tail[i] — минимальный заряд, который можно получить от элементов i..end
-    # max_tail[i] — максимальный заряд, который можно получить от элементов i..end
-    # Это используется для pruning: если 0 недостижим, не углубляемся.
-    min_tail: List[int] = [0] * (len(elems) + 1)
-    max_tail: List[int] = [0] * (len(elems) + 1)
-
-    for i in range(len(elems) - 1, -1, -1):
-        n = nums[i]
-        s = states[i]
-        min_tail[i] = min_tail[i + 1] + min(s) * n
-        max_tail[i] = max_tail[i + 1] + max(s) * n
-
-    chosen: Dict[str, int] = {}
-
-    def dfs(i: int, acc: int) -> bool:
-        """
-        Рекурсивно подбирает степени окисления.
-
-        i   — индекс текущего элемента
-        acc — текущая сумма зарядов: sum(chosen[element] * count[element])
-
-        Возвращает True, если удалось дойти до суммарного заряда 0.
-        """
-        # Если назначили степени окисления всем элементам — проверяем нейтральность
-        if i == len(elems):
-            return acc == 0
+    # Делим количества на общий НОД: sum(n * st) == 0 ⇔ sum(n / g * st) == 0
+    g = reduce(gcd, counts.values())
+    if g > 1:
+        counts = {el: n // g for el, n in counts.items()}
 
-        # Pruning: проверяем, достижим ли 0 с оставшимися элементами
-        lo = acc + min_tail[i]
-        hi = acc + max_tail[i]
-        if 0 < lo or 0 > hi:
-            return False
-
-        el = elems[i]
-        n = nums[i]
-
-        # Перебираем возможные степени окисления для текущего элемента
-        for st in states[i]:
-            chosen[el] = int(st)
-            if dfs(i + 1, acc + int(st) * n):
-                return True
-
-        # Backtrack
-        chosen.pop(el, None)
-        return False
+    # Сортируем элементы по количеству атомов (больше атомов → раньше):
+    # порядок определяет, какое из решений считается "первым".
+    items: List[Tuple[str, int]] = sorted(counts.items(), key=lambda kv: -kv[1])
 
-    found = dfs(0, 0)
+    key = tuple((el, n, tuple(int(st) for st in ox[el])) for el, n in items)
+    chosen = _solve(key)
 
     # Если нашли — возвращаем solution
-    if found:
+    if chosen is not None:
         return ChargeCheckResult(
             ok=True,
             reason=None,
             details={"charge_check": "ok"},
-            solution=dict(chosen),
+            solution={el: st for (el, _, _), st in zip(key, chosen)},
         )
 
     # Если не нашли — структура не проходит charge neutrality
@@ -187,3 +154,75 @@ def check_charge_neutrality(
         details={"charge_check": "no_solution"},
         solution=None,
     )
+
+
+@lru_cache(maxsize=_SOLVER_CACHE_SIZE)
+def _solve(
+    key: Tuple[Tuple[str, int, Tuple[int, ...]], ...]
+) -> Optional[Tuple[int, ...]]:
+    """
+    Подбирает степени окисления: по одной на элемент, так что sum(n * st) == 0.
+
+    key — кортеж (element, count, states) в порядке перебора.
+
+    Алгоритм (динамика по достижимым суммам):
+
+    1. Идём с конца и для каждого i строим множество сумм, достижимых
+       элементами i..end. Множество хранится битовой маской в Python int:
+       бит k ↔ сумма lo[i] + k, где lo[i] — минимально возможная сумма хвоста.
+       Переход — OR сдвигов маски следующего уровня на (st - min(states)) * n.
+
+    2. Если 0 недостижим с самого начала → решения нет.
+
+    3. Иначе идём с начала и для каждого элемента берём ПЕРВУЮ степень
+       окисления (в порядке из конфига), после которой остаток ещё
+       достижим. Это ровно то решение, которое нашёл бы перебор в глубину
+       с тем же порядком элементов и степеней.
+
+    Сложность ~ число элементов × число степеней × ширина маски / 64,
+    без экспоненциального взрыва.
+
+    Returns
+    -------
+    Optional[Tuple[int, ...]]
+        Степени окисления в порядке key или None, если решения нет.
+    """
+    m = len(key)
+
+    # lo[i] — минимальная сумма зарядов элементов i..end
+    lo: List[int] = [0] * (m + 1)
+
+    # reach[i] — маска достижимых сумм элементов i..end (бит k ↔ сумма lo[i] + k)
+    reach: List[int] = [0] * (m + 1)
+    reach[m] = 1
+
+    for i in range(m - 1, -1, -1):
+        _, n, states = key[i]
+        s_min = min(states)
+        lo[i] = lo[i + 1] + s_min * n
+
+        mask = 0
+        for st in states:
+            mask |= reach[i + 1] << ((st - s_min) * n)
+        reach[i] = mask
+
+    def reachable(i: int, target: int) -> bool:
+        """Достижима ли сумма target элементами i..end."""
+        k = target - lo[i]
+        return k >= 0 and (reach[i] >> k) & 1 == 1
+
+    if not reachable(0, 0):
+        return None
+
+    chosen: List[int] = []
+    acc = 0
+
+    for i, (_, n, states) in enumerate(key):
+        for st in states:
+            # остаток (элементы i+1..end) должен дать -(acc + st * n)
+            if reachable(i + 1, -(acc + st * n)):
+                chosen.append(st)
+                acc += st * n
+                break
+
+    return tuple(chosen)
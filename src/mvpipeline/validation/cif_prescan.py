@@ -0,0 +1,539 @@
+from __future__ import annotations
+
+"""
+cif_prescan.py — быстрый просмотр текста CIF до разбора pymatgen.
+
+Structure.from_file — это CifParser, раскрытие симметрии, обработка
+предупреждений. Для пустых, оборванных и заведомо слишком больших файлов
+эта работа тратится впустую: они всё равно будут отклонены
+(cif_parse_error или too_many_atoms).
+
+prescan_cif за один проход по строкам текста (без pymatgen) достаёт:
+    - число блоков data_,
+    - параметры ячейки,
+    - число операций симметрии,
+    - длину цикла _atom_site (строк и различных позиций),
+    - целостность циклов loop_ (оборванная последняя строка).
+
+prescan_validate отклоняет структуру только там, где исход известен
+заранее — та же причина, что дала бы полная проверка:
+
+    cif_parse_error
+        нет ни одного блока data_; цикл loop_ без значений или с неполной
+        последней строкой (файл оборван); в единственном блоке нет координат
+        атомов; нулевая длина ребра ячейки. На всём этом CifParser падает.
+
+    too_many_atoms
+        ячейка P1 (одна операция симметрии) с нормальной решёткой, и
+        даже нижняя оценка числа различных позиций атомов больше
+        max_n_atoms: после разбора len(struct) был бы не меньше. Для ячеек с симметрией число атомов
+        только оценивается (позиции × операции) — отклонять по оценке нельзя.
+        Дескрипторы (формула, плотность) таких структур не считаются:
+        в all_structures.csv эти колонки пустые.
+
+Всё остальное идёт на полный разбор. Токенизация повторяет
+CifBlock._process_string из pymatgen (те же правила кавычек,
+комментариев и ;-текста; теги и loop_ — только вне кавычек), поэтому
+"оборванный цикл" здесь и там — одно и то же.
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..utils.config import PipelineConfig
+from ..utils.constants import RejectionReason
+
+# те же выражения, что в pymatgen.io.cif.CifBlock / CifFile
+_COMMENT = re.compile(r"(\s|^)#.*$")
+_TOKEN = re.compile(r"""([^'"\s][\S]*)|'(.*?)'(?!\S)|"(.*?)"(?!\S)""")
+_BLOCK_START = re.compile(r"^\s*data_")
+_UNCERTAINTY = re.compile(r"\(.+\)*")
+
+_CELL_TAGS = (
+    "_cell_length_a",
+    "_cell_length_b",
+    "_cell_length_c",
+    "_cell_angle_alpha",
+    "_cell_angle_beta",
+    "_cell_angle_gamma",
+)
+
+# теги списка операций симметрии (как в CifParser.get_symops)
+_SYMOP_TAGS = (
+    "_symmetry_equiv_pos_as_xyz",
+    "_space_group_symop_operation_xyz",
+    "_space_group_symop.operation_xyz",
+    "_symmetry_equiv_pos_as_xyz_",
+    "_space_group_symop_operation_xyz_",
+)
+
+# допуск объединения позиций в _count_positions: site_tolerance CifParser
+# (1e-4) плюс сдвиг при округлении координат к "идеальным" значениям
+# (1/3, 1/2, ... — до 1e-4 у каждой из двух позиций)
+_MERGE_TOLERANCE = 4e-4
+
+# минимальная толщина ячейки d_100 / d_010 / d_001, Å
+# (min_thickness в CifParser._get_structure)
+_MIN_THICKNESS = 0.01
+
+# магнитные CIF разбираются иначе — для них только базовые проверки
+_MAGNETIC_PREFIXES = ("_space_group_symop_magn", "_atom_site_moment", "_parent_space_group")
+
+
+def _str2float(text: str) -> Optional[float]:
+    """pymatgen.io.cif.str2float без исключений: None, если не число."""
+    try:
+        return float(_UNCERTAINTY.sub("", text))
+    except ValueError:
+        return 0.0 if text.strip() == "." else None
+
+
+@dataclass
+class _Block:
+    """Теги и циклы одного блока data_ (только то, что нужно проверкам)."""
+
+    values: Dict[str, str] = field(default_factory=dict)
+    loops: List[Tuple[List[str], List[str]]] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class CifPrescan:
+    """
+    Что удалось узнать о CIF без разбора.
+
+    n_blocks
+        Число блоков data_ (кроме powder_pattern — их пропускает и pymatgen).
+
+    broken_loop
+        Описание первого цикла loop_ без значений или с неполной последней
+        строкой (None — все циклы целые).
+
+    cell
+        (a, b, c, alpha, beta, gamma) единственного блока; None, если
+        блоков не один или параметр не задан / не число.
+
+    n_symops
+        Строк в цикле операций симметрии (None — цикла нет).
+
+    is_p1
+        Структура точно в P1: одна операция симметрии — число атомов
+        после разбора равно числу позиций.
+
+    has_coords
+        В единственном блоке есть координаты атомов (_atom_site_fract_* или
+        _atom_site_Cartn_*).
+
+    n_sites
+        Строк в цикле _atom_site.
+
+    n_positions
+        Нижняя оценка числа различных позиций (x, y, z) с ненулевой
+        заселённостью — близкие позиции сливаются, как в CifParser
+        (см. _count_positions);
+        None — посчитать нельзя (нет дробных координат, магнитный CIF,
+        нечисловые значения, заселённость позиции больше 1).
+    """
+
+    n_blocks: int
+    broken_loop: Optional[str] = None
+    cell: Optional[Tuple[float, float, float, float, float, float]] = None
+    n_symops: Optional[int] = None
+    is_p1: bool = False
+    has_coords: bool = False
+    n_sites: int = 0
+    n_positions: Optional[int] = None
+
+    @property
+    def n_atoms_estimate(self) -> Optional[int]:
+        """
+        Оценка числа атомов в ячейке: позиции × операции симметрии
+        (для P1 — точное значение). None — если позиции неизвестны.
+        """
+        if self.n_positions is None:
+            return None
+        return self.n_positions * max(1, self.n_symops or 1)
+
+
+@dataclass(frozen=True)
+class PrescanResult:
+    """
+    Результат prescan_validate.
+
+    ok
+        True — структуру нужно разбирать полностью.
+
+    reason / details
+        Причина и детали отклонения (если ok=False); в details
+        есть "prescan": True — отклонено без разбора pymatgen.
+
+    scan
+        Всё, что извлечено из текста.
+    """
+
+    ok: bool
+    reason: Optional[RejectionReason]
+    details: Dict[str, Any]
+    scan: CifPrescan
+
+
+# =============================================================================
+# Просмотр текста
+# =============================================================================
+
+
+def _tokens(lines: List[str]) -> List[Tuple[str, str]]:
+    """
+    Токены блока по правилам CifBlock._process_string: (bare, value).
+
+    bare — текст токена без кавычек или "" для значения в кавычках и
+    многострочного (;...;); value — значение токена. Теги и loop_
+    распознаются только по bare: значение '_Fe1' в кавычках — не тег.
+    """
+    tokens: List[Tuple[str, str]] = []
+    multiline = False
+    text: List[str] = []
+
+    for line in lines:
+        line = _COMMENT.sub("", line)
+        if not line.strip():
+            continue
+        line = line.encode("ascii", "ignore").decode("ascii")
+
+        if multiline:
+            if line.startswith(";"):
+                multiline = False
+                tokens.append(("", " ".join(text)))
+                text = []
+                line = line[1:].strip()
+            else:
+                text.append(line)
+                continue
+
+        if line.startswith(";"):
+            multiline = True
+            text.append(line[1:].strip())
+        else:
+            tokens.extend((match[0], "".join(match)) for match in _TOKEN.findall(line))
+
+    return tokens
+
+
+def _parse_block(lines: List[str]) -> Tuple[_Block, Optional[str]]:
+    """Блок и описание первого испорченного цикла (или None)."""
+    tokens = _tokens(lines)
+    block = _Block()
+    broken: Optional[str] = None
+
+    # первый токен — заголовок data_...
+    i = 1
+    n = len(tokens)
+    while i < n:
+        bare, _ = tokens[i]
+        i += 1
+
+        if bare == "_eof":
+            break
+
+        if bare.startswith("_"):
+            block.values[bare] = tokens[i][1] if i < n else ""
+            i += 1
+
+        elif bare.startswith("loop_"):
+            columns: List[str] = []
+            while (
+                i < n
+                and tokens[i][0].startswith("_")
+                and not tokens[i][0].startswith("loop_")
+            ):
+                columns.append(tokens[i][1])
+                i += 1
+
+            items: List[str] = []
+            while i < n and not tokens[i][0].startswith(("loop_", "_")):
+                items.append(tokens[i][1])
+                i += 1
+
+            if broken is None and columns:
+                if len(items) < len(columns):
+                    broken = f"цикл {columns[0]} без значений"
+                elif len(items) % len(columns):
+                    broken = f"цикл {columns[0]}: неполная последняя строка"
+
+            block.loops.append((columns, items))
+
+    return block, broken
+
+
+def _split_blocks(text: str) -> List[List[str]]:
+    """Строки каждого блока data_ (как re.split(r"^\\s*data_") в CifFile)."""
+    blocks: List[List[str]] = []
+    for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        if _BLOCK_START.match(line):
+            blocks.append([line.lstrip()])
+        elif blocks:
+            blocks[-1].append(line)
+
+    # блоки порошковой дифракции pymatgen пропускает
+    return [b for b in blocks if "powder_pattern" not in b[0]]
+
+
+def _loop_column(block: _Block, names: Tuple[str, ...]) -> Optional[List[str]]:
+    """Значения первой найденной колонки из names (по всем циклам блока)."""
+    for columns, items in block.loops:
+        width = len(columns)
+        for name in names:
+            if name in columns and width and len(items) % width == 0:
+                k = columns.index(name)
+                return items[k::width]
+    return None
+
+
+def _is_p1(block: _Block, n_symops: Optional[int]) -> bool:
+    """Одна операция симметрии (по тем же тегам, что смотрит CifParser)."""
+    if n_symops is not None:
+        return n_symops == 1
+
+    # операций нет — тогда по имени/номеру группы (по умолчанию тоже x, y, z)
+    for tag, value in block.values.items():
+        low = tag.lower()
+        if "space_group_name" in low or "symmetry_space_group_name" in low:
+            if value.replace(" ", "").replace("_", "").upper() != "P1":
+                return False
+        elif low.endswith(("int_tables_number", "it_number")):
+            if value.strip() != "1":
+                return False
+    return True
+
+
+def _count_positions(
+    xs: List[str],
+    ys: List[str],
+    zs: List[str],
+    occupancies: Optional[List[str]],
+) -> Optional[int]:
+    """
+    Нижняя оценка числа сайтов, которые CifParser соберёт из позиций
+    с ненулевой заселённостью.
+
+    CifParser сливает атом с уже найденным сайтом, если каждая дробная
+    координата (по модулю 1) отличается меньше чем на site_tolerance = 1e-4.
+    Здесь позиции объединяются в связные компоненты по тому же правилу
+    с допуском _MERGE_TOLERANCE: каждый сайт CifParser целиком лежит в одной
+    компоненте, поэтому компонент не больше, чем сайтов, — ошибка возможна
+    только в меньшую сторону (too_many_atoms не даст ложного отклонения).
+
+    None — если координата или заселённость не число либо суммарная
+    заселённость компоненты больше 1 (тогда CifParser может отказаться
+    разбирать файл — решать ему).
+    """
+    positions: List[Tuple[float, float, float]] = []
+    occus: List[float] = []
+
+    for k, xyz in enumerate(zip(xs, ys, zs)):
+        occu = 1.0
+        if occupancies is not None and k < len(occupancies):
+            occu = _str2float(occupancies[k])
+            if occu is None:
+                return None
+        if occu <= 0:
+            continue
+
+        coords = [_str2float(value) for value in xyz]
+        if any(x is None for x in coords):
+            return None
+        positions.append(tuple(x % 1.0 for x in coords))
+        occus.append(occu)
+
+    # union-find по сетке ячеек шириной не меньше 8 допусков: соседа ближе
+    # допуска ищем в своей ячейке и — только у края ячейки — в соседней
+    # (с учётом периодичности); обычно это одна ячейка вместо 27
+    parent = list(range(len(positions)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def close(p: Tuple[float, ...], q: Tuple[float, ...]) -> bool:
+        for x, y in zip(p, q):
+            d = x - y
+            if abs(d - round(d)) >= _MERGE_TOLERANCE:
+                return False
+        return True
+
+    m = int(1.0 / (8 * _MERGE_TOLERANCE))
+    edge = _MERGE_TOLERANCE * m
+    grid: Dict[Tuple[int, int, int], List[int]] = {}
+
+    for i, p in enumerate(positions):
+        axes = []
+        for x in p:
+            scaled = x * m
+            c = min(int(scaled), m - 1)
+            offsets = [c]
+            if scaled - c < edge:
+                offsets.append((c - 1) % m)
+            if c + 1 - scaled < edge:
+                offsets.append((c + 1) % m)
+            axes.append(offsets)
+
+        for cx in axes[0]:
+            for cy in axes[1]:
+                for cz in axes[2]:
+                    for j in grid.get((cx, cy, cz), ()):
+                        if close(p, positions[j]):
+                            parent[find(i)] = find(j)
+
+        grid.setdefault((axes[0][0], axes[1][0], axes[2][0]), []).append(i)
+
+    occu_at: Dict[int, float] = {}
+    for i, occu in enumerate(occus):
+        root = find(i)
+        occu_at[root] = occu_at.get(root, 0.0) + occu
+        if occu_at[root] > 1.0 + 1e-6:
+            return None
+
+    return len(occu_at)
+
+
+def _cell_is_valid(cell: Tuple[float, ...]) -> bool:
+    """
+    Ячейка, которую CifParser примет: длины > 0, объём > 0 и все
+    межплоскостные расстояния d_100, d_010, d_001 не меньше
+    _MIN_THICKNESS = 0.01 Å (min_thickness в CifParser).
+    """
+    a, b, c, alpha, beta, gamma = cell
+    if min(a, b, c) <= 0:
+        return False
+
+    ca, cb, cg = (math.cos(math.radians(x)) for x in (alpha, beta, gamma))
+    factor = 1.0 - ca * ca - cb * cb - cg * cg + 2.0 * ca * cb * cg
+    if factor <= 0:
+        return False
+
+    volume = a * b * c * math.sqrt(factor)
+    sines = [math.sin(math.radians(x)) for x in (alpha, beta, gamma)]
+    heights = (
+        volume / (b * c * sines[0]),
+        volume / (a * c * sines[1]),
+        volume / (a * b * sines[2]),
+    )
+    return min(heights) >= _MIN_THICKNESS
+
+
+def prescan_cif(text: str) -> CifPrescan:
+    """
+    Один проход по тексту CIF: блоки, циклы, ячейка, симметрия, позиции.
+    """
+    blocks = _split_blocks(text)
+
+    broken: Optional[str] = None
+    parsed: List[_Block] = []
+    for lines in blocks:
+        block, block_broken = _parse_block(lines)
+        parsed.append(block)
+        broken = broken or block_broken
+
+    if len(parsed) != 1:
+        return CifPrescan(n_blocks=len(parsed), broken_loop=broken)
+
+    block = parsed[0]
+    tags = [t.lower() for t in block.values]
+    for columns, _ in block.loops:
+        tags.extend(c.lower() for c in columns)
+
+    has_coords = any(
+        t.startswith(("_atom_site_fract_", "_atom_site_cartn_")) for t in tags
+    )
+
+    cell = None
+    values = [block.values.get(tag) for tag in _CELL_TAGS]
+    if all(v is not None for v in values):
+        numbers = [_str2float(v) for v in values]
+        if all(x is not None for x in numbers):
+            cell = tuple(numbers)
+
+    symops = _loop_column(block, _SYMOP_TAGS)
+    n_symops = len(symops) if symops is not None else None
+
+    labels = _loop_column(block, ("_atom_site_label", "_atom_site_type_symbol"))
+    n_sites = len(labels) if labels is not None else 0
+
+    n_positions = None
+    magnetic = any(t.startswith(_MAGNETIC_PREFIXES) for t in tags)
+    xs = _loop_column(block, ("_atom_site_fract_x",))
+    ys = _loop_column(block, ("_atom_site_fract_y",))
+    zs = _loop_column(block, ("_atom_site_fract_z",))
+    if not magnetic and xs is not None and ys is not None and zs is not None:
+        occupancies = _loop_column(block, ("_atom_site_occupancy",))
+        n_positions = _count_positions(xs, ys, zs, occupancies)
+
+    return CifPrescan(
+        n_blocks=1,
+        broken_loop=broken,
+        cell=cell,
+        n_symops=n_symops,
+        is_p1=_is_p1(block, n_symops),
+        has_coords=has_coords,
+        n_sites=n_sites,
+        n_positions=n_positions,
+    )
+
+
+# =============================================================================
+# Проверка
+# =============================================================================
+
+
+def prescan_validate(text: str, cfg: PipelineConfig) -> PrescanResult:
+    """
+    Отклоняет CIF, который заведомо не пройдёт разбор или max_n_atoms.
+
+    Причины — те же, что дал бы полный разбор (cif_parse_error,
+    too_many_atoms); ok=True — разбирать pymatgen.
+    """
+    scan = prescan_cif(text)
+
+    def _parse_error(error: str) -> PrescanResult:
+        return PrescanResult(
+            ok=False,
+            reason=RejectionReason.CIF_PARSE_ERROR,
+            details={"error": error, "prescan": True},
+            scan=scan,
+        )
+
+    if scan.n_blocks == 0:
+        return _parse_error("нет блока data_ (пустой или не CIF)")
+
+    if scan.broken_loop is not None:
+        return _parse_error(f"файл оборван: {scan.broken_loop}")
+
+    if scan.n_blocks == 1:
+        if not scan.has_coords:
+            return _parse_error("нет координат атомов (_atom_site)")
+
+        if scan.cell is not None and 0.0 in scan.cell[:3]:
+            return _parse_error("нулевая длина ребра ячейки")
+
+        if (
+            scan.is_p1
+            and scan.cell is not None
+            and _cell_is_valid(scan.cell)
+            and scan.n_positions is not None
+            and scan.n_positions > cfg.max_n_atoms
+        ):
+            return PrescanResult(
+                ok=False,
+                reason=RejectionReason.TOO_MANY_ATOMS,
+                details={
+                    "n_atoms": scan.n_positions,
+                    "max_n_atoms": cfg.max_n_atoms,
+                    "prescan": True,
+                },
+                scan=scan,
+            )
+
+    return PrescanResult(ok=True, reason=None, details={}, scan=scan)
@@ -5,8 +5,10 @@ from typing import Any, Optional, Dict
 import numpy as np
 from pymatgen.core import Structure
 
+from ..analysis import compute_basic_descriptors
 from ..utils.config import PipelineConfig
 from ..utils.constants import RejectionReason, ValidationStatus
+from ..utils.types import Descriptors
 
 
 @dataclass(frozen=True)
@@ -33,7 +35,8 @@ class GeometryOutcome:
             - n_atoms
             - density
             - volume_per_atom
-            - min_distance
+            - min_distance (None, если ни одна пара атомов не ближе
+              cutoff; тогда cutoff записан в min_distance_gt)
 
         Используется для:
             - reason.json
@@ -47,7 +50,21 @@ class GeometryOutcome:
     details: Dict[str, Any]
 
 
-def geometry_validate(struct: Structure, cfg: PipelineConfig) -> GeometryOutcome:
+def distance_cutoff(cfg: PipelineConfig) -> float:
+    """
+    Радиус поиска min_distance (Å).
+
+    Пары дальше него не ищутся: min_distance структуры без более близкой
+    пары не известен (None, в details — min_distance_gt = cutoff).
+    """
+    return max(cfg.d_min_reject, cfg.d_max_suspicious)
+
+
+def geometry_validate(
+    struct: Structure,
+    cfg: PipelineConfig,
+    descriptors: Optional[Descriptors] = None,
+) -> GeometryOutcome:
     """
     Выполняет геометрическую и физическую валидацию структуры.
 
@@ -84,6 +101,10 @@ def geometry_validate(struct: Structure, cfg: PipelineConfig) -> GeometryOutcome
     cfg : PipelineConfig
         Конфигурация pipeline с пороговыми значениями.
 
+    descriptors : Optional[Descriptors]
+        Уже посчитанные базовые дескрипторы структуры (pipeline.stages
+        считает их один раз для всех стадий). None — посчитать здесь.
+
     Returns
     -------
     GeometryOutcome
@@ -105,32 +126,42 @@ def geometry_validate(struct: Structure, cfg: PipelineConfig) -> GeometryOutcome
             },
         )
 
+    if descriptors is None:
+        descriptors = compute_basic_descriptors(struct, None)
+
     # плотность (g/cm³)
-    dens = float(struct.density)
+    dens = descriptors.density
 
     # объём на атом (Å³/atom)
-    vpa = struct.volume / n_atoms if n_atoms else 0.0
-
-    # матрица расстояний между всеми парами атомов
-    dm = struct.distance_matrix
+    vpa = descriptors.volume_per_atom
 
-    # заменяем диагональ большим числом,
-    # чтобы не учитывать расстояние атома до самого себя (=0)
-    np.fill_diagonal(dm, 1e9)
+    # минимальное расстояние между разными атомами ищем поиском соседей
+    # в радиусе cutoff (без N×N матрицы расстояний):
+    #   1) сначала в радиусе d_min_reject — если пара нашлась,
+    #      структура всё равно будет отклонена, дальше искать не нужно
+    #   2) иначе в радиусе d_max_suspicious
+    # None → ни одной пары ближе cutoff (min_distance > cutoff)
+    cutoff = distance_cutoff(cfg)
 
-    # минимальное расстояние между разными атомами
-    dmin = float(np.min(dm))
+    dmin = _min_pair_distance(struct, cfg.d_min_reject)
+    if dmin is None and cutoff > cfg.d_min_reject:
+        dmin = _min_pair_distance(struct, cutoff)
 
     # базовые дескрипторы для отчёта
     details = {
         "n_atoms": n_atoms,
         "density": round(dens, 6),
         "volume_per_atom": round(vpa, 6),
-        "min_distance": round(dmin, 6),
+        "min_distance": round(dmin, 6) if dmin is not None else None,
     }
 
+    if dmin is None:
+        # точное значение не считаем: для проверок важно только,
+        # что оно больше всех порогов
+        details["min_distance_gt"] = cutoff
+
     # физически невозможное расстояние → reject
-    if dmin < cfg.d_min_reject:
+    if dmin is not None and dmin < cfg.d_min_reject:
         return GeometryOutcome(
             status=ValidationStatus.REJECTED,
             is_suspicious=False,
@@ -155,12 +186,11 @@ def geometry_validate(struct: Structure, cfg: PipelineConfig) -> GeometryOutcome
         )
 
     # suspicious структура (но не reject)
-    suspicious = (
-        (dmin < cfg.d_max_suspicious) or (vpa < cfg.vol_min) or (vpa > cfg.vol_max)
-    )
+    close_pair = dmin is not None and dmin < cfg.d_max_suspicious
+    suspicious = close_pair or (vpa < cfg.vol_min) or (vpa > cfg.vol_max)
 
     # записываем причину suspicious для анализа
-    if suspicious and dmin < cfg.d_max_suspicious:
+    if suspicious and close_pair:
         details["suspicious_reason"] = "low_interatomic_distance"
     elif suspicious:
         details["suspicious_reason"] = "non_standard_vpa"
@@ -171,3 +201,31 @@ def geometry_validate(struct: Structure, cfg: PipelineConfig) -> GeometryOutcome
         reason=None,
         details=details,
     )
+
+
+def _min_pair_distance(struct: Structure, cutoff: float) -> Optional[float]:
+    """
+    Минимальное расстояние между разными атомами с учётом периодичности,
+    если оно меньше cutoff.
+
+    Использует периодический поиск соседей (Structure.get_neighbor_list):
+    память и время ~O(N · число соседей в радиусе cutoff), а не O(N²).
+
+    Пары "атом — его собственный периодический образ" (i == j) не учитываются,
+    как и диагональ в distance_matrix.
+
+    Returns
+    -------
+    Optional[float]
+        Минимальное расстояние или None, если ни одной пары ближе cutoff нет.
+    """
+    if cutoff <= 0 or len(struct) < 2:
+        return None
+
+    centers, points, _, dists = struct.get_neighbor_list(r=cutoff)
+
+    dists = dists[centers != points]
+    if dists.size == 0:
+        return None
+
+    return float(np.min(dists))
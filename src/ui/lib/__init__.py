@@ -3,12 +3,13 @@ UI helpers (lib).
 
 Содержит:
 - fs.py   — работа с файлами и индекс запусков
-- data.py — загрузка и нормализация all_structures.csv
+- data.py — загрузка и нормализация all_structures (CSV / Parquet)
 - viz.py  — 3D визуализация структур
 """
 
 from .fs import load_outputs_index, safe_read_json
 from .data import (
+    load_all_structures,
     load_all_structures_csv,
     apply_basic_filters,
     apply_range_filters,
@@ -20,6 +21,7 @@ __all__ = [
     "load_outputs_index",
     "safe_read_json",
     # data
+    "load_all_structures",
     "load_all_structures_csv",
     "apply_basic_filters",
     "apply_range_filters",
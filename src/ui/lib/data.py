@@ -2,7 +2,7 @@ from __future__ import annotations
 
 """
 Работа с данными:
-- загрузка all_structures.csv
+- загрузка all_structures.csv / all_structures.parquet
 - нормализация типов (числа, булевы)
 """
 
@@ -14,6 +14,13 @@ import pandas as pd
 BOOL_COLS = ["is_suspicious", "is_duplicate", "is_novel", "is_magnetic"]
 NUM_COLS = ["n_atoms", "density", "volume_per_atom", "min_distance"]
 
+# min_distance пуст, если ни одна пара атомов не ближе радиуса поиска;
+# тогда радиус записан в min_distance_gt ("d_min > cutoff")
+MIN_DISTANCE_GT_COL = "min_distance_gt"
+
+# тяжёлые колонки Parquet, которые UI не показывает (не читаем с диска)
+PARQUET_SKIP_COLS = {"details_json", "charge_solution", "not_computed"}
+
 
 def normalize_bool_series(s: pd.Series) -> pd.Series:
     """
@@ -44,6 +51,15 @@ def load_all_structures_csv(path: Path, model_name: str) -> pd.DataFrame:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce")
 
+    # min_distance_gt лежит в details_json (в Parquet — отдельная колонка)
+    if "details_json" in df.columns:
+        df[MIN_DISTANCE_GT_COL] = pd.to_numeric(
+            df["details_json"]
+            .astype("string")
+            .str.extract(r'"min_distance_gt":\s*([0-9.eE+-]+)', expand=False),
+            errors="coerce",
+        )
+
     # булевы
     for col in BOOL_COLS:
         if col in df.columns:
@@ -63,6 +79,40 @@ def load_all_structures_csv(path: Path, model_name: str) -> pd.DataFrame:
     return df
 
 
+def load_all_structures_parquet(path: Path, model_name: str) -> pd.DataFrame:
+    """
+    Читаем all_structures.parquet/ (mvp --records-format parquet).
+
+    Типы уже в схеме — приводить колонки не нужно; читаем только
+    колонки, которые нужны UI.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(str(path), format="parquet")
+    columns = [c for c in dataset.schema.names if c not in PARQUET_SKIP_COLS]
+    df = dataset.to_table(columns=columns).to_pandas()
+    df["model"] = model_name
+
+    # как и для CSV: nullable boolean без пропусков
+    df["is_novel"] = df["is_novel"].astype("boolean").fillna(False)
+
+    df["status"] = df["status"].astype(str)
+    df["rejection_reason"] = df["rejection_reason"].astype(object).fillna("").astype(str)
+
+    df["is_valid"] = df["status"].str.lower().eq("validated")
+    df["is_rejected"] = df["status"].str.lower().eq("rejected")
+
+    return df
+
+
+def load_all_structures(path: Path, model_name: str) -> pd.DataFrame:
+    """all_structures в любом формате: CSV-файл или Parquet-директория."""
+    if path.is_dir() or path.suffix == ".parquet":
+        return load_all_structures_parquet(path, model_name)
+
+    return load_all_structures_csv(path, model_name)
+
+
 def apply_basic_filters(
     df: pd.DataFrame,
     *,
@@ -90,14 +140,33 @@ def apply_basic_filters(
 def apply_range_filters(
     df: pd.DataFrame,
     ranges: dict[str, tuple[float, float]],
+    *,
+    above_cutoff: bool = True,
 ) -> pd.DataFrame:
     """
     Применяет фильтры по диапазонам.
     ranges = {"density": (0.5, 10), "n_atoms": (1, 200), ...}
+
+    above_cutoff — оставлять ли структуры с min_distance "> cutoff"
+    (значение пустое, задан min_distance_gt): диапазон min_distance
+    к ним не применяется.
     """
     out = df.copy()
     for col, (lo, hi) in ranges.items():
         if col not in out.columns:
             continue
-        out = out[(out[col] >= lo) & (out[col] <= hi)]
+        keep = (out[col] >= lo) & (out[col] <= hi)
+        if col == "min_distance" and above_cutoff:
+            keep |= _is_above_cutoff(out)
+        out = out[keep]
+
+    if "min_distance" not in ranges and not above_cutoff:
+        out = out[~_is_above_cutoff(out)]
     return out
+
+
+def _is_above_cutoff(df: pd.DataFrame) -> pd.Series:
+    """min_distance пуст, но известно, что он больше cutoff."""
+    if MIN_DISTANCE_GT_COL not in df.columns or "min_distance" not in df.columns:
+        return pd.Series(False, index=df.index)
+    return df["min_distance"].isna() & df[MIN_DISTANCE_GT_COL].notna()
@@ -30,6 +30,8 @@ def load_outputs_index(outputs_root: Path = Path("outputs")) -> list[dict]:
         dir: Path,
         report: Path,
         csv: Optional[Path],
+        records: Optional[Path],   # all_structures.csv или all_structures.parquet/
+        store: Optional[Path],     # structures.arrow/ (mvp --structure-store)
         validated_dir: Path,
         rejected_dir: Path
     }
@@ -44,6 +46,8 @@ def load_outputs_index(outputs_root: Path = Path("outputs")) -> list[dict]:
 
         report_path = model_dir / "validation_report.json"
         csv_path = model_dir / "all_structures.csv"
+        parquet_path = model_dir / "all_structures.parquet"
+        store_path = model_dir / "structures.arrow"
 
         if report_path.exists():
             runs.append(
@@ -52,6 +56,12 @@ def load_outputs_index(outputs_root: Path = Path("outputs")) -> list[dict]:
                     "dir": model_dir,
                     "report": report_path,
                     "csv": csv_path if csv_path.exists() else None,
+                    "records": (
+                        parquet_path
+                        if parquet_path.is_dir()
+                        else csv_path if csv_path.exists() else None
+                    ),
+                    "store": store_path if store_path.is_dir() else None,
                     "validated_dir": model_dir / "validated_structures",
                     "rejected_dir": model_dir / "rejected_structures",
                 }
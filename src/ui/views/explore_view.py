@@ -6,20 +6,23 @@ from __future__ import annotations
 Задача:
 - выбрать run из outputs
 - показать report.json
-- загрузить all_structures.csv
+- загрузить all_structures (CSV или Parquet)
 - дать фильтры
 - показать 3D просмотр выбранной структуры
+  (из structures.arrow/, если запуск был с --structure-store, иначе из CIF)
 """
 
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 import pandas as pd
 import streamlit as st
 from pymatgen.core import Structure
 
+from mvpipeline.io import StructureStore, open_structure_store
 from lib import (
-    load_all_structures_csv,
+    load_all_structures,
     apply_basic_filters,
     apply_range_filters,
     safe_read_json,
@@ -27,6 +30,49 @@ from lib import (
 )
 
 
+def _find_cif(run: dict, row: pd.Series) -> Path:
+    """
+    Путь к CIF выбранной структуры.
+
+    input_path есть в CSV при любом --output-mode (в т.ч. manifest, когда
+    копий нет). Если входной файл удалили или перенесли — берём копию
+    из validated_structures / rejected_structures (copy, hardlink, reflink).
+    """
+    cif_path = Path(str(row.get("input_path", "")))
+    if cif_path.exists():
+        return cif_path
+
+    sid = str(row.get("structure_id", ""))
+    for key in ("validated_dir", "rejected_dir"):
+        candidate = run[key] / sid
+        if candidate.exists():
+            return candidate
+
+    return cif_path
+
+
+@st.cache_resource
+def _structure_store(path: str) -> Optional[StructureStore]:
+    """Хранилище structures.arrow/ запуска (memory map — открываем один раз)."""
+    return open_structure_store(Path(path))
+
+
+def _load_structure(run: dict, row: pd.Series) -> Structure:
+    """
+    Структура для 3D-просмотра: из хранилища запуска без разбора CIF
+    (validated и duplicate), иначе — разбор CIF.
+    """
+    sid = str(row.get("structure_id", ""))
+    store = _structure_store(str(run["store"])) if run.get("store") else None
+    if store is not None and sid in store:
+        return store.get(sid)
+
+    cif_path = _find_cif(run, row)
+    if not cif_path.exists():
+        raise FileNotFoundError(f"Файл CIF не найден: {cif_path}")
+    return Structure.from_file(str(cif_path))
+
+
 def render_explore_page(*, runs_index: list[dict]) -> None:
     st.subheader("Explore — просмотр результатов запуска")
 
@@ -42,14 +88,14 @@ def render_explore_page(*, runs_index: list[dict]) -> None:
     st.markdown("### Итоговый отчёт")
     st.json(report)
 
-    # --- all_structures.csv ---
-    if run["csv"] is None:
-        st.warning("В этом запуске нет all_structures.csv")
+    # --- all_structures.csv / all_structures.parquet ---
+    if run["records"] is None:
+        st.warning("В этом запуске нет all_structures.csv / all_structures.parquet")
         st.stop()
 
-    df = load_all_structures_csv(run["csv"], model_name=run_name)
+    df = load_all_structures(run["records"], model_name=run_name)
 
-    st.markdown("### Таблица структур (all_structures.csv)")
+    st.markdown(f"### Таблица структур ({run['records'].name})")
 
     # --- фильтры (простые) ---
     f1, f2, f3, f4 = st.columns(4)
@@ -94,8 +140,24 @@ def render_explore_page(*, runs_index: list[dict]) -> None:
         add_slider("min_distance", r3)
         add_slider("n_atoms", r4)
 
-        if ranges:
-            filtered = apply_range_filters(filtered, ranges)
+        # у большинства структур нет пары ближе cutoff: min_distance пуст,
+        # известно только "> cutoff" (min_distance_gt)
+        above_cutoff = True
+        if "min_distance_gt" in filtered.columns:
+            is_above = (
+                filtered["min_distance"].isna() & filtered["min_distance_gt"].notna()
+            )
+            n_above = int(is_above.sum())
+            cutoff = filtered["min_distance_gt"].dropna()
+            label = f"> {cutoff.max():g} Å" if len(cutoff) else "> cutoff"
+            above_cutoff = r3.checkbox(
+                f"min_distance {label} ({n_above})", value=True
+            )
+
+        if ranges or not above_cutoff:
+            filtered = apply_range_filters(
+                filtered, ranges, above_cutoff=above_cutoff
+            )
 
     st.dataframe(filtered.head(int(max_rows)), width="stretch", height=420)
 
@@ -131,18 +193,15 @@ def render_explore_page(*, runs_index: list[dict]) -> None:
         }
     )
 
-    cif_path = Path(str(row.get("input_path", "")))
-    if cif_path.exists():
-        try:
-            struct = Structure.from_file(str(cif_path))
-            sphere_scale = st.slider(
-                "Размер атомов (sphere scale)", 0.15, 0.8, 0.3, 0.05
-            )
-            render_structure_3d(struct, sphere_scale=sphere_scale)
-        except Exception as e:
-            st.error(f"Не смог прочитать CIF: {e}")
+    try:
+        struct = _load_structure(run, row)
+    except FileNotFoundError as e:
+        st.warning(str(e))
+    except Exception as e:
+        st.error(f"Не смог прочитать CIF: {e}")
     else:
-        st.warning(f"Файл CIF не найден: {cif_path}")
+        sphere_scale = st.slider("Размер атомов (sphere scale)", 0.15, 0.8, 0.3, 0.05)
+        render_structure_3d(struct, sphere_scale=sphere_scale)
 
     # --- быстрые графики ---
     st.markdown("### Быстрые графики")
@@ -94,6 +94,12 @@ def render_run_page() -> None:
 
     st.subheader("Артефакты")
     st.write("Report:", str(out_dir / "validation_report.json"))
-    st.write("CSV:", str(out_dir / "all_structures.csv"))
-    st.write("Validated:", str(out_dir / "validated_structures"))
-    st.write("Rejected:", str(out_dir / "rejected_structures"))
+    st.write(
+        "Records:",
+        report.get("all_structures_csv") or report.get("all_structures_parquet"),
+    )
+    if report.get("output_mode") == "manifest":
+        st.write("Manifest:", str(out_dir / "output_manifest.csv"))
+    else:
+        st.write("Validated:", str(out_dir / "validated_structures"))
+        st.write("Rejected:", str(out_dir / "rejected_structures"))